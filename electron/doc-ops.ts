@@ -0,0 +1,34 @@
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+
+const { runPythonScript } = require('./python-runner');
+
+export type DocBatchEntry = {
+    input_path: string;
+    output_path: string;
+};
+
+export type DocBatchResult = {
+    index: number;
+    input_path: string;
+    output_path: string;
+    ok: boolean;
+    error?: string;
+};
+
+// Converts every entry through a single office instance and returns one result per entry
+export async function convertDocumentsToPdf(entries: DocBatchEntry[]): Promise<DocBatchResult[]> {
+    const manifestPath = path.join(os.tmpdir(), `convertgg-convert_to_pdf_batch-${process.pid}-${Date.now()}.json`);
+    await fs.promises.writeFile(manifestPath, JSON.stringify(entries));
+    try {
+        const output: string = await runPythonScript('doc_tools.py', ['convert_to_pdf_batch', '--manifest', manifestPath]);
+        return output
+            .split('\n')
+            .filter((line) => line.startsWith('{'))
+            .map((line) => JSON.parse(line) as DocBatchResult)
+            .sort((a, b) => a.index - b.index);
+    } finally {
+        fs.promises.unlink(manifestPath).catch(() => { });
+    }
+}
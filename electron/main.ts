@@ -1,6 +1,7 @@
 import { app, BrowserWindow, ipcMain, nativeImage } from 'electron';
 import path from 'path';
 import { mergePdfs, rotatePdf, splitPdf } from './pdf-ops';
+import { stopPythonServers } from './python-runner';
 
 let mainWindow: BrowserWindow | null = null;
 
@@ -63,15 +64,51 @@ app.whenReady().then(() => {
         return await getPdfPageCount(filePath);
     });
 
+    // The split/extract screens use this name
+    ipcMain.handle('pdf:count', async (_, filePath) => {
+        const { getPdfPageCount } = await import('./pdf-ops');
+        return await getPdfPageCount(filePath);
+    });
+
+    ipcMain.handle('pdf:inspect', async (_, filePath) => {
+        const { inspectPdf } = await import('./pdf-ops');
+        return await inspectPdf(filePath);
+    });
+
+    ipcMain.handle('pdf:thumbnails', async (_, filePath, pages, size) => {
+        const { getPdfThumbnails } = await import('./pdf-ops');
+        return await getPdfThumbnails(filePath, pages, size);
+    });
+
     ipcMain.handle('pdf:extract', async (_, filePath, pageIndices, outputPath) => {
         const { extractPages } = await import('./pdf-ops');
         return await extractPages(filePath, pageIndices, outputPath);
     });
 
+    // --- Job Handlers ---
+    ipcMain.handle('jobs:metrics', async () => {
+        const { getPythonJobMetrics } = await import('./python-runner');
+        return await getPythonJobMetrics();
+    });
+
+    ipcMain.handle('jobs:cancel', async (_, jobId: number) => {
+        const { cancelPythonJob } = await import('./python-runner');
+        return await cancelPythonJob(jobId);
+    });
+
     // --- Archive Handlers ---
-    ipcMain.handle('archive:extract', async (_, inputPath, outputDir) => {
+    ipcMain.handle('archive:extract', async (_, inputPath, outputDir, members?: string[]) => {
         const { runPythonScript } = await import('./python-runner');
-        await runPythonScript('archive_tools.py', ['extract', '--input_path', inputPath, '--output_dir', outputDir]);
+        const args = ['extract', '--input_path', inputPath, '--output_dir', outputDir];
+        if (members && members.length) args.push('--members', ...members);
+        await runPythonScript('archive_tools.py', args);
+    });
+
+    ipcMain.handle('archive:list', async (_, inputPath) => {
+        const { runPythonScript, INTERACTIVE_PRIORITY } = await import('./python-runner');
+        const output = await runPythonScript('archive_tools.py', ['list', '--input_path', inputPath], { priority: INTERACTIVE_PRIORITY });
+        const lines = output.trim().split('\n');
+        return JSON.parse(lines[lines.length - 1]);
     });
 
     ipcMain.handle('pdf:decrypt', async (_, inputPath, outputPath) => {
@@ -100,6 +137,16 @@ app.whenReady().then(() => {
         await runPythonScript('media_tools.py', ['compress_image', '--input_path', inputPath, '--output_path', outputPath, '--target_size', targetSize.toString()]);
     });
 
+    ipcMain.handle('media:convertImageBatch', async (_, entries) => {
+        const { convertImages } = await import('./media-ops');
+        return await convertImages(entries);
+    });
+
+    ipcMain.handle('media:compressImageBatch', async (_, entries) => {
+        const { compressImages } = await import('./media-ops');
+        return await compressImages(entries);
+    });
+
     ipcMain.handle('media:imagesToPdf', async (_, inputPaths, outputPath) => {
         const { runPythonScript } = await import('./python-runner');
         // We pass inputPaths as positional args, then output path named arg
@@ -111,6 +158,11 @@ app.whenReady().then(() => {
         await runPythonScript('doc_tools.py', ['convert_to_pdf', '--input_path', inputPath, '--output_path', outputPath]);
     });
 
+    ipcMain.handle('doc:convertToPdfBatch', async (_, entries) => {
+        const { convertDocumentsToPdf } = await import('./doc-ops');
+        return await convertDocumentsToPdf(entries);
+    });
+
     // --- Dialog Handlers ---
     const { dialog } = require('electron');
 
@@ -170,6 +222,18 @@ app.on('window-all-closed', () => {
     }
 });
 
+let serversStopped = false;
+
+app.on('will-quit', (event) => {
+    if (serversStopped) return;
+    // Hold the quit until the scheduler has shut its tool servers down, then quit for real
+    event.preventDefault();
+    stopPythonServers().finally(() => {
+        serversStopped = true;
+        app.exit();
+    });
+});
+
 app.on('activate', () => {
     if (mainWindow === null) {
         createWindow();
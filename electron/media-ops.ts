@@ -0,0 +1,47 @@
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+
+const { runPythonScript } = require('./python-runner');
+
+export type ImageBatchEntry = {
+    input_path: string;
+    output_path: string;
+    target_size?: number;
+    allow_downscale?: boolean;
+};
+
+export type ImageBatchResult = {
+    index: number;
+    input_path: string;
+    output_path: string;
+    ok: boolean;
+    error?: string;
+    seconds: number;
+};
+
+// Runs a media_tools batch subcommand over a manifest and returns one result per entry
+async function runImageBatch(command: string, entries: ImageBatchEntry[]): Promise<ImageBatchResult[]> {
+    const manifestPath = path.join(os.tmpdir(), `convertgg-${command}-${process.pid}-${Date.now()}.json`);
+    await fs.promises.writeFile(manifestPath, JSON.stringify(entries));
+    try {
+        const output: string = await runPythonScript('media_tools.py', [command, '--manifest', manifestPath]);
+        // One JSON line per file; other lines are STATS/SUCCESS. Per-file lines can also be
+        // taken as they finish through runPythonScript's onProgress option
+        return output
+            .split('\n')
+            .filter((line) => line.startsWith('{'))
+            .map((line) => JSON.parse(line) as ImageBatchResult)
+            .sort((a, b) => a.index - b.index);
+    } finally {
+        fs.promises.unlink(manifestPath).catch(() => { });
+    }
+}
+
+export function convertImages(entries: ImageBatchEntry[]): Promise<ImageBatchResult[]> {
+    return runImageBatch('convert_image_batch', entries);
+}
+
+export function compressImages(entries: ImageBatchEntry[]): Promise<ImageBatchResult[]> {
+    return runImageBatch('compress_image_batch', entries);
+}
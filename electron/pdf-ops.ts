@@ -1,4 +1,4 @@
-const { runPythonScript } = require('./python-runner');
+const { runPythonScript, INTERACTIVE_PRIORITY } = require('./python-runner');
 
 export async function mergePdfs(filePaths: string[], outputPath: string): Promise<void> {
     await runPythonScript('pdf_tools.py', ['merge', '--inputs', ...filePaths, '--output_path', outputPath]);
@@ -8,26 +8,51 @@ export async function rotatePdf(filePath: string, degreesToRotate: number): Prom
     await runPythonScript('pdf_tools.py', ['rotate', '--input_path', filePath, '--degrees', degreesToRotate.toString()]);
 }
 
-export async function splitPdf(filePath: string, outputDir: string): Promise<string[]> {
-    const output = await runPythonScript('pdf_tools.py', ['split', '--input_path', filePath, '--output_dir', outputDir]);
-    // The python script prints a JSON list of created files
-    try {
-        const lines = output.trim().split('\n');
-        // The last line should be the JSON
-        const jsonLine = lines[lines.length - 1];
-        return JSON.parse(jsonLine);
-    } catch (e) {
-        console.error("Failed to parse split output", output);
-        return [];
+export type SplitOptions = {
+    every?: number;         // Chunks of N pages
+    ranges?: string;        // 1-based ranges, e.g. "1-3,4,10-"
+    bookmarks?: boolean;    // One file per top-level bookmark
+    bookmarkLevel?: number;
+    workers?: number;
+};
+
+export async function splitPdf(filePath: string, outputDir: string, options: SplitOptions = {}): Promise<string[]> {
+    const args = ['split', '--input_path', filePath, '--output_dir', outputDir];
+    if (options.every) args.push('--every', String(options.every));
+    if (options.ranges) args.push('--ranges', options.ranges);
+    if (options.bookmarks) args.push('--bookmarks');
+    if (options.bookmarkLevel) args.push('--bookmark_level', String(options.bookmarkLevel));
+    if (options.workers) args.push('--workers', String(options.workers));
+    const output = await runPythonScript('pdf_tools.py', args);
+    // The python script prints one JSON line per created file, in completion order
+    const files: { index: number; path: string }[] = [];
+    for (const line of output.trim().split('\n')) {
+        if (!line.startsWith('{')) continue;
+        try {
+            files.push(JSON.parse(line));
+        } catch (e) {
+            console.error("Failed to parse split output line", line);
+        }
     }
+    return files.sort((a, b) => a.index - b.index).map((file) => file.path);
 }
 
-export async function compressPdf(filePath: string, outputPath: string): Promise<void> {
-    await runPythonScript('pdf_tools.py', ['compress', '--input_path', filePath, '--output_path', outputPath]);
+export type CompressOptions = {
+    dpi?: number;           // Target image resolution (default 150)
+    quality?: number;       // JPEG quality for recompressed images (default 75)
+    targetSize?: number;    // Target output size in bytes
+};
+
+export async function compressPdf(filePath: string, outputPath: string, options: CompressOptions = {}): Promise<void> {
+    const args = ['compress', '--input_path', filePath, '--output_path', outputPath];
+    if (options.dpi) args.push('--dpi', String(options.dpi));
+    if (options.quality) args.push('--quality', String(options.quality));
+    if (options.targetSize) args.push('--target_size', String(options.targetSize));
+    await runPythonScript('pdf_tools.py', args);
 }
 
 export async function getPdfPageCount(filePath: string): Promise<number> {
-    const output = await runPythonScript('pdf_tools.py', ['count', '--input_path', filePath]);
+    const output = await runPythonScript('pdf_tools.py', ['count', '--input_path', filePath], { priority: INTERACTIVE_PRIORITY });
     try {
         const lines = output.trim().split('\n');
         const countLine = lines[lines.length - 1];
@@ -38,8 +63,51 @@ export async function getPdfPageCount(filePath: string): Promise<number> {
     }
 }
 
+export type PdfPageInfo = { width: number; height: number; rotation: number; has_text: boolean };
+
+export type PdfInfo = {
+    page_count: number;
+    encrypted: boolean;
+    needs_pass: boolean;
+    metadata: Record<string, string> | null;
+    pages: PdfPageInfo[];
+};
+
+// Cached on the python side by path, size and mtime
+export async function inspectPdf(filePath: string): Promise<PdfInfo> {
+    const output = await runPythonScript('pdf_tools.py', ['inspect', '--input_path', filePath], { priority: INTERACTIVE_PRIORITY });
+    const lines = output.trim().split('\n');
+    return JSON.parse(lines[lines.length - 1]);
+}
+
+// Returns data URLs keyed by 1-based page number
+export async function getPdfThumbnails(filePath: string, pages: string, size = 256): Promise<Record<number, string>> {
+    const output = await runPythonScript('pdf_tools.py', ['thumbnail', '--input_path', filePath, '--pages', pages, '--size', String(size)], { priority: INTERACTIVE_PRIORITY });
+    const thumbnails: Record<number, string> = {};
+    for (const line of output.trim().split('\n')) {
+        if (!line.startsWith('{')) continue;
+        const { page, data } = JSON.parse(line);
+        thumbnails[page] = data;
+    }
+    return thumbnails;
+}
+
 export async function extractPages(filePath: string, pageIndices: number[], outputPath: string): Promise<void> {
     // Python expects comma separated string of indices
     const indicesStr = pageIndices.join(',');
     await runPythonScript('pdf_tools.py', ['extract', '--input_path', filePath, '--pages', indicesStr, '--output_path', outputPath]);
 }
+
+export type PdfPipelineStep =
+    | { op: 'select'; pages: string | number[] }   // 1-based, order and repeats kept
+    | { op: 'rotate'; degrees: number; pages?: string | number[] }
+    | { op: 'merge'; inputs: string[]; at?: number }
+    | { op: 'decrypt'; password?: string }
+    | { op: 'compress'; dpi?: number; quality?: number; min_saving?: number };
+
+// Runs several edits on one in-memory document with a single save
+export async function runPdfPipeline(inputPath: string | null, steps: PdfPipelineStep[], outputPath: string): Promise<void> {
+    const args = ['pipeline', '--output_path', outputPath, '--steps', JSON.stringify(steps)];
+    if (inputPath) args.push('--input_path', inputPath);
+    await runPythonScript('pdf_tools.py', args);
+}
@@ -27,9 +27,12 @@ contextBridge.exposeInMainWorld('electronAPI', {
     getPageCount: (inputPath: string) => ipcRenderer.invoke('pdf:count', inputPath),
     ocrPdf: (inputPath: string, outputPath: string) => ipcRenderer.invoke('pdf:ocr', inputPath, outputPath),
     compressPdf: (inputPath: string, outputPath: string) => ipcRenderer.invoke('pdf:compress', inputPath, outputPath),
+    inspectPdf: (inputPath: string) => ipcRenderer.invoke('pdf:inspect', inputPath),
+    getPdfThumbnails: (inputPath: string, pages: string, size?: number) => ipcRenderer.invoke('pdf:thumbnails', inputPath, pages, size),
 
     // Archive Operations
-    extractArchive: (inputPath: string, outputDir: string) => ipcRenderer.invoke('archive:extract', inputPath, outputDir),
+    extractArchive: (inputPath: string, outputDir: string, members?: string[]) => ipcRenderer.invoke('archive:extract', inputPath, outputDir, members),
+    listArchive: (inputPath: string) => ipcRenderer.invoke('archive:list', inputPath),
     createArchive: (inputPaths: string[], outputPath: string) => ipcRenderer.invoke('archive:create', inputPaths, outputPath),
     convertArchive: (inputPath: string, outputPath: string) => ipcRenderer.invoke('archive:convert', inputPath, outputPath),
 
@@ -37,9 +40,16 @@ contextBridge.exposeInMainWorld('electronAPI', {
     convertImage: (inputPath: string, outputPath: string) => ipcRenderer.invoke('media:convertImage', inputPath, outputPath),
     compressImage: (inputPath: string, outputPath: string, targetSize: number) => ipcRenderer.invoke('media:compressImage', inputPath, outputPath, targetSize),
     imagesToPdf: (inputPaths: string[], outputPath: string) => ipcRenderer.invoke('media:imagesToPdf', inputPaths, outputPath),
+    convertImageBatch: (entries: { input_path: string, output_path: string }[]) => ipcRenderer.invoke('media:convertImageBatch', entries),
+    compressImageBatch: (entries: { input_path: string, output_path: string, target_size: number, allow_downscale?: boolean }[]) => ipcRenderer.invoke('media:compressImageBatch', entries),
 
     // Document Operations
     convertToPdf: (inputPath: string, outputPath: string) => ipcRenderer.invoke('doc:convertToPdf', inputPath, outputPath),
+    convertToPdfBatch: (entries: { input_path: string, output_path: string }[]) => ipcRenderer.invoke('doc:convertToPdfBatch', entries),
+
+    // Job Scheduler
+    getJobMetrics: () => ipcRenderer.invoke('jobs:metrics'),
+    cancelJob: (jobId: number) => ipcRenderer.invoke('jobs:cancel', jobId),
 
     // Dialogs
     selectDirectory: () => ipcRenderer.invoke('dialog:selectDirectory'),
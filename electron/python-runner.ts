@@ -1,41 +1,72 @@
-import { spawn } from 'child_process';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
 import path from 'path';
 import { app } from 'electron';
 
 const isDev = !app.isPackaged;
 
-// Generic runner for any python script in py-sidecars
-// Returns the stdout output as a string
-export function runPythonScript(scriptName: string, args: string[]): Promise<string> {
-    return new Promise((resolve, reject) => {
-        let command: string;
-        let pArgs: string[];
-
-        if (isDev) {
-            // Development: Use Venv Python + .py Script
-            command = path.join(__dirname, '../py-sidecars/venv/bin/python'); // Or 'python' if relying on PATH
-            const scriptPath = path.join(__dirname, `../py-sidecars/${scriptName}`);
-            pArgs = [scriptPath, ...args];
-        } else {
-            // Production: Use Compiled Binary
-            // Name: scriptName without .py
-            const name = scriptName.replace('.py', '');
-            // Extension: '' on Linux/Mac, '.exe' on Windows
-            const ext = process.platform === 'win32' ? '.exe' : '';
-
-            command = path.join(process.resourcesPath, 'bin', name + ext);
-            pArgs = args;
-        }
+// Sidecars that support the long-lived `serve` mode (see py-sidecars/sidecar_server.py);
+// their operations go through the job scheduler (py-sidecars/job_scheduler.py)
+const SERVER_SCRIPTS = new Set(['pdf_tools.py', 'media_tools.py', 'archive_tools.py', 'doc_tools.py', 'ocr_engine.py']);
+const SCHEDULER_SCRIPT = 'job_scheduler.py';
+
+// Jobs waiting in the same resource class start highest priority first; user-facing previews jump the queue
+export const INTERACTIVE_PRIORITY = 10;
+
+// Resolves the executable and base arguments for a sidecar.
+// Every tool runs through the single dispatcher (py-sidecars/sidecar.py), which takes the tool name first.
+function resolveCommand(scriptName: string, args: string[]): { command: string; pArgs: string[] } {
+    const tool = scriptName.replace('.py', '');
+    if (isDev) {
+        // Development: Use Venv Python + dispatcher script
+        const command = path.join(__dirname, '../py-sidecars/venv/bin/python'); // Or 'python' if relying on PATH
+        const scriptPath = path.join(__dirname, '../py-sidecars/sidecar.py');
+        return { command, pArgs: [scriptPath, tool, ...args] };
+    }
+    // Production: Use the compiled onedir dispatcher (bin/sidecar/sidecar)
+    // Extension: '' on Linux/Mac, '.exe' on Windows
+    const ext = process.platform === 'win32' ? '.exe' : '';
+
+    return { command: path.join(process.resourcesPath, 'bin', 'sidecar', 'sidecar' + ext), pArgs: [tool, ...args] };
+}
+
+// Opt-in telemetry lines (CONVERTGG_TELEMETRY=1, see py-sidecars/telemetry.py) go to the log
+// and are kept out of the output callers parse
+const TELEMETRY_PREFIX = 'TELEMETRY: ';
+
+function isTelemetry(scriptName: string, line: string): boolean {
+    if (!line.startsWith(TELEMETRY_PREFIX)) return false;
+    console.log(`[${scriptName} telemetry]: ${line.slice(TELEMETRY_PREFIX.length)}`);
+    return true;
+}
 
+function stripTelemetry(scriptName: string, output: string): string {
+    if (!output.includes(TELEMETRY_PREFIX)) return output;
+    return output.split('\n').filter((line) => !isTelemetry(scriptName, line)).join('\n');
+}
+
+// Spawns a fresh process for a single operation
+// Returns the stdout output as a string; onProgress sees each line as it is printed
+function runPythonScriptOnce(scriptName: string, args: string[], onProgress?: (line: string) => void): Promise<string> {
+    return new Promise((resolve, reject) => {
+        const { command, pArgs } = resolveCommand(scriptName, args);
         const pythonProcess = spawn(command, pArgs);
 
         let outputData = '';
         let errorData = '';
+        let lineStart = 0;
 
         pythonProcess.stdout.on('data', (data) => {
             const str = data.toString();
             outputData += str;
             console.log(`[${scriptName} stdout]: ${str}`);
+            if (!onProgress) return;
+            let newline = outputData.indexOf('\n', lineStart);
+            while (newline !== -1) {
+                const line = outputData.slice(lineStart, newline).trim();
+                lineStart = newline + 1;
+                if (line && !line.startsWith(TELEMETRY_PREFIX)) onProgress(line);
+                newline = outputData.indexOf('\n', lineStart);
+            }
         });
 
         pythonProcess.stderr.on('data', (data) => {
@@ -45,10 +76,11 @@ export function runPythonScript(scriptName: string, args: string[]): Promise<str
         });
 
         pythonProcess.on('close', (code) => {
+            const output = stripTelemetry(scriptName, outputData).trim();
             if (code === 0) {
-                resolve(outputData.trim());
+                resolve(output);
             } else {
-                reject(new Error(`Script ${scriptName} failed with code ${code}. Error: ${errorData || outputData}`));
+                reject(new Error(`Script ${scriptName} failed with code ${code}. Error: ${errorData || output}`));
             }
         });
 
@@ -58,6 +90,202 @@ export function runPythonScript(scriptName: string, args: string[]): Promise<str
     });
 }
 
+// Raised when a server process could not be started at all, so the caller can fall back to one-shot mode
+class ServerUnavailableError extends Error { }
+
+type PendingRequest = {
+    resolve: (output: string) => void;
+    reject: (err: Error) => void;
+    // Interim lines already received; the full output is these followed by the final `output`
+    progress: string[];
+    onProgress?: (line: string) => void;
+};
+
+type ServerMessage = { id: number | null; ok: boolean; output: string; progress?: string };
+
+// One long-lived sidecar process speaking newline-delimited JSON over stdin/stdout
+class SidecarServer {
+    private process: ChildProcessWithoutNullStreams;
+    private pending = new Map<number, PendingRequest>();
+    private nextId = 1;
+    private stdoutBuffer = '';
+    private errorData = '';
+    private hasResponded = false;
+    exited = false;
+
+    constructor(private scriptName: string, onExit: () => void) {
+        const { command, pArgs } = resolveCommand(scriptName, ['serve']);
+        this.process = spawn(command, pArgs);
+
+        this.process.stdout.on('data', (data) => {
+            this.stdoutBuffer += data.toString();
+            let newline = this.stdoutBuffer.indexOf('\n');
+            while (newline !== -1) {
+                const line = this.stdoutBuffer.slice(0, newline).trim();
+                this.stdoutBuffer = this.stdoutBuffer.slice(newline + 1);
+                this.handleLine(line);
+                newline = this.stdoutBuffer.indexOf('\n');
+            }
+        });
+
+        this.process.stderr.on('data', (data) => {
+            const str = data.toString();
+            // Keep only the tail; a long-lived server can log a lot
+            this.errorData = (this.errorData + str).slice(-4096);
+            console.error(`[${scriptName} stderr]: ${str}`);
+        });
+
+        const fail = (reason: string) => {
+            if (this.exited) return;
+            this.exited = true;
+            onExit();
+            const error = this.hasResponded
+                ? new Error(`Sidecar server ${scriptName} exited: ${reason}. Error: ${this.errorData}`)
+                : new ServerUnavailableError(`Sidecar server ${scriptName} unavailable: ${reason}`);
+            this.pending.forEach(({ reject }) => reject(error));
+            this.pending.clear();
+        };
+
+        this.process.on('close', (code) => fail(`code ${code}`));
+        this.process.on('error', (err) => fail(err.message));
+    }
+
+    private handleLine(line: string) {
+        if (!line) return;
+        let message: ServerMessage;
+        try {
+            message = JSON.parse(line);
+        } catch (e) {
+            // Libraries occasionally print warnings on import; they are not protocol messages
+            console.log(`[${this.scriptName} stdout]: ${line}`);
+            return;
+        }
+        this.hasResponded = true;
+        if (message.id === null) {
+            console.error(`[${this.scriptName}] ${message.output}`);
+            return;
+        }
+        const request = this.pending.get(message.id);
+        if (!request) return;
+        if (message.progress !== undefined) {
+            if (!isTelemetry(this.scriptName, message.progress)) {
+                request.progress.push(message.progress);
+                request.onProgress?.(message.progress);
+            }
+            return;
+        }
+        this.pending.delete(message.id);
+        const output = stripTelemetry(this.scriptName, [...request.progress, message.output].join('\n')).trim();
+        console.log(`[${this.scriptName} #${message.id}]: ${output}`);
+        if (message.ok) {
+            request.resolve(output);
+        } else {
+            request.reject(new Error(`Script ${this.scriptName} failed. Error: ${output || this.errorData}`));
+        }
+    }
+
+    // Sends one request; onProgress receives each interim line the job prints before it finishes
+    request(payload: Record<string, unknown>, onProgress?: (line: string) => void): Promise<string> {
+        return new Promise((resolve, reject) => {
+            const id = this.nextId++;
+            this.pending.set(id, { resolve, reject, progress: [], onProgress });
+            this.process.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+        });
+    }
+
+    // Closing stdin lets the server finish in-flight requests and exit cleanly; resolves once it has
+    stop(): Promise<void> {
+        if (this.exited) return Promise.resolve();
+        return new Promise((resolve) => {
+            this.process.once('close', () => resolve());
+            this.process.stdin.end();
+        });
+    }
+}
+
+let scheduler: SidecarServer | null = null;
+// Set when the scheduler failed to start (e.g. an older binary); everything then stays on one-shot mode
+let schedulerUnsupported = false;
+
+function getScheduler(): SidecarServer {
+    if (!scheduler || scheduler.exited) {
+        const server: SidecarServer = new SidecarServer(SCHEDULER_SCRIPT, () => {
+            if (scheduler === server) scheduler = null;
+        });
+        scheduler = server;
+    }
+    return scheduler;
+}
+
+export type PythonJobOptions = {
+    priority?: number;
+    // Receives each output line as the job prints it (per-file results, extract progress, thumbnails)
+    onProgress?: (line: string) => void;
+};
+
+// Generic runner for any python script in py-sidecars
+// Returns the stdout output as a string
+export function runPythonScript(scriptName: string, args: string[], options: PythonJobOptions = {}): Promise<string> {
+    if (!SERVER_SCRIPTS.has(scriptName) || schedulerUnsupported) {
+        return runPythonScriptOnce(scriptName, args, options.onProgress);
+    }
+    const payload = { tool: scriptName.replace('.py', ''), argv: args, priority: options.priority ?? 0 };
+    return getScheduler().request(payload, options.onProgress).catch((err) => {
+        if (err instanceof ServerUnavailableError) {
+            schedulerUnsupported = true;
+            return runPythonScriptOnce(scriptName, args, options.onProgress);
+        }
+        throw err;
+    });
+}
+
+// Cancels a queued or running job; resolves false if it already finished
+export function cancelPythonJob(jobId: number): Promise<boolean> {
+    if (!scheduler || scheduler.exited) return Promise.resolve(false);
+    return scheduler.request({ cancel: jobId }).then(() => true, () => false);
+}
+
+export type PythonJobClassMetrics = {
+    limit: number;
+    running: number;
+    queued: number;
+    oldest_wait_s: number;
+    avg_wait_s: number | null;
+    max_wait_s: number;
+    completed: number;
+    failed: number;
+    cancelled: number;
+};
+
+export type PythonJobMetrics = {
+    classes: Record<'cpu' | 'memory' | 'io', PythonJobClassMetrics>;
+    jobs: { id: number; tool: string; command: string | null; resource: string; priority: number; state: string; waited_s: number; running_s: number | null }[];
+    idle_servers: Record<string, number>;
+};
+
+// Queue depth, wait times and live jobs per resource class; null when running without the scheduler
+export async function getPythonJobMetrics(): Promise<PythonJobMetrics | null> {
+    if (schedulerUnsupported) return null;
+    try {
+        return JSON.parse(await getScheduler().request({ metrics: true }));
+    } catch (err) {
+        if (err instanceof ServerUnavailableError) {
+            schedulerUnsupported = true;
+            return null;
+        }
+        throw err;
+    }
+}
+
+// Shuts down the scheduler, which finishes queued jobs and then stops its tool servers.
+// Resolves once it has exited, or after timeoutMs so a long job cannot hold up quitting
+export function stopPythonServers(timeoutMs = 5000): Promise<void> {
+    const server = scheduler;
+    scheduler = null;
+    if (!server) return Promise.resolve();
+    return Promise.race([server.stop(), new Promise<void>((resolve) => setTimeout(resolve, timeoutMs))]);
+}
+
 export function runOcrScript(inputPath: string, outputPath: string): Promise<void> {
     return runPythonScript('ocr_engine.py', [
         '--input_pdf_path', inputPath,
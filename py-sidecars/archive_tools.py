@@ -2,24 +2,303 @@
 import sys
 import argparse
 import os
+import io
+import bz2
+import gzip
+import lzma
+import zlib
 import json
+import copy
+import stat
+import fnmatch
+import struct
+import time
+import queue
+import threading
 import zipfile
 import tarfile
-import py7zr
-import rarfile
 import shutil
+from collections import namedtuple, deque
+from contextlib import ExitStack
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sidecar_server import add_serve_parser
+from disk_cache import DiskCache, default_cache_dir, file_identity, make_key
+from result_cache import add_result_cache_args, result_cache_from_args, run_cached
+import telemetry
 
-# Ensure we can handle 'rar' if available
-try:
+# Member index cache; bump ARCHIVE_INDEX_VERSION whenever cached indexes would change shape
+ARCHIVE_INDEX_VERSION = 1
+DEFAULT_INDEX_CACHE_MAX_MB = 64
+# Smaller archives are listed directly; that is as cheap as a cache read
+INDEX_CACHE_MIN_BYTES = 8 * 1024 * 1024
+
+# Copy buffer per member; members are streamed, never held in memory whole
+EXTRACT_BUFFER_BYTES = 1024 * 1024
+# 7z output needs a seekable source per member; members up to this size are spooled in memory
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+# Zip can't store timestamps before 1980-01-01
+ZIP_MIN_TIMESTAMP = 315532800
+
+# create: deflate input is cut into blocks compressed in parallel, pigz-style; each block
+# is primed with the previous block's last DEFLATE_WINDOW bytes so the ratio barely drops
+COMPRESS_BLOCK_BYTES = 1024 * 1024
+DEFLATE_WINDOW = 32 * 1024
+# bzip2/xz have no dictionary priming, so tar.bz2/tar.xz are written as concatenated streams of this size
+STREAM_BLOCK_BYTES = 8 * 1024 * 1024
+# Blocks in flight per worker thread
+BLOCKS_PER_WORKER = 4
+# Files that are already compressed are stored, by extension or by a quick probe of their start
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif', '.jxl',
+    '.mp4', '.m4v', '.mkv', '.mov', '.avi', '.webm', '.mp3', '.m4a', '.aac', '.ogg', '.opus', '.flac',
+    '.zip', '.7z', '.rar', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4',
+    '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.jar', '.apk', '.woff', '.woff2',
+}
+ENTROPY_PROBE_BYTES = 64 * 1024
+INCOMPRESSIBLE_RATIO = 0.95
+ZIP_CODECS = {
+    'store': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+DEFAULT_LEVELS = {'deflate': 6, 'bzip2': 9, 'lzma': 6}
+
+def _load_rarfile():
+    """
+    Imports rarfile on first use; like py7zr, it is only loaded by commands that touch such an archive.
+    """
+    import rarfile
+    # Ensure we can handle 'rar' if available
     rarfile.UNRAR_TOOL = "unrar"
-except:
-    pass
+    return rarfile
 
-def extract_archive(args):
+def _build_index(src):
+    """
+    Member list of src. For uncompressed tar it also records each header's offset,
+    so selected members can be read without walking the headers before them.
+    """
+    if zipfile.is_zipfile(src):
+        with zipfile.ZipFile(src, 'r') as zf:
+            members = [{"name": info.filename.rstrip('/'), "size": info.file_size, "compressed_size": info.compress_size,
+                        "mtime": time.mktime(info.date_time + (0, 0, -1)), "is_dir": info.is_dir()}
+                       for info in zf.infolist()]
+        return {"format": "zip", "members": members}
+    if tarfile.is_tarfile(src):
+        try:
+            tf = tarfile.open(src, 'r:')
+            fmt = 'tar'
+        except tarfile.ReadError:
+            tf = tarfile.open(src, 'r')
+            fmt = 'tar-compressed'
+        with tf:
+            members = [{"name": member.name, "size": member.size if member.isfile() else 0, "compressed_size": None,
+                        "mtime": member.mtime, "is_dir": member.isdir(), "offset": member.offset}
+                       for member in tf]
+        return {"format": fmt, "members": members}
+    if src.endswith('.7z'):
+        import py7zr
+        with py7zr.SevenZipFile(src, mode='r') as z:
+            members = [{"name": f.filename, "size": f.uncompressed or 0, "compressed_size": f.compressed,
+                        "mtime": f.lastwritetime.totimestamp() if f.lastwritetime else None, "is_dir": f.is_directory}
+                       for f in z.files]
+        return {"format": "7z", "members": members}
+    if src.lower().endswith('.rar'):
+        with _load_rarfile().RarFile(src) as rf:
+            members = [{"name": info.filename.rstrip('/'), "size": info.file_size, "compressed_size": info.compress_size,
+                        "mtime": time.mktime(info.date_time + (0, 0, -1)), "is_dir": info.is_dir()}
+                       for info in rf.infolist()]
+        return {"format": "rar", "members": members}
+    raise ValueError("Unsupported format")
+
+# Shared across requests in server mode
+_index_caches = {}
+
+def get_index_cache(cache_dir=None, max_mb=DEFAULT_INDEX_CACHE_MAX_MB):
+    directory = cache_dir or default_cache_dir('archive-index')
+    cache = _index_caches.get(directory)
+    if cache is None:
+        cache = _index_caches[directory] = DiskCache(directory, max_mb * 1024 * 1024)
+    return cache
+
+def get_member_index(src, cache=None):
+    """
+    {"format", "members"} for src, cached on (path, size, mtime) for large archives.
+    """
+    if cache is None or os.path.getsize(src) < INDEX_CACHE_MIN_BYTES:
+        return _build_index(src)
+    key = make_key('archive-index', str(ARCHIVE_INDEX_VERSION), *file_identity(src))
+    data = cache.get(key)
+    if data is not None:
+        return json.loads(data)
+    index = _build_index(src)
+    cache.put(key, json.dumps(index).encode('utf-8'))
+    return index
+
+def select_members(index, patterns):
+    """
+    Names of members matching any of `patterns`: exact names, globs, or a folder (selecting everything under it).
+    """
+    selected = set()
+    for entry in index["members"]:
+        name = entry["name"]
+        for pattern in patterns:
+            folder = pattern.rstrip('/')
+            if name == folder or name.startswith(folder + '/') or fnmatch.fnmatchcase(name, pattern):
+                selected.add(name)
+                break
+    if not selected:
+        raise ValueError(f"No members match: {', '.join(patterns)}")
+    return selected
+
+def safe_member_path(dst, name):
+    """
+    Target path for archive member `name` under dst, sanitized like ZipFile.extract:
+    drive letters, absolute paths and '..' components are dropped.
+    """
+    name = name.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ('', '.', '..')]
+    if parts:
+        parts[0] = os.path.splitdrive(parts[0])[1] or parts[0]
+    return os.path.join(dst, *parts)
+
+def _preallocate(f, size):
+    # Reserves the blocks up front so parallel writers don't fragment each other
+    if size <= 0:
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except (AttributeError, OSError):
+        pass
+
+def _extract_zip_member(zf, info, target):
+    with zf.open(info) as source, open(target, 'wb') as out:
+        _preallocate(out, info.file_size)
+        shutil.copyfileobj(source, out, EXTRACT_BUFFER_BYTES)
+    return info.filename, info.file_size
+
+def _iter_extract_zip(src, dst, workers, selected=None):
+    """
+    The central directory is read once; members are decompressed on a thread pool
+    (zlib/bz2/lzma release the GIL), largest first so the pool stays busy.
+    """
+    with zipfile.ZipFile(src, 'r') as zf:
+        # Later duplicates win, as with extractall
+        files = {}
+        for info in zf.infolist():
+            if selected is not None and info.filename.rstrip('/') not in selected:
+                continue
+            target = safe_member_path(dst, info.filename)
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+            else:
+                files[target] = info
+        for target in files:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        ordered = sorted(files.items(), key=lambda item: item[1].compress_size, reverse=True)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_extract_zip_member, zf, info, target) for target, info in ordered]
+            for future in as_completed(futures):
+                yield future.result()
+
+def _selected_tar_members(tf, selected, index):
+    if index and index["format"] == 'tar':
+        # Uncompressed: jump straight to each selected header
+        for entry in index["members"]:
+            if entry["name"] in selected:
+                tf.fileobj.seek(entry["offset"])
+                yield tarfile.TarInfo.fromtarfile(tf)
+        return
+    # Compressed: one pass, but stop as soon as everything selected was seen
+    remaining = set(selected)
+    for member in tf:
+        if member.name in remaining:
+            remaining.discard(member.name)
+            yield member
+            if not remaining:
+                break
+
+def _iter_extract_tar(src, dst, selected=None, index=None):
+    """
+    Compressed tar is one stream, so members come out sequentially. Directory
+    attributes are applied at the end, as extractall does.
+    """
+    with tarfile.open(src, 'r') as tf:
+        directories = []
+        for member in (tf if selected is None else _selected_tar_members(tf, selected, index)):
+            if member.isdir():
+                directories.append(member)
+            tf.extract(member, dst, set_attrs=not member.isdir())
+            yield member.name, member.size if member.isfile() else 0
+        for member in sorted(directories, key=lambda m: m.name, reverse=True):
+            dir_path = os.path.join(dst, member.name)
+            tf.chown(member, dir_path, False)
+            tf.utime(member, dir_path)
+            tf.chmod(member, dir_path)
+
+def _iter_extract_7z(src, dst, selected=None):
+    """
+    py7zr already decodes independent folders on threads; a solid block can only be
+    decoded front to back. Extraction runs on a helper thread so progress can be
+    reported from this one.
+    """
+    import py7zr
+    from py7zr_adapters import QueueExtractCallback
+    events = queue.Queue()
+    errors = []
+
+    def run():
+        try:
+            with py7zr.SevenZipFile(src, mode='r') as z:
+                if selected is None:
+                    z.extractall(path=dst, callback=QueueExtractCallback(events))
+                else:
+                    z.extract(path=dst, targets=selected, callback=QueueExtractCallback(events))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, daemon=True).start()
+    for event in iter(events.get, None):
+        yield event
+    if errors:
+        raise errors[0]
+
+def iter_extract(src, dst, workers=None, selected=None, index=None):
     """
-    Extracts archive to destination.
+    Extracts archive src into dst, yielding (member name, bytes written) as each member finishes.
+    `selected` limits extraction to those member names (see select_members).
     Supported: .zip, .tar, .tar.gz, .tgz, .gz, .7z, .rar
     """
+    if zipfile.is_zipfile(src):
+        yield from _iter_extract_zip(src, dst, workers or os.cpu_count() or 1, selected)
+    elif tarfile.is_tarfile(src):
+        yield from _iter_extract_tar(src, dst, selected, index)
+    elif src.endswith('.7z'):
+        yield from _iter_extract_7z(src, dst, selected)
+    elif src.lower().endswith('.rar'):
+        with _load_rarfile().RarFile(src) as rf:
+            if selected is None:
+                # unrar is an external process; let it extract everything in one go
+                rf.extractall(dst)
+            for info in rf.infolist():
+                if selected is not None:
+                    if info.filename.rstrip('/') not in selected:
+                        continue
+                    rf.extract(info, dst)
+                if not info.is_dir():
+                    yield info.filename, info.file_size
+    else:
+        raise ValueError("Unsupported format")
+
+def extract_archive(args):
+    """
+    Extracts archive to destination, printing one JSON progress line per member
+    and a STATS line with throughput.
+    """
     src = args.input_path
     dst = args.output_dir
     
@@ -27,64 +306,313 @@ def extract_archive(args):
         os.makedirs(dst)
 
     try:
-        if zipfile.is_zipfile(src):
-            with zipfile.ZipFile(src, 'r') as zf:
-                zf.extractall(dst)
-        elif tarfile.is_tarfile(src):
-            with tarfile.open(src, 'r') as tf:
-                tf.extractall(dst)
-        elif src.endswith('.7z'):
-            with py7zr.SevenZipFile(src, mode='r') as z:
-                z.extractall(path=dst)
-        elif src.lower().endswith('.rar'):
-            with rarfile.RarFile(src) as rf:
-                rf.extractall(dst)
-        else:
-             print("ERROR: Unsupported format")
-             sys.exit(1)
-             
+        start = time.perf_counter()
+        selected = index = None
+        if args.members:
+            with telemetry.stage('index') as counts:
+                index = get_member_index(src, None if args.no_cache else get_index_cache(args.cache_dir, args.cache_max_mb))
+                selected = select_members(index, args.members)
+                counts["members"] = len(index["members"])
+        members = total_bytes = 0
+        with telemetry.stage('extract') as counts:
+            for name, size in iter_extract(src, dst, args.workers, selected, index):
+                members += 1
+                total_bytes += size
+                print(json.dumps({"member": name, "bytes": size, "done": members}), flush=True)
+            counts.update(members=members, bytes=total_bytes)
+        elapsed = time.perf_counter() - start
+        print(f"STATS: {json.dumps({'members': members, 'bytes': total_bytes, 'seconds': round(elapsed, 3), 'mb_per_s': round(total_bytes / 1e6 / elapsed, 1) if elapsed else None})}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
+def list_archive(args):
+    """
+    Prints the member list (names, sizes, compressed sizes, mtimes) as one JSON line, without extracting.
+    """
+    try:
+        index = get_member_index(args.input_path, None if args.no_cache else get_index_cache(args.cache_dir, args.cache_max_mb))
+        members = [{key: entry[key] for key in ("name", "size", "compressed_size", "mtime", "is_dir")} for entry in index["members"]]
+        print(json.dumps({"format": index["format"], "count": len(members),
+                          "total_size": sum(entry["size"] for entry in members), "members": members}))
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def _deflate_block(data, level, zdict, last):
+    """
+    Raw deflate of one block. Non-final blocks end on a sync flush, so the blocks
+    concatenate into one valid stream. Blocks that don't shrink are stored instead.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict) if zdict else zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    if level and len(out) > len(data):
+        return _deflate_block(data, 0, None, last)
+    return out
+
+def _iter_blocks(f, size):
+    while True:
+        block = f.read(size)
+        if not block:
+            break
+        yield block
+
+def _deflate_jobs(blocks, level):
+    """
+    (function, args) per block, primed with the previous block's tail; the last block finishes the stream.
+    """
+    previous = None
+    zdict = None
+    for block in blocks:
+        if previous is not None:
+            yield _deflate_block, (previous, level, zdict, False)
+            zdict = previous[-DEFLATE_WINDOW:]
+        previous = block
+    yield _deflate_block, (previous or b'', level, zdict, True)
+
+def _compress_file(path, method, level):
+    """
+    Worker task for bzip2/lzma zip members, whose streams can't be split into blocks.
+    Returns (spooled compressed data, CRC, uncompressed size).
+    """
+    # zipfile's compressor writes the zip-specific LZMA properties header
+    compressor = zipfile._get_compressor(method, level)
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    crc = size = 0
+    with open(path, 'rb') as f:
+        for block in _iter_blocks(f, EXTRACT_BUFFER_BYTES):
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            out.write(compressor.compress(block))
+    out.write(compressor.flush())
+    out.seek(0)
+    return out, crc, size
+
+def is_incompressible(path):
+    if os.path.splitext(path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return True
+    with open(path, 'rb') as f:
+        sample = f.read(ENTROPY_PROBE_BYTES)
+    return len(sample) >= 1024 and len(zlib.compress(sample, 1)) >= len(sample) * INCOMPRESSIBLE_RATIO
+
+def _prefetch(events, depth):
+    # Pulling `depth` events ahead is what keeps that many blocks queued on the pool
+    window = deque()
+    for event in events:
+        window.append(event)
+        if len(window) >= depth:
+            yield window.popleft()
+    yield from window
+
+def _iter_input_files(inputs):
+    """
+    (path, arcname) pairs; folders are walked with names relative to their parent, as before.
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    yield file_path, os.path.relpath(file_path, os.path.dirname(item))
+        else:
+            yield item, os.path.basename(item)
+
+def _zip_create_events(inputs, pool, codec, level, stats):
+    """
+    Ordered stream of ('begin', ZipInfo, zip64) / ('data', future or bytes) / ('end', crc, size)
+    / ('spooled', future) events. Block compression is submitted as events are generated.
+    """
+    for path, arcname in _iter_input_files(inputs):
+        info = zipfile.ZipInfo.from_file(path, arcname)
+        method = ZIP_CODECS[codec]
+        if method != zipfile.ZIP_STORED and (info.file_size == 0 or is_incompressible(path)):
+            method = zipfile.ZIP_STORED
+            stats["stored"] += 1
+        info.compress_type = method
+        if method == zipfile.ZIP_LZMA:
+            info.flag_bits |= 0x02  # End-of-stream marker present, as ZipFile writes it
+        zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        info.CRC = info.compress_size = 0  # Placeholders until end_raw
+        stats["files"] += 1
+        stats["input_bytes"] += info.file_size
+        yield 'begin', info, zip64
+
+        if method in (zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA):
+            yield 'spooled', pool.submit(_compress_file, path, method, level)
+            continue
+
+        crc = size = 0
+        with open(path, 'rb') as f:
+            def blocks():
+                nonlocal crc, size
+                for block in _iter_blocks(f, COMPRESS_BLOCK_BYTES):
+                    crc = zlib.crc32(block, crc)
+                    size += len(block)
+                    yield block
+            if method == zipfile.ZIP_STORED:
+                for block in blocks():
+                    yield 'data', block
+            else:
+                for func, job_args in _deflate_jobs(blocks(), level):
+                    yield 'data', pool.submit(func, *job_args)
+        yield 'end', crc, size
+
+def create_zip(inputs, output, codec='deflate', level=None, workers=None):
+    level = DEFAULT_LEVELS.get(codec, 0) if level is None else level
+    workers = workers or os.cpu_count() or 1
+    stats = {"files": 0, "stored": 0, "input_bytes": 0}
+    writer = _ZipWriter(output)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            events = _zip_create_events(inputs, pool, codec, level, stats)
+            for event in _prefetch(events, workers * BLOCKS_PER_WORKER):
+                kind = event[0]
+                if kind == 'begin':
+                    writer.begin_raw(event[1], event[2])
+                elif kind == 'data':
+                    writer.write_raw(event[1] if isinstance(event[1], bytes) else event[1].result())
+                elif kind == 'end':
+                    writer.end_raw(event[1], event[2])
+                else:
+                    spool, crc, size = event[1].result()
+                    with spool:
+                        for block in _iter_blocks(spool, EXTRACT_BUFFER_BYTES):
+                            writer.write_raw(block)
+                    writer.end_raw(crc, size)
+    finally:
+        writer.close()
+    return stats
+
+class _ParallelCompressedWriter(io.RawIOBase):
+    """
+    Write-only file object producing a gzip, bzip2 or xz stream with blocks compressed
+    on a thread pool. gzip is one member built from primed deflate blocks (like pigz);
+    bzip2 and xz are concatenated independent streams: the bz2/lzma modules, bzip2, xz
+    and 7-Zip read them all, but tarfile's 'r|*' stops after the first (see _open_decompressed).
+    """
+
+    def __init__(self, path, codec, level, workers):
+        self._out = open(path, 'wb')
+        self._codec = codec
+        self._level = level
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._max_pending = workers * BLOCKS_PER_WORKER
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._block_size = COMPRESS_BLOCK_BYTES if codec == 'gzip' else STREAM_BLOCK_BYTES
+        self._zdict = None
+        self._crc = 0
+        self._size = 0
+        if codec == 'gzip':
+            # Magic, deflate, no flags, mtime, no extra flags, unknown OS
+            self._out.write(struct.pack('<BBBBLBB', 0x1f, 0x8b, 8, 0, int(time.time()), 0, 255))
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._size
+
+    def write(self, data):
+        self._buffer += data
+        self._size += len(data)
+        if self._codec == 'gzip':
+            self._crc = zlib.crc32(data, self._crc)
+        # Keep one block back so the final block is known when the stream closes
+        while len(self._buffer) > self._block_size:
+            block = bytes(self._buffer[:self._block_size])
+            del self._buffer[:self._block_size]
+            self._submit(block, last=False)
+        return len(data)
+
+    def _submit(self, block, last):
+        if self._codec == 'gzip':
+            self._pending.append(self._pool.submit(_deflate_block, block, self._level, self._zdict, last))
+            self._zdict = block[-DEFLATE_WINDOW:]
+        elif self._codec == 'bzip2':
+            self._pending.append(self._pool.submit(bz2.compress, block, self._level))
+        else:
+            self._pending.append(self._pool.submit(lzma.compress, block, format=lzma.FORMAT_XZ, preset=self._level))
+        while len(self._pending) >= self._max_pending:
+            self._out.write(self._pending.popleft().result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer or self._codec == 'gzip':
+                self._submit(bytes(self._buffer), last=True)
+            while self._pending:
+                self._out.write(self._pending.popleft().result())
+            if self._codec == 'gzip':
+                self._out.write(struct.pack('<LL', self._crc, self._size & 0xffffffff))
+        finally:
+            self._pool.shutdown()
+            self._out.close()
+            super().close()
+
+def create_tar(inputs, output, codec=None, level=None, workers=None):
+    workers = workers or os.cpu_count() or 1
+    stats = {"files": 0, "stored": 0, "input_bytes": 0}
+    fileobj = None
+    if codec:
+        fileobj = _ParallelCompressedWriter(output, codec, DEFAULT_LEVELS[{'gzip': 'deflate'}.get(codec, codec)] if level is None else level, workers)
+    try:
+        with tarfile.open(output, 'w', fileobj=fileobj) as tf:
+            for item in inputs:
+                tf.add(item, arcname=os.path.basename(item))
+        stats["input_bytes"] = fileobj.tell() if fileobj else os.path.getsize(output)
+    finally:
+        if fileobj is not None:
+            fileobj.close()
+    for item in inputs:
+        stats["files"] += sum(len(files) for _, _, files in os.walk(item)) if os.path.isdir(item) else 1
+    return stats
+
+def create_archive_file(inputs, output, codec='deflate', level=None, workers=None):
+    """
+    Creates `output` from files/folders, the format following its extension.
+    zip members use `codec` ('store', 'deflate', 'bzip2', 'lzma') except for files
+    that are already compressed, which are stored. Returns stats.
+    """
+    start = time.perf_counter()
+    lower = output.lower()
+    if lower.endswith('.zip'):
+        stats = create_zip(inputs, output, codec, level, workers)
+    elif lower.endswith('.tar'):
+        stats = create_tar(inputs, output, None, level, workers)
+    elif lower.endswith(('.tar.gz', '.tgz')):
+        stats = create_tar(inputs, output, 'gzip', level, workers)
+    elif lower.endswith(('.tar.bz2', '.tbz2')):
+        stats = create_tar(inputs, output, 'bzip2', level, workers)
+    elif lower.endswith(('.tar.xz', '.txz')):
+        stats = create_tar(inputs, output, 'lzma', level, workers)
+    elif lower.endswith('.7z'):
+        import py7zr
+        with py7zr.SevenZipFile(output, 'w') as z:
+            for item in inputs:
+                z.writeall(item, os.path.basename(item))
+        stats = {"files": len(inputs)}
+    else:
+        raise ValueError("Unsupported output format for creation")
+    elapsed = time.perf_counter() - start
+    stats["output_bytes"] = os.path.getsize(output)
+    stats["seconds"] = round(elapsed, 3)
+    if stats.get("input_bytes") and elapsed:
+        stats["mb_per_s"] = round(stats["input_bytes"] / 1e6 / elapsed, 1)
+    return stats
+
 def create_archive(args):
     """
     Creates an archive from a source folder or list of files.
     Format is determined by output extension or argument.
     """
-    # args.inputs is a list of file/folder paths
-    # args.output_path is the target archive file
-    inputs = args.inputs
-    output = args.output_path
-    
     try:
-        if output.endswith('.zip'):
-            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for item in inputs:
-                    if os.path.isdir(item):
-                        for root, _, files in os.walk(item):
-                            for file in files:
-                                file_path = os.path.join(root, file)
-                                arcname = os.path.relpath(file_path, os.path.dirname(item))
-                                zf.write(file_path, arcname)
-                    else:
-                        zf.write(item, os.path.basename(item))
-                        
-        elif output.endswith('.tar') or output.endswith('.tar.gz') or output.endswith('.tgz'):
-            mode = 'w:gz' if (output.endswith('gz') or output.endswith('tgz')) else 'w'
-            with tarfile.open(output, mode) as tf:
-                 for item in inputs:
-                    tf.add(item, arcname=os.path.basename(item))
-                    
-        elif output.endswith('.7z'):
-            with py7zr.SevenZipFile(output, 'w') as z:
-                 for item in inputs:
-                    z.writeall(item, os.path.basename(item))
-        else:
-            print("ERROR: Unsupported output format for creation")
-            sys.exit(1)
-
+        with telemetry.stage('compress') as counts:
+            stats = create_archive_file(args.inputs, args.output_path, args.codec, args.level, args.workers)
+            counts["bytes"] = os.path.getsize(args.output_path)
+        print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
@@ -92,74 +620,350 @@ def create_archive(args):
 
 import tempfile
 
-def convert_archive(args):
+# One entry of a source archive during convert. kind is 'file', 'dir' or 'symlink';
+# open() returns a binary stream of the contents; zip_source is (path, ZipInfo) for zip inputs.
+ArchiveMember = namedtuple('ArchiveMember', ['name', 'kind', 'size', 'mtime', 'mode', 'linkname', 'open', 'zip_source'])
+
+def _zip_members(src):
+    with zipfile.ZipFile(src, 'r') as zf:
+        for info in zf.infolist():
+            unix_mode = info.external_attr >> 16
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            name = info.filename.rstrip('/')
+            if info.is_dir():
+                yield ArchiveMember(name, 'dir', 0, mtime, stat.S_IMODE(unix_mode) or None, '', None, None)
+            elif stat.S_ISLNK(unix_mode):
+                yield ArchiveMember(name, 'symlink', 0, mtime, None, zf.read(info).decode('utf-8'), None, None)
+            else:
+                yield ArchiveMember(name, 'file', info.file_size, mtime, stat.S_IMODE(unix_mode) or None, '',
+                                    partial(zf.open, info), (src, info))
+
+def _open_decompressed(src):
     """
-    Converts archive from one format to another.
-    Process: Extract to temp -> Create new archive from temp -> Delete temp
+    Binary stream of src's tar data. The codec modules read every stream of a
+    multi-stream file (create writes bzip2 and xz as one stream per block);
+    tarfile's own stream mode stops after the first.
     """
-    input_path = args.input_path
-    output_path = args.output_path
-    
-    # 1. Create temp dir
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # 2. Extract to temp
+    with open(src, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.open(src, 'rb')
+    if magic.startswith(b'BZh'):
+        return bz2.open(src, 'rb')
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        return lzma.open(src, 'rb')
+    return open(src, 'rb')
+
+def _tar_members(src):
+    # Stream mode: one pass over the (possibly compressed) tar, no seeking back
+    with ExitStack() as stack:
+        raw = stack.enter_context(_open_decompressed(src))
+        tf = stack.enter_context(tarfile.open(fileobj=raw, mode='r|'))
+        for member in tf:
+            if member.isdir():
+                yield ArchiveMember(member.name.rstrip('/'), 'dir', 0, member.mtime, member.mode, '', None, None)
+            elif member.issym():
+                yield ArchiveMember(member.name, 'symlink', 0, member.mtime, member.mode, member.linkname, None, None)
+            elif member.isfile():
+                yield ArchiveMember(member.name, 'file', member.size, member.mtime, member.mode, '',
+                                    partial(tf.extractfile, member), None)
+
+def _7z_members(src):
+    """
+    py7zr can't hand out member streams, so it decodes into pipes on a helper
+    thread and members are yielded in decode order.
+    """
+    import py7zr
+    from py7zr_adapters import PipeFactory
+    with py7zr.SevenZipFile(src, mode='r') as z:
+        files = {f.filename: f for f in z.files}
+        for f in z.files:
+            if f.is_directory:
+                yield ArchiveMember(f.filename, 'dir', 0, f.lastwritetime.totimestamp(), f.posix_mode, '', None, None)
+
+        factory = PipeFactory()
+        errors = []
+
+        def run():
+            try:
+                z.extractall(factory=factory)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                factory.pipes.put(None)
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
         try:
-             # Reuse extract logic manually or call function? 
-             # Manual is safer since arguments object differs
-            if zipfile.is_zipfile(input_path):
-                with zipfile.ZipFile(input_path, 'r') as zf:
-                    zf.extractall(temp_dir)
-            elif tarfile.is_tarfile(input_path):
-                with tarfile.open(input_path, 'r') as tf:
-                    tf.extractall(temp_dir)
-            elif input_path.endswith('.7z'):
-                with py7zr.SevenZipFile(input_path, mode='r') as z:
-                    z.extractall(path=temp_dir)
-            elif input_path.lower().endswith('.rar'):
-                with rarfile.RarFile(input_path) as rf:
-                    rf.extractall(temp_dir)
+            for pipe in iter(factory.pipes.get, None):
+                f = files[pipe.name]
+                mtime = f.lastwritetime.totimestamp() if f.lastwritetime else time.time()
+                if f.is_symlink:
+                    yield ArchiveMember(f.filename, 'symlink', 0, mtime, None, pipe.read().decode('utf-8'), None, None)
+                else:
+                    yield ArchiveMember(f.filename, 'file', f.uncompressed, mtime, f.posix_mode, '', lambda pipe=pipe: pipe, None)
+                # Whatever the writer didn't read must not block the decoder
+                pipe.abort()
+        finally:
+            for pipe in factory.created:
+                pipe.abort()
+            worker.join()
+        if errors:
+            raise errors[0]
+
+def _rar_members(src):
+    with _load_rarfile().RarFile(src) as rf:
+        for info in rf.infolist():
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            if info.is_dir():
+                yield ArchiveMember(info.filename.rstrip('/'), 'dir', 0, mtime, None, '', None, None)
             else:
-                 print("ERROR: Unsupported input format")
-                 sys.exit(1)
-        except Exception as e:
-            print(f"ERROR: Extraction failed - {str(e)}")
-            sys.exit(1)
-            
-        # 3. Create new archive from temp
+                yield ArchiveMember(info.filename, 'file', info.file_size, mtime, None, '', partial(rf.open, info), None)
+
+def iter_members(src):
+    """
+    Yields ArchiveMembers of src in archive order without extracting to disk.
+    """
+    if zipfile.is_zipfile(src):
+        return _zip_members(src)
+    if tarfile.is_tarfile(src):
+        return _tar_members(src)
+    if src.endswith('.7z'):
+        return _7z_members(src)
+    if src.lower().endswith('.rar'):
+        return _rar_members(src)
+    raise ValueError("Unsupported input format")
+
+def _strip_zip64_extra(extra):
+    # The zip64 field is rewritten by ZipInfo.FileHeader when needed
+    out = b''
+    while len(extra) >= 4:
+        field_id, length = struct.unpack('<HH', extra[:4])
+        if field_id != 0x0001:
+            out += extra[:4 + length]
+        extra = extra[4 + length:]
+    return out
+
+class _ZipWriter:
+    def __init__(self, path, compression=zipfile.ZIP_DEFLATED):
+        self.zf = zipfile.ZipFile(path, 'w', compression)
+        self.compression = compression
+        self.raw_copies = 0
+
+    def _info(self, name, member):
+        return zipfile.ZipInfo(name, time.localtime(max(member.mtime, ZIP_MIN_TIMESTAMP))[:6])
+
+    def add(self, member):
+        if member.kind == 'dir':
+            info = self._info(member.name + '/', member)
+            info.external_attr = ((member.mode or 0o755) | stat.S_IFDIR) << 16 | 0x10
+            self.zf.writestr(info, b'')
+        elif member.kind == 'symlink':
+            info = self._info(member.name, member)
+            info.external_attr = (0o777 | stat.S_IFLNK) << 16
+            self.zf.writestr(info, member.linkname)
+        elif member.zip_source and not member.zip_source[1].flag_bits & 0x1:
+            self._copy_raw(*member.zip_source)
+        else:
+            info = self._info(member.name, member)
+            info.compress_type = self.compression
+            info.external_attr = ((member.mode or 0o644) | stat.S_IFREG) << 16
+            info.file_size = member.size
+            with member.open() as source, self.zf.open(info, 'w') as out:
+                shutil.copyfileobj(source, out, EXTRACT_BUFFER_BYTES)
+
+    def begin_raw(self, info, zip64):
+        """
+        Starts a member whose data is written already compressed with write_raw;
+        end_raw fills in the CRC and sizes, the way ZipFile does for streamed writes.
+        """
+        zf = self.zf
+        zf.fp.seek(zf.start_dir)
+        info.header_offset = zf.fp.tell()
+        info.flag_bits &= ~0x08  # Sizes go in the local header, no data descriptor
+        self._raw_info = info
+        self._raw_zip64 = zip64
+        self._raw_compressed = 0
+        zf.fp.write(info.FileHeader(zip64))
+
+    def write_raw(self, data):
+        self.zf.fp.write(data)
+        self._raw_compressed += len(data)
+
+    def end_raw(self, crc=None, file_size=None):
+        zf = self.zf
+        info = self._raw_info
+        if crc is not None:
+            info.CRC = crc
+            info.file_size = file_size
+        info.compress_size = self._raw_compressed
+        end = zf.fp.tell()
+        zf.fp.seek(info.header_offset)
+        zf.fp.write(info.FileHeader(self._raw_zip64))
+        zf.fp.seek(end)
+        zf.start_dir = end
+        zf.filelist.append(info)
+        zf.NameToInfo[info.filename] = info
+        zf._didModify = True
+        self._raw_info = None
+
+    def _copy_raw(self, src_path, src_info):
+        """
+        Copies a zip member's compressed bytes as they are (no inflate/deflate).
+        """
+        info = copy.copy(src_info)
+        info.extra = _strip_zip64_extra(src_info.extra)
+        with open(src_path, 'rb') as source:
+            source.seek(src_info.header_offset)
+            header = source.read(zipfile.sizeFileHeader)
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            source.seek(src_info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+            self.begin_raw(info, info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT)
+            remaining = info.compress_size
+            while remaining:
+                chunk = source.read(min(remaining, EXTRACT_BUFFER_BYTES))
+                if not chunk:
+                    raise ValueError(f"Truncated zip member: {src_info.filename}")
+                self.write_raw(chunk)
+                remaining -= len(chunk)
+            self.end_raw()
+        self.raw_copies += 1
+
+    def close(self):
+        self.zf.close()
+
+class _TarWriter:
+    def __init__(self, path, mode):
+        self.tf = tarfile.open(path, mode)
+        self.raw_copies = 0
+
+    def add(self, member):
+        info = tarfile.TarInfo(member.name)
+        info.mtime = member.mtime
+        if member.kind == 'dir':
+            info.type = tarfile.DIRTYPE
+            info.mode = member.mode or 0o755
+            self.tf.addfile(info)
+        elif member.kind == 'symlink':
+            info.type = tarfile.SYMTYPE
+            info.linkname = member.linkname
+            info.mode = 0o777
+            self.tf.addfile(info)
+        else:
+            info.size = member.size
+            info.mode = member.mode or 0o644
+            with member.open() as source:
+                self.tf.addfile(info, source)
+
+    def close(self):
+        self.tf.close()
+
+class _SevenZipWriter:
+    """
+    py7zr's writer needs a seekable source of known size per member, so each member
+    is spooled (in memory up to SPOOL_MAX_BYTES) rather than the whole archive.
+    """
+
+    def __init__(self, path):
+        import py7zr
+        self.z = py7zr.SevenZipFile(path, 'w')
+        self.raw_copies = 0
+        self._empty_dir = None
+
+    def add(self, member):
+        if member.kind == 'dir':
+            if self._empty_dir is None:
+                self._empty_dir = tempfile.mkdtemp(prefix='convertgg-')
+            self.z.write(self._empty_dir, member.name)
+            self._set_metadata(member, stat.S_IFDIR, stat.FILE_ATTRIBUTE_DIRECTORY)
+        elif member.kind == 'symlink':
+            self.z.writef(io.BytesIO(member.linkname.encode('utf-8')), member.name)
+            self._set_metadata(member, stat.S_IFLNK, stat.FILE_ATTRIBUTE_ARCHIVE | stat.FILE_ATTRIBUTE_REPARSE_POINT)
+        else:
+            spool = io.BytesIO() if member.size <= SPOOL_MAX_BYTES else tempfile.TemporaryFile()
+            with spool, member.open() as source:
+                shutil.copyfileobj(source, spool, EXTRACT_BUFFER_BYTES)
+                spool.seek(0)
+                self.z.writef(spool, member.name)
+            self._set_metadata(member, stat.S_IFREG, stat.FILE_ATTRIBUTE_ARCHIVE)
+
+    def _set_metadata(self, member, type_bits, win_attributes):
+        # writef stamps entries with the current time and default permissions
         try:
-            # Gather all files in temp_dir
-            files_to_pack = []
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    files_to_pack.append(os.path.join(root, file))
-            
-            # Reuse creation logic
-            if output_path.endswith('.zip'):
-                with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    for item in files_to_pack:
-                        arcname = os.path.relpath(item, temp_dir)
-                        zf.write(item, arcname)
-            elif output_path.endswith('.tar') or output_path.endswith('.tar.gz') or output_path.endswith('.tgz'):
-                mode = 'w:gz' if (output_path.endswith('gz') or output_path.endswith('tgz')) else 'w'
-                with tarfile.open(output_path, mode) as tf:
-                     for item in files_to_pack:
-                        arcname = os.path.relpath(item, temp_dir)
-                        tf.add(item, arcname=arcname)
-            elif output_path.endswith('.7z'):
-                with py7zr.SevenZipFile(output_path, 'w') as z:
-                     for item in files_to_pack:
-                        arcname = os.path.relpath(item, temp_dir)
-                        z.write(item, arcname)
-            else:
-                print("ERROR: Unsupported output format")
-                sys.exit(1)
-                
-            print("SUCCESS")
-        except Exception as e:
-            print(f"ERROR: Creation failed - {str(e)}")
-            sys.exit(1)
+            entry = self.z.header.files_info.files[-1]
+        except (AttributeError, IndexError):
+            return
+        from py7zr.helpers import ArchiveTimestamp
+        entry['lastwritetime'] = ArchiveTimestamp.from_datetime(member.mtime)
+        mode = member.mode or (0o755 if member.kind == 'dir' else 0o644)
+        # Low 16 bits: Windows attributes; 0x8000 flags the Unix mode stored in the high 16 bits
+        entry['attributes'] = win_attributes | 0x8000 | ((type_bits | stat.S_IMODE(mode)) << 16)
 
-if __name__ == "__main__":
+    def close(self):
+        self.z.close()
+        if self._empty_dir is not None:
+            shutil.rmtree(self._empty_dir, ignore_errors=True)
+
+# Output formats open_archive_writer understands
+ARCHIVE_OUTPUT_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.7z')
+
+def open_archive_writer(output_path):
+    lower = output_path.lower()
+    if lower.endswith('.zip'):
+        return _ZipWriter(output_path)
+    if lower.endswith('.tar'):
+        return _TarWriter(output_path, 'w')
+    if lower.endswith(('.tar.gz', '.tgz')):
+        return _TarWriter(output_path, 'w:gz')
+    if lower.endswith(('.tar.bz2', '.tbz2')):
+        return _TarWriter(output_path, 'w:bz2')
+    if lower.endswith(('.tar.xz', '.txz')):
+        return _TarWriter(output_path, 'w:xz')
+    if lower.endswith('.7z'):
+        return _SevenZipWriter(output_path)
+    raise ValueError("Unsupported output format")
+
+def transcode_archive(input_path, output_path):
+    """
+    Streams every member of input_path straight into a new archive at output_path,
+    keeping mtimes, permissions, empty directories and symlinks. Zip to zip copies
+    the compressed data without recompressing. Returns stats.
+    """
+    start = time.perf_counter()
+    stats = {"members": 0, "bytes": 0, "raw_copies": 0}
+    writer = open_archive_writer(output_path)
+    try:
+        # Members are read and rewritten one at a time, so reading and writing share one stage
+        with telemetry.stage('transcode') as counts:
+            for member in iter_members(input_path):
+                writer.add(member)
+                stats["members"] += 1
+                stats["bytes"] += member.size
+            counts.update(members=stats["members"], bytes=stats["bytes"])
+    finally:
+        with telemetry.stage('finish'):
+            writer.close()
+    stats["raw_copies"] = writer.raw_copies
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def convert_archive(args):
+    """
+    Converts archive from one format to another, member by member with no temp directory.
+    """
+    try:
+        # The writer is picked by extension, so that is the only parameter
+        output_format = next((ext for ext in ARCHIVE_OUTPUT_EXTENSIONS if args.output_path.lower().endswith(ext)), None)
+        cache = result_cache_from_args(args) if output_format else None
+        stats = run_cached(cache, 'convert_archive', [args.input_path], {"format": output_format}, args.output_path,
+                           lambda: transcode_archive(args.input_path, args.output_path))
+        print(f"STATS: {json.dumps(stats)}")
+        print("SUCCESS")
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def build_parser():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest='command')
 
@@ -167,22 +971,48 @@ if __name__ == "__main__":
     p_extract = subparsers.add_parser('extract')
     p_extract.add_argument('--input_path', required=True)
     p_extract.add_argument('--output_dir', required=True)
+    p_extract.add_argument('--workers', type=int) # Zip decompression threads, defaults to the number of cores
+    p_extract.add_argument('--members', nargs='+') # Only these names, globs or folders
+    p_extract.add_argument('--cache_dir') # Member index cache, defaults to the per-user cache directory
+    p_extract.add_argument('--cache_max_mb', type=int, default=DEFAULT_INDEX_CACHE_MAX_MB)
+    p_extract.add_argument('--no_cache', action='store_true')
+
+    # List
+    p_list = subparsers.add_parser('list')
+    p_list.add_argument('--input_path', required=True)
+    p_list.add_argument('--cache_dir')
+    p_list.add_argument('--cache_max_mb', type=int, default=DEFAULT_INDEX_CACHE_MAX_MB)
+    p_list.add_argument('--no_cache', action='store_true')
+    p_list.set_defaults(func=list_archive)
     p_extract.set_defaults(func=extract_archive)
 
     # Create
     p_create = subparsers.add_parser('create')
     p_create.add_argument('--inputs', nargs='+', required=True)
     p_create.add_argument('--output_path', required=True)
+    p_create.add_argument('--codec', choices=sorted(ZIP_CODECS), default='deflate') # zip member codec; tar codecs follow the extension
+    p_create.add_argument('--level', type=int) # Compression level, codec default if omitted
+    p_create.add_argument('--workers', type=int) # Compression threads, defaults to the number of cores
     p_create.set_defaults(func=create_archive)
 
     # Convert
     p_convert = subparsers.add_parser('convert')
     p_convert.add_argument('--input_path', required=True)
     p_convert.add_argument('--output_path', required=True)
+    add_result_cache_args(p_convert)
     p_convert.set_defaults(func=convert_archive)
 
-    args = parser.parse_args()
+    # Server mode: archive work is mostly I/O, a couple of requests in parallel is plenty
+    add_serve_parser(subparsers, parser, default_workers=2)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
     if hasattr(args, 'func'):
-        args.func(args)
+        telemetry.run_command(parser.prog, args)
     else:
         parser.print_help()
+
+if __name__ == "__main__":
+    main()
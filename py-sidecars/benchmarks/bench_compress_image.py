@@ -0,0 +1,102 @@
+"""
+Benchmark for media_tools.encode_to_target_size.
+
+Compares the size-targeted encoder against the previous approach (7-step
+binary search on quality plus a final re-encode) on synthetic photos. It
+reports full-resolution encodes per image, wall time and the quality/size
+each approach lands on.
+
+    python benchmarks/bench_compress_image.py
+    python benchmarks/bench_compress_image.py --megapixels 40 --format WEBP
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from PIL import Image, ImageFilter
+import media_tools
+
+
+def make_photo(megapixels, seed, blur):
+    """
+    Deterministic photo-like RGB image: gradients plus noise, optionally softened.
+    """
+    rng = np.random.default_rng(seed)
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    y, x = np.mgrid[0:height, 0:width]
+    arr = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=-1).astype(np.int16)
+    arr = np.clip(arr + rng.normal(0, 20, arr.shape), 0, 255).astype(np.uint8)
+    img = Image.fromarray(arr)
+    return img.filter(ImageFilter.GaussianBlur(blur)) if blur else img
+
+
+def legacy_search(img, fmt, target_size):
+    """
+    The original compress_image loop: 7 binary-search encodes, then an 8th to write the result.
+    """
+    min_quality, max_quality, best_quality = 5, 95, 95
+    for _ in range(7):
+        mid_quality = (min_quality + max_quality) // 2
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=mid_quality)
+        if buf.tell() <= target_size:
+            best_quality = mid_quality
+            min_quality = mid_quality + 1
+        else:
+            max_quality = mid_quality - 1
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=best_quality)
+    return {"encodes": 8, "quality": best_quality, "size": buf.tell()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Target-size image encoder benchmark")
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--format', default='JPEG', choices=['JPEG', 'WEBP'])
+    parser.add_argument('--targets_kb', type=int, nargs='+', default=[2000, 1000, 500, 250])
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    images = {
+        "noisy": make_photo(args.megapixels, seed=1, blur=0),
+        "smooth": make_photo(args.megapixels, seed=2, blur=3),
+    }
+
+    results = []
+    for name, img in images.items():
+        for target_kb in args.targets_kb:
+            target = target_kb * 1024
+            start = time.perf_counter()
+            legacy = legacy_search(img, args.format, target)
+            legacy["seconds"] = round(time.perf_counter() - start, 3)
+
+            start = time.perf_counter()
+            _, new = media_tools.encode_to_target_size(img, args.format, target)
+            new["seconds"] = round(time.perf_counter() - start, 3)
+
+            results.append({"image": name, "target_kb": target_kb, "legacy": legacy, "new": new})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'image':>7} {'target':>7} | {'old enc':>7} {'old q':>5} {'old s':>7} | "
+          f"{'new enc':>7} {'probe':>5} {'new q':>5} {'new s':>7}")
+    for r in results:
+        old, new = r["legacy"], r["new"]
+        print(f"{r['image']:>7} {r['target_kb']:>6}k | {old['encodes']:>7} {old['quality']:>5} {old['seconds']:>7.2f} | "
+              f"{new['encodes']:>7} {new['probe_encodes']:>5} {new['quality']:>5} {new['seconds']:>7.2f}")
+    avg_old = sum(r["legacy"]["encodes"] for r in results) / len(results)
+    avg_new = sum(r["new"]["encodes"] for r in results) / len(results)
+    print(f"\nFull-resolution encodes per image: {avg_old:.1f} -> {avg_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
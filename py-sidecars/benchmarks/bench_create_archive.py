@@ -0,0 +1,122 @@
+"""
+Throughput benchmark for archive_tools.create_archive_file.
+
+Builds a deterministic corpus (compressible text, one large log and some
+already-compressed "photos"), then compares the previous create_archive
+behaviour (serial ZIP_DEFLATED, single-threaded w:gz) against the parallel
+engine at several worker counts. Reports MB/s and output size.
+
+    python benchmarks/bench_create_archive.py
+    python benchmarks/bench_create_archive.py --mb 512 --workers 1 4 8 --formats zip tar.gz tar.xz
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import archive_tools
+
+WORDS = ("convert archive member stream block deflate window thread pool level codec "
+         "header offset central directory record entry buffer chunk worker queue").split()
+
+
+def make_corpus(root, total_mb, seed=0):
+    """
+    Writes ~total_mb of files under root: 70% text, 20% one large log, 10% random bytes named .jpg.
+    """
+    rng = random.Random(seed)
+    total = total_mb * 1024 * 1024
+    os.makedirs(os.path.join(root, 'docs'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'photos'), exist_ok=True)
+
+    def text(size):
+        lines = []
+        length = 0
+        while length < size:
+            line = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))) + f" {rng.randint(0, 99999)}\n"
+            lines.append(line)
+            length += len(line)
+        return ''.join(lines).encode('ascii')[:size]
+
+    written = 0
+    n = 0
+    while written < total * 0.7:
+        size = rng.randint(16 * 1024, 2 * 1024 * 1024)
+        with open(os.path.join(root, 'docs', f'doc_{n:04d}.txt'), 'wb') as f:
+            f.write(text(size))
+        written += size
+        n += 1
+    with open(os.path.join(root, 'server.log'), 'wb') as f:
+        f.write(text(int(total * 0.2)))
+    for i in range(8):
+        with open(os.path.join(root, 'photos', f'img_{i}.jpg'), 'wb') as f:
+            f.write(rng.randbytes(int(total * 0.1 / 8)))
+
+
+def legacy_create(inputs, output):
+    """
+    The original create_archive: serial ZIP_DEFLATED, or tarfile's single-threaded gzip stream.
+    """
+    if output.endswith('.zip'):
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for item in inputs:
+                for root, _, files in os.walk(item):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        zf.write(file_path, os.path.relpath(file_path, os.path.dirname(item)))
+    else:
+        mode = {'tar.gz': 'w:gz', 'tar.xz': 'w:xz', 'tar.bz2': 'w:bz2'}[output.split('.', 1)[1]]
+        with tarfile.open(output, mode) as tf:
+            for item in inputs:
+                tf.add(item, arcname=os.path.basename(item))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive creation throughput benchmark")
+    parser.add_argument('--mb', type=int, default=128, help='Corpus size in MB')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--formats', nargs='+', default=['zip', 'tar.gz'], choices=['zip', 'tar.gz', 'tar.xz', 'tar.bz2'])
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, 'corpus')
+        make_corpus(corpus, args.mb)
+        input_bytes = sum(os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(corpus) for f in files)
+
+        for fmt in args.formats:
+            output = os.path.join(tmp, f'legacy.{fmt}')
+            start = time.perf_counter()
+            legacy_create([corpus], output)
+            elapsed = time.perf_counter() - start
+            results.append({"format": fmt, "engine": "legacy", "workers": 1, "seconds": round(elapsed, 3),
+                            "mb_per_s": round(input_bytes / 1e6 / elapsed, 1), "output_bytes": os.path.getsize(output)})
+            os.remove(output)
+
+            for workers in args.workers:
+                output = os.path.join(tmp, f'new_{workers}.{fmt}')
+                stats = archive_tools.create_archive_file([corpus], output, workers=workers)
+                results.append({"format": fmt, "engine": "parallel", "workers": workers, "seconds": stats["seconds"],
+                                "mb_per_s": round(input_bytes / 1e6 / stats["seconds"], 1), "output_bytes": stats["output_bytes"]})
+                os.remove(output)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'format':>8} {'engine':>9} {'workers':>8} {'seconds':>8} {'MB/s':>8} {'output MB':>10}")
+    for r in results:
+        print(f"{r['format']:>8} {r['engine']:>9} {r['workers']:>8} {r['seconds']:>8.2f} {r['mb_per_s']:>8.1f} "
+              f"{r['output_bytes'] / 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
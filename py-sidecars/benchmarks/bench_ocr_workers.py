@@ -0,0 +1,79 @@
+"""
+Scaling benchmark for ocr_engine --workers.
+
+Runs the same PDF through ocr_pdf_to_docx with 1, 2, 4 and 8 workers and
+prints wall time, pages/s and speedup over a single worker. Without --pdf a
+synthetic scanned document (text pages flattened to images) is generated.
+
+    python benchmarks/bench_ocr_workers.py --pages 32
+    python benchmarks/bench_ocr_workers.py --pdf scan.pdf --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import fitz  # PyMuPDF
+import ocr_engine
+
+
+def make_scanned_pdf(path, pages):
+    """
+    Writes a deterministic `pages`-page PDF whose pages are images of text, so OCR has real work to do.
+    """
+    out = fitz.open()
+    for n in range(pages):
+        src = fitz.open()
+        page = src.new_page()
+        for line in range(40):
+            page.insert_text((50, 60 + line * 18), f"Page {n + 1} line {line + 1}: The quick brown fox jumps over the lazy dog.")
+        pix = page.get_pixmap(dpi=150)
+        scan = out.new_page(width=page.rect.width, height=page.rect.height)
+        scan.insert_image(scan.rect, stream=pix.tobytes("png"))
+        src.close()
+    out.save(path)
+    out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR worker scaling benchmark")
+    parser.add_argument('--pdf', help='PDF to OCR (default: generate a synthetic scan)')
+    parser.add_argument('--pages', type=int, default=16, help='Pages in the synthetic scan')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(tmp, 'scan.pdf')
+            make_scanned_pdf(pdf_path, args.pages)
+
+        results = []
+        for workers in args.workers:
+            # Fresh engines per run so every row includes its own model load
+            ocr_engine.unload_table_engine()
+            stats = ocr_engine.ocr_pdf_to_docx(pdf_path, os.path.join(tmp, f'out_{workers}.docx'), workers=workers)
+            results.append(stats)
+        ocr_engine.unload_table_engine()
+
+    baseline = results[0]["total_s"]
+    for stats in results:
+        stats["pages_per_s"] = round(stats["pages"] / stats["total_s"], 3) if stats["total_s"] else None
+        stats["speedup"] = round(baseline / stats["total_s"], 2) if stats["total_s"] else None
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'workers':>8} {'pages':>6} {'total_s':>9} {'load_s':>8} {'pages/s':>8} {'speedup':>8}")
+    for stats in results:
+        print(f"{stats['workers']:>8} {stats['pages']:>6} {stats['total_s']:>9.2f} "
+              f"{stats['model_load_s']:>8.2f} {stats['pages_per_s']:>8.2f} {stats['speedup']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
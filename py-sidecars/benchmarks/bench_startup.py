@@ -0,0 +1,154 @@
+"""
+Cold-start benchmark for the sidecar dispatcher.
+
+Runs every subcommand once per repeat as a fresh process on a tiny
+deterministic corpus, so the time is almost all interpreter start-up and
+imports. Reports the median wall time and, from an extra run under
+`-X importtime`, the total import time and the heaviest packages loaded.
+Tools that need external software (LibreOffice, OCR models) are timed on --help.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --binary ../dist-python/sidecar/sidecar --repeat 10
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+SIDECARS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SIDECARS_DIR)
+
+import sidecar
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+
+def make_corpus(root):
+    """
+    Writes a small PDF, PNG and zip under root and returns their paths.
+    """
+    import fitz  # PyMuPDF
+    from PIL import Image
+
+    pdf = os.path.join(root, 'doc.pdf')
+    doc = fitz.open()
+    for n in range(4):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {n + 1}")
+    doc.save(pdf)
+    doc.close()
+
+    png = os.path.join(root, 'image.png')
+    Image.new('RGB', (320, 240), (40, 120, 200)).save(png)
+
+    archive = os.path.join(root, 'files.zip')
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for n in range(8):
+            zf.writestr(f'files/{n}.txt', f"line {n}\n" * 200)
+    return {"pdf": pdf, "png": png, "zip": archive}
+
+
+def cases(corpus, out):
+    """
+    (tool, argv) for every subcommand, with outputs under out.
+    """
+    pdf, png, archive = corpus["pdf"], corpus["png"], corpus["zip"]
+    return [
+        ('pdf_tools', ['count', '--input_path', pdf, '--no_cache']),
+        ('pdf_tools', ['inspect', '--input_path', pdf, '--no_cache']),
+        ('pdf_tools', ['thumbnail', '--input_path', pdf, '--pages', '1', '--no_cache']),
+        ('pdf_tools', ['merge', '--inputs', pdf, pdf, '--output_path', os.path.join(out, 'merged.pdf')]),
+        ('pdf_tools', ['split', '--input_path', pdf, '--output_dir', os.path.join(out, 'split'), '--workers', '1']),
+        ('pdf_tools', ['extract', '--input_path', pdf, '--pages', '0', '--output_path', os.path.join(out, 'page.pdf')]),
+        ('pdf_tools', ['compress', '--input_path', pdf, '--output_path', os.path.join(out, 'small.pdf'), '--workers', '1']),
+        ('media_tools', ['convert_image', '--input_path', png, '--output_path', os.path.join(out, 'image.jpg')]),
+        ('media_tools', ['compress_image', '--input_path', png, '--output_path', os.path.join(out, 'small.jpg'),
+                         '--target_size', '20000']),
+        ('media_tools', ['images_to_pdf', png, '--output_path', os.path.join(out, 'image.pdf')]),
+        ('archive_tools', ['list', '--input_path', archive, '--no_cache']),
+        ('archive_tools', ['extract', '--input_path', archive, '--output_dir', os.path.join(out, 'extracted')]),
+        ('archive_tools', ['create', '--inputs', os.path.join(out, 'extracted'), '--output_path', os.path.join(out, 'new.zip')]),
+        ('archive_tools', ['convert', '--input_path', archive, '--output_path', os.path.join(out, 'files.tar')]),
+        ('doc_tools', ['convert_to_pdf', '--help']),
+        ('ocr_engine', ['--help']),
+    ]
+
+
+def import_breakdown(stderr, top):
+    """
+    Total import time and the `top` heaviest packages the tools pull in directly, from -X importtime output.
+    A package imported by another package (pymupdf under fitz) is counted as part of its parent.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4).split('.')[0]))
+
+    total = sum(cumulative for cumulative, depth, _ in entries if depth == 0)
+    packages = {}
+    # importtime lists children before their parent, so walk it backwards to see parents first
+    stack = []
+    for cumulative, depth, root in reversed(entries):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        own_code = root in sidecar.TOOLS or root == 'sidecar'
+        if not own_code and all(parent in sidecar.TOOLS or parent == 'sidecar' for _, parent in stack):
+            packages[root] = packages.get(root, 0) + cumulative
+        stack.append((depth, root))
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return round(total / 1000, 1), [(name, round(us / 1000, 1)) for name, us in heaviest]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sidecar cold-start benchmark")
+    parser.add_argument('--binary', help='Compiled dispatcher to time (default: python sidecar.py)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per subcommand; the median is reported')
+    parser.add_argument('--top', type=int, default=3, help='Heaviest imports listed per subcommand')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    base = [args.binary] if args.binary else [sys.executable, os.path.join(SIDECARS_DIR, 'sidecar.py')]
+    env = dict(os.environ, PYTHONWARNINGS='ignore')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = make_corpus(tmp)
+        env['CONVERTGG_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        out = os.path.join(tmp, 'out')
+        os.makedirs(out)
+        for tool, argv in cases(corpus, out):
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                proc = subprocess.run(base + [tool] + argv, capture_output=True, text=True, env=env)
+                times.append(time.perf_counter() - start)
+                if proc.returncode != 0:
+                    raise RuntimeError(f"{tool} {argv[0]} failed: {proc.stdout.strip()} {proc.stderr.strip()}")
+
+            row = {"tool": tool, "command": argv[0].lstrip('-'), "wall_ms": round(statistics.median(times) * 1000, 1)}
+            if not args.binary:
+                # Frozen builds ignore -X, so the breakdown is only available for the script
+                proc = subprocess.run([sys.executable, '-X', 'importtime'] + base[1:] + [tool] + argv,
+                                      capture_output=True, text=True, env=env)
+                row["import_ms"], row["heaviest"] = import_breakdown(proc.stderr, args.top)
+            results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'tool':>13} {'command':>15} {'wall ms':>8} {'import ms':>10}  heaviest imports")
+    for r in results:
+        heaviest = ', '.join(f"{name} {ms:.0f}" for name, ms in r.get("heaviest", []))
+        import_ms = f"{r['import_ms']:>10.1f}" if "import_ms" in r else f"{'-':>10}"
+        print(f"{r['tool']:>13} {r['command']:>15} {r['wall_ms']:>8.1f} {import_ms}  {heaviest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Throughput, latency and memory benchmark for every sidecar command.
+
+Each command runs as a fresh process on the synthetic corpus (see corpus.py)
+at each requested size. The median wall time, throughput in the command's own
+unit (pages/s, MB/s, MP/s) and peak RSS (from the sidecar's own
+telemetry) are written to a JSON results file. Given a baseline results file,
+cases that got slower or hungrier than the thresholds are flagged and the
+exit status is 1.
+
+    python benchmarks/bench_suite.py --sizes small medium --output results.json
+    python benchmarks/bench_suite.py --baseline baseline.json --cases 'pdf.*' 'archive.extract.*'
+
+OCR cases need paddleocr and document cases need LibreOffice; without them
+those cases are reported as skipped. Result and inspect caches are disabled,
+so every run does the full work.
+"""
+import argparse
+import fnmatch
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+from corpus import SIZES, build_corpus
+
+SIDECARS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+RESULTS_VERSION = 1
+
+# A case is a regression when it is this much slower / bigger than the baseline...
+DEFAULT_LATENCY_THRESHOLD = 0.15
+DEFAULT_MEMORY_THRESHOLD = 0.15
+# ...and the difference is above this, so sub-10ms commands don't flap on noise
+DEFAULT_MIN_DELTA_MS = 10.0
+
+TELEMETRY_PREFIX = 'TELEMETRY: '
+
+# Peaks of different commands within this many MB of each other count as the same reading
+PEAK_SPREAD_MB = 1.0
+
+# amount is in `unit`; throughput is reported as unit/s. requires names an optional dependency.
+Case = namedtuple('Case', ['name', 'tool', 'argv', 'unit', 'amount', 'requires'])
+
+
+def _mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files) / 1e6
+    return os.path.getsize(path) / 1e6
+
+
+def _megapixels(path):
+    from PIL import Image
+    with Image.open(path) as img:
+        return img.width * img.height / 1e6
+
+
+def cases(corpus, size, out):
+    """
+    The benchmark cases for one size, writing outputs under out.
+    """
+    preset = SIZES[size]
+    pages, scanned_pages = preset['pages'], preset['scanned_pages']
+    text_pdf, scanned_pdf = corpus['text_pdf'], corpus['scanned_pdf']
+    large_png, alpha_png = corpus['large_png'], corpus['alpha_png']
+    half = ','.join(str(i) for i in range(0, pages, 2))
+
+    yield Case('pdf.count', 'pdf_tools', ['count', '--input_path', text_pdf, '--no_cache'], 'pages', pages, None)
+    yield Case('pdf.inspect', 'pdf_tools', ['inspect', '--input_path', text_pdf, '--no_cache'], 'pages', pages, None)
+    yield Case('pdf.thumbnail', 'pdf_tools', ['thumbnail', '--input_path', text_pdf, '--pages', f'1-{min(pages, 24)}', '--no_cache'],
+               'pages', min(pages, 24), None)
+    yield Case('pdf.merge', 'pdf_tools', ['merge', '--inputs', text_pdf, scanned_pdf, text_pdf, '--output_path',
+                                          os.path.join(out, 'merged.pdf'), '--no_result_cache'],
+               'pages', 2 * pages + scanned_pages, None)
+    yield Case('pdf.split', 'pdf_tools', ['split', '--input_path', text_pdf, '--output_dir', os.path.join(out, 'split')],
+               'pages', pages, None)
+    yield Case('pdf.extract', 'pdf_tools', ['extract', '--input_path', text_pdf, '--pages', half, '--output_path',
+                                            os.path.join(out, 'extracted.pdf'), '--no_result_cache'],
+               'pages', len(half.split(',')), None)
+    yield Case('pdf.compress', 'pdf_tools', ['compress', '--input_path', scanned_pdf, '--output_path',
+                                             os.path.join(out, 'compressed.pdf'), '--dpi', '100', '--no_result_cache'],
+               'MB', _mb(scanned_pdf), None)
+    yield Case('pdf.compress_target', 'pdf_tools', ['compress', '--input_path', scanned_pdf, '--output_path',
+                                                    os.path.join(out, 'target.pdf'), '--no_result_cache',
+                                                    '--target_size', str(os.path.getsize(scanned_pdf) // 4)],
+               'MB', _mb(scanned_pdf), None)
+
+    for label, image in (('large', large_png), ('alpha', alpha_png)):
+        mp = _megapixels(image)
+        yield Case(f'media.convert_image.{label}', 'media_tools', ['convert_image', '--input_path', image, '--output_path',
+                                                                    os.path.join(out, f'{label}.jpg'), '--no_result_cache'],
+                   'MP', mp, None)
+        yield Case(f'media.compress_image.{label}', 'media_tools', ['compress_image', '--input_path', image, '--output_path',
+                                                                     os.path.join(out, f'{label}.webp'), '--no_result_cache',
+                                                                     '--target_size', str(os.path.getsize(image) // 10)],
+                   'MP', mp, None)
+    yield Case('media.images_to_pdf', 'media_tools', ['images_to_pdf', large_png, alpha_png, '--output_path',
+                                                      os.path.join(out, 'images.pdf'), '--no_result_cache'],
+               'MP', _megapixels(large_png) + _megapixels(alpha_png), None)
+
+    for kind in ('small', 'huge'):
+        source_dir = corpus[f'{kind}_dir']
+        for ext in ('zip', 'tar.gz', '7z'):
+            archive = corpus[f"{kind}_{ext.replace('.', '_')}"]
+            label = f"{kind}.{ext.replace('.', '_')}"
+            yield Case(f'archive.list.{label}', 'archive_tools', ['list', '--input_path', archive, '--no_cache'],
+                       'MB', _mb(archive), None)
+            yield Case(f'archive.extract.{label}', 'archive_tools', ['extract', '--input_path', archive, '--output_dir',
+                                                                      os.path.join(out, 'extracted')],
+                       'MB', _mb(source_dir), None)
+        for ext in ('zip', 'tar.gz', '7z'):
+            yield Case(f'archive.create.{kind}.{ext.replace(".", "_")}', 'archive_tools',
+                       ['create', '--inputs', source_dir, '--output_path', os.path.join(out, f'created.{ext}')],
+                       'MB', _mb(source_dir), None)
+        yield Case(f'archive.convert.{kind}.zip_to_7z', 'archive_tools',
+                   ['convert', '--input_path', corpus[f'{kind}_zip'], '--output_path', os.path.join(out, 'converted.7z'),
+                    '--no_result_cache'], 'MB', _mb(source_dir), None)
+        yield Case(f'archive.convert.{kind}.tar_gz_to_zip', 'archive_tools',
+                   ['convert', '--input_path', corpus[f'{kind}_tar_gz'], '--output_path', os.path.join(out, 'converted.zip'),
+                    '--no_result_cache'], 'MB', _mb(source_dir), None)
+
+    yield Case('ocr.scanned', 'ocr_engine', ['--input_pdf_path', scanned_pdf, '--output_docx_path',
+                                             os.path.join(out, 'ocr.docx'), '--no_cache'],
+               'pages', scanned_pages, 'paddleocr')
+    yield Case('ocr.text_layer', 'ocr_engine', ['--input_pdf_path', text_pdf, '--output_docx_path',
+                                                os.path.join(out, 'text.docx'), '--no_cache'],
+               'pages', pages, 'paddleocr')
+    if corpus['docx']:
+        yield Case('doc.convert_to_pdf', 'doc_tools', ['convert_to_pdf', '--input_path', corpus['docx'], '--output_path',
+                                                       os.path.join(out, 'document.pdf'), '--no_result_cache'],
+                   'MB', _mb(corpus['docx']), 'soffice')
+
+
+def available(requirement, binary):
+    if requirement is None:
+        return True
+    if requirement == 'soffice':
+        return bool(shutil.which('soffice') or shutil.which('libreoffice'))
+    # A compiled dispatcher bundles its python dependencies
+    return binary or importlib.util.find_spec(requirement) is not None
+
+
+def run_case(base, case, out, repeat, env):
+    """
+    Runs a case `repeat` times, each with a fresh output directory. Returns its result row.
+    """
+    times = []
+    peak_rss = None
+    stages = {}
+    for _ in range(repeat):
+        shutil.rmtree(out, ignore_errors=True)
+        os.makedirs(out)
+        start = time.perf_counter()
+        proc = subprocess.run(base + [case.tool] + case.argv, capture_output=True, text=True, env=env)
+        times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{case.name} failed: {proc.stdout.strip()[-2000:]} {proc.stderr.strip()[-2000:]}")
+
+        run_stages = {}
+        for line in proc.stdout.splitlines():
+            if not line.startswith(TELEMETRY_PREFIX):
+                continue
+            event = json.loads(line[len(TELEMETRY_PREFIX):])
+            if event['event'] == 'operation' and event.get('peak_rss_mb') is not None:
+                peak_rss = max(peak_rss or 0.0, event['peak_rss_mb'])
+            elif event['event'] == 'stage':
+                run_stages[event['stage']] = run_stages.get(event['stage'], 0.0) + event['wall_ms']
+        for name, wall_ms in run_stages.items():
+            stages.setdefault(name, []).append(wall_ms)
+
+    latency = statistics.median(times)
+    return {
+        "latency_ms": round(latency * 1000, 1),
+        "latency_min_ms": round(min(times) * 1000, 1),
+        "throughput": round(case.amount / latency, 2) if latency else None,
+        "unit": f"{case.unit}/s",
+        "amount": round(case.amount, 3),
+        "peak_rss_mb": peak_rss,
+        "stages_ms": {name: round(statistics.median(values), 1) for name, values in stages.items()},
+    }
+
+
+def compare(results, baseline, latency_threshold, memory_threshold, min_delta_ms):
+    """
+    Annotates results with their change against the baseline. Returns the names of regressed cases.
+    """
+    previous = {(row['case'], row['size']): row for row in baseline['results'] if row.get('status') == 'ok'}
+    regressions = []
+    for row in results:
+        before = previous.get((row['case'], row['size']))
+        if row.get('status') != 'ok' or before is None:
+            continue
+        latency_change = row['latency_ms'] / before['latency_ms'] - 1 if before['latency_ms'] else 0.0
+        row['baseline_latency_ms'] = before['latency_ms']
+        row['latency_change'] = round(latency_change, 3)
+        slower = latency_change > latency_threshold and row['latency_ms'] - before['latency_ms'] > min_delta_ms
+        hungrier = False
+        if row['peak_rss_mb'] and before.get('peak_rss_mb'):
+            memory_change = row['peak_rss_mb'] / before['peak_rss_mb'] - 1
+            row['baseline_peak_rss_mb'] = before['peak_rss_mb']
+            row['memory_change'] = round(memory_change, 3)
+            hungrier = memory_change > memory_threshold
+        row['regression'] = [reason for reason, flagged in (('latency', slower), ('memory', hungrier)) if flagged]
+        if row['regression']:
+            regressions.append(f"{row['case']} [{row['size']}]")
+    return regressions
+
+
+def uniform_peaks(results):
+    """
+    True when several cases measured (nearly) the same peak RSS, which means the
+    number isn't the command's own, e.g. it is the harness's inherited high-water mark.
+    """
+    peaks = [row['peak_rss_mb'] for row in results if row.get('status') == 'ok' and row.get('peak_rss_mb')]
+    return len(peaks) >= 3 and max(peaks) - min(peaks) < PEAK_SPREAD_MB
+
+
+def machine_info():
+    return {"platform": platform.platform(), "machine": platform.machine(), "python": platform.python_version(),
+            "cpu_count": os.cpu_count()}
+
+
+def print_table(results):
+    print(f"{'case':<36} {'size':>6} {'latency ms':>11} {'throughput':>16} {'peak MB':>8} {'vs base':>8}")
+    for row in results:
+        if row['status'] != 'ok':
+            print(f"{row['case']:<36} {row['size']:>6} {row['status']:>11}")
+            continue
+        change = f"{row['latency_change']:+.0%}" if 'latency_change' in row else ''
+        flag = f"  REGRESSION ({', '.join(row['regression'])})" if row.get('regression') else ''
+        peak = f"{row['peak_rss_mb']:>8.1f}" if row['peak_rss_mb'] is not None else f"{'-':>8}"
+        throughput = f"{row['throughput']:.1f} {row['unit']}" if row['throughput'] is not None else '-'
+        print(f"{row['case']:<36} {row['size']:>6} {row['latency_ms']:>11.1f} {throughput:>16} {peak} {change:>8}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sidecar throughput/latency/memory benchmark")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small'], help='Corpus sizes to run')
+    parser.add_argument('--cases', nargs='+', help='Only cases matching these globs, e.g. "pdf.*"')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the median is reported')
+    parser.add_argument('--binary', help='Compiled dispatcher to run (default: python sidecar.py)')
+    parser.add_argument('--corpus_dir', help='Where to build/reuse the corpus (default: a temp dir)')
+    parser.add_argument('--output', help='Write the results JSON here')
+    parser.add_argument('--baseline', help='Results JSON to compare against')
+    parser.add_argument('--latency_threshold', type=float, default=DEFAULT_LATENCY_THRESHOLD,
+                        help='Flag cases this much slower than the baseline (0.15 = 15%%)')
+    parser.add_argument('--memory_threshold', type=float, default=DEFAULT_MEMORY_THRESHOLD,
+                        help='Flag cases whose peak RSS grew this much')
+    parser.add_argument('--min_delta_ms', type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help='Ignore latency increases smaller than this')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON instead of a table')
+    args = parser.parse_args()
+
+    base = [args.binary] if args.binary else [sys.executable, os.path.join(SIDECARS_DIR, 'sidecar.py')]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_root = args.corpus_dir or os.path.join(tmp, 'corpus')
+        out = os.path.join(tmp, 'out')
+        env = dict(os.environ, PYTHONWARNINGS='ignore', CONVERTGG_TELEMETRY='1',
+                   CONVERTGG_CACHE_DIR=os.path.join(tmp, 'cache'))
+        env.pop('CONVERTGG_PROFILE_DIR', None)
+        for size in args.sizes:
+            sys.stderr.write(f"Building {size} corpus in {corpus_root}...\n")
+            corpus = build_corpus(corpus_root, size)
+            for case in cases(corpus, size, out):
+                if args.cases and not any(fnmatch.fnmatch(case.name, pattern) for pattern in args.cases):
+                    continue
+                row = {"case": case.name, "size": size, "tool": case.tool, "command": case.argv[0].lstrip('-')}
+                if not available(case.requires, bool(args.binary)):
+                    row["status"] = f"skipped ({case.requires} missing)"
+                else:
+                    sys.stderr.write(f"  {case.name}\n")
+                    row.update(run_case(base, case, out, args.repeat, env), status="ok")
+                results.append(row)
+
+    report = {"version": RESULTS_VERSION, "created": time.strftime('%Y-%m-%dT%H:%M:%S%z'), "machine": machine_info(),
+              "repeat": args.repeat, "results": results}
+    if uniform_peaks(results):
+        sys.stderr.write("Warning: every case reported the same peak RSS; memory figures are not per-command\n")
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != report['machine']:
+            sys.stderr.write("Warning: baseline was recorded on a different machine or Python; timings may not compare\n")
+        regressions = compare(results, baseline, args.latency_threshold, args.memory_threshold, args.min_delta_ms)
+        report["baseline"] = os.path.abspath(args.baseline)
+        report["regressions"] = regressions
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_table(results)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Deterministic synthetic inputs for the sidecar benchmarks.
+
+Every generator is seeded and every file gets the same mtime, so a size preset
+always produces the same content and timings stay comparable between runs and
+machines. Nothing is downloaded.
+
+    python benchmarks/corpus.py /tmp/corpus --sizes small medium
+"""
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+import tarfile
+import zipfile
+
+# Fixed mtime for generated files, so archives don't depend on when the corpus was built
+CORPUS_MTIME = 1262304000  # 2010-01-01
+
+# Bump when generators change, so an existing corpus directory is rebuilt
+CORPUS_VERSION = 1
+
+WORDS = ('the', 'of', 'and', 'to', 'in', 'archive', 'document', 'page', 'image', 'convert', 'quarterly',
+         'report', 'table', 'figure', 'revenue', 'total', 'section', 'appendix', 'summary', 'invoice',
+         'customer', 'account', 'balance', 'signature', 'date', 'amount', 'reference', 'number', 'notes')
+
+# Per size: pages of the text PDF, pages of the scanned PDF, large image size,
+# number of small files and count/size of the huge files in the archives
+SIZES = {
+    'small': {'pages': 20, 'scanned_pages': 3, 'image': (1600, 1200), 'small_files': 200, 'huge_files': 2, 'huge_mb': 8},
+    'medium': {'pages': 200, 'scanned_pages': 12, 'image': (4000, 3000), 'small_files': 2000, 'huge_files': 3, 'huge_mb': 48},
+    'large': {'pages': 1000, 'scanned_pages': 40, 'image': (8000, 6000), 'small_files': 10000, 'huge_files': 3, 'huge_mb': 256},
+}
+
+SCAN_DPI = 150
+A4_POINTS = (595, 842)
+# PDFs otherwise get the build time as their dates and a random file ID
+PDF_METADATA = {'creationDate': 'D:20100101000000Z', 'modDate': 'D:20100101000000Z', 'producer': 'convert.gg benchmark corpus'}
+
+
+def _words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def text_pdf(path, pages, seed=1):
+    """
+    Born-digital PDF: `pages` A4 pages of body text.
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=A4_POINTS[0], height=A4_POINTS[1])
+        page.insert_textbox(fitz.Rect(56, 56, A4_POINTS[0] - 56, A4_POINTS[1] - 56), _words(rng, 420), fontsize=10)
+    doc.set_metadata(PDF_METADATA)
+    doc.save(path, garbage=1, deflate=True, no_new_id=True)
+    doc.close()
+
+
+def _scan(rng, width, height):
+    from PIL import Image, ImageDraw
+
+    img = Image.new('L', (width, height), 242)
+    draw = ImageDraw.Draw(img)
+    for y in range(60, height - 60, 22):
+        draw.text((60, y), _words(rng, 14), fill=25)
+    # Sensor noise, so the page compresses like a real scan rather than flat paper
+    noise = Image.frombytes('L', (width, height), rng.randbytes(width * height))
+    return Image.blend(img, noise, 0.08)
+
+
+def scanned_pdf(path, pages, seed=2):
+    """
+    Image-only PDF: one grey JPEG scan per A4 page at SCAN_DPI, with no text layer.
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    width, height = round(A4_POINTS[0] / 72 * SCAN_DPI), round(A4_POINTS[1] / 72 * SCAN_DPI)
+    doc = fitz.open()
+    for _ in range(pages):
+        buf = io.BytesIO()
+        _scan(rng, width, height).save(buf, format='JPEG', quality=85)
+        page = doc.new_page(width=A4_POINTS[0], height=A4_POINTS[1])
+        page.insert_image(page.rect, stream=buf.getvalue())
+    doc.set_metadata(PDF_METADATA)
+    doc.save(path, no_new_id=True)
+    doc.close()
+
+
+def photo_image(path, size, alpha=False, seed=3):
+    """
+    Photo-like PNG: smooth colour regions plus fine noise. With alpha, a soft
+    transparency mask is added, which JPEG outputs have to flatten.
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    width, height = size
+    # Upscaling a tiny random image gives smooth gradients
+    base = Image.frombytes('RGB', (16, 12), rng.randbytes(16 * 12 * 3)).resize(size, Image.BICUBIC)
+    noise = Image.frombytes('L', size, rng.randbytes(width * height)).convert('RGB')
+    img = Image.blend(base, noise, 0.1)
+    if alpha:
+        mask = Image.frombytes('L', (8, 6), rng.randbytes(8 * 6)).resize(size, Image.BICUBIC)
+        img.putalpha(mask)
+    img.save(path)
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, (CORPUS_MTIME, CORPUS_MTIME))
+
+
+def small_files(root, count, seed=4):
+    """
+    `count` text files of 0.5-4 KB spread over 20 folders.
+    """
+    rng = random.Random(seed)
+    for n in range(count):
+        folder = os.path.join(root, f"dir{n % 20:02d}")
+        os.makedirs(folder, exist_ok=True)
+        _write(os.path.join(folder, f"file{n:05d}.txt"), _words(rng, rng.randint(80, 600)).encode())
+
+
+def huge_files(root, count, size_mb, seed=5):
+    """
+    `count` files of `size_mb` each, alternating compressible text and incompressible bytes.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    block = 1024 * 1024
+    for n in range(count):
+        path = os.path.join(root, f"huge{n}.{'txt' if n % 2 == 0 else 'bin'}")
+        with open(path, 'wb') as f:
+            for _ in range(size_mb):
+                if n % 2:
+                    f.write(rng.randbytes(block))
+                else:
+                    # 64 KB of text repeated: farther apart than deflate's window, so it compresses like prose
+                    text = _words(rng, 12000).encode()[:64 * 1024]
+                    f.write((text * (block // len(text) + 1))[:block])
+        os.utime(path, (CORPUS_MTIME, CORPUS_MTIME))
+
+
+def _sorted_files(src_dir):
+    for dirpath, dirnames, filenames in os.walk(src_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            yield path, os.path.relpath(path, os.path.dirname(src_dir)).replace(os.sep, '/')
+
+
+def make_archive(src_dir, path):
+    """
+    Packs src_dir (as its top-level folder) into a .zip, .tar.gz or .7z, in name order with fixed metadata.
+    """
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for file_path, arcname in _sorted_files(src_dir):
+                zf.write(file_path, arcname)
+    elif path.endswith('.tar.gz'):
+        def normalize(info):
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            return info
+
+        with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0) as gz, \
+                tarfile.open(fileobj=gz, mode='w', format=tarfile.PAX_FORMAT) as tf:
+            for file_path, arcname in _sorted_files(src_dir):
+                tf.add(file_path, arcname, filter=normalize)
+    elif path.endswith('.7z'):
+        import py7zr
+        with py7zr.SevenZipFile(path, 'w') as z:
+            for file_path, arcname in _sorted_files(src_dir):
+                z.write(file_path, arcname)
+    else:
+        raise ValueError(f"Unsupported archive type: {path}")
+
+
+def _docx(path, paragraphs, seed=6):
+    import datetime
+    import docx
+
+    rng = random.Random(seed)
+    document = docx.Document()
+    for n in range(paragraphs):
+        if n % 25 == 0:
+            document.add_heading(_words(rng, 4).title(), level=1)
+        document.add_paragraph(_words(rng, 90))
+    fixed = datetime.datetime.fromtimestamp(CORPUS_MTIME, datetime.timezone.utc).replace(tzinfo=None)
+    document.core_properties.created = document.core_properties.modified = fixed
+    buf = io.BytesIO()
+    document.save(buf)
+    # Re-pack with fixed zip timestamps; python-docx stamps parts with the current time
+    with zipfile.ZipFile(buf) as src, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            dst.writestr(zipfile.ZipInfo(info.filename, date_time=fixed.timetuple()[:6]), src.read(info),
+                         compress_type=zipfile.ZIP_DEFLATED)
+
+
+def build_corpus(root, size):
+    """
+    Builds (or reuses) the corpus for one size preset under root/size and returns a dict of its paths.
+    Entries whose generator needs a missing optional package (python-docx) are None.
+    """
+    preset = SIZES[size]
+    directory = os.path.join(root, size)
+    manifest_path = os.path.join(directory, 'corpus.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == CORPUS_VERSION:
+            return manifest['paths']
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, file_name) for name, file_name in (
+        ('text_pdf', 'text.pdf'), ('scanned_pdf', 'scanned.pdf'), ('large_png', 'large.png'), ('alpha_png', 'alpha.png'),
+        ('small_dir', 'small_files'), ('huge_dir', 'huge_files'), ('docx', 'document.docx'))}
+
+    text_pdf(paths['text_pdf'], preset['pages'])
+    scanned_pdf(paths['scanned_pdf'], preset['scanned_pages'])
+    photo_image(paths['large_png'], preset['image'])
+    photo_image(paths['alpha_png'], (preset['image'][0] // 2, preset['image'][1] // 2), alpha=True)
+    small_files(paths['small_dir'], preset['small_files'])
+    huge_files(paths['huge_dir'], preset['huge_files'], preset['huge_mb'])
+    for kind in ('small', 'huge'):
+        for ext in ('zip', 'tar.gz', '7z'):
+            paths[f"{kind}_{ext.replace('.', '_')}"] = os.path.join(directory, f"{kind}.{ext}")
+            make_archive(paths[f"{kind}_dir"], paths[f"{kind}_{ext.replace('.', '_')}"])
+    try:
+        _docx(paths['docx'], preset['pages'] * 4)
+    except ImportError:
+        paths['docx'] = None
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': CORPUS_VERSION, 'size': size, 'preset': preset, 'paths': paths}, f, indent=2)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the synthetic benchmark corpus")
+    parser.add_argument('root', help='Directory to build the corpus in')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['small'])
+    args = parser.parse_args()
+    for size in args.sizes:
+        print(json.dumps(build_corpus(args.root, size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Small on-disk key/value cache with a size cap and LRU eviction.
+
+Entries are plain files named after their key under `<directory>/<key[:2]>/`.
+Reads bump the file's mtime, and eviction removes the least recently used
+entries until the cache is back under its budget. Writes go through a temp
+file + rename, so several sidecar processes can share a directory safely.
+Whole files can be stored and looked up by path (put_file/path_for) so large
+entries never pass through memory; their size and digest are recorded on put
+and checked on lookup, so an entry that was altered is dropped, not served.
+"""
+import os
+import sys
+import json
+import stat
+import shutil
+import hashlib
+import tempfile
+import threading
+
+# Eviction trims down to this fraction of the cap so it doesn't run on every put
+EVICT_TO_FRACTION = 0.9
+# linux/fs.h ioctl for copy-on-write file clones
+FICLONE = 0x40049409
+# Suffix of the key holding a file entry's size and digest
+FILE_META_SUFFIX = '.meta'
+# Chunk size when hashing file entries
+DIGEST_CHUNK_BYTES = 1024 * 1024
+
+
+def default_cache_dir(name):
+    """
+    Per-user cache location for `name`, overridable with CONVERTGG_CACHE_DIR.
+    """
+    root = os.environ.get('CONVERTGG_CACHE_DIR')
+    if not root:
+        if sys.platform == 'win32':
+            root = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'convert.gg', 'Cache')
+        elif sys.platform == 'darwin':
+            root = os.path.join(os.path.expanduser('~/Library/Caches'), 'convert.gg')
+        else:
+            root = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'convert.gg')
+    return os.path.join(root, name)
+
+
+def make_key(*parts):
+    """
+    Hashes arbitrary str/bytes parts into a hex cache key.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        h.update(len(part).to_bytes(8, 'little'))
+        h.update(part)
+    return h.hexdigest()
+
+
+def file_identity(path):
+    """
+    Key parts identifying a file's current contents: absolute path, size and mtime, so any edit misses.
+    """
+    st = os.stat(path)
+    return os.path.abspath(path), str(st.st_size), str(st.st_mtime_ns)
+
+
+def _reflink(src, dst):
+    """
+    Copy-on-write clone of src at dst (Btrfs/XFS via FICLONE, APFS via clonefile). Returns False if unsupported.
+    """
+    if sys.platform == 'darwin':
+        import ctypes
+        try:
+            clonefile = ctypes.CDLL(None, use_errno=True).clonefile
+        except (OSError, AttributeError):
+            return False
+        return clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            try:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                return True
+            except OSError:
+                pass
+        os.remove(dst)
+    return False
+
+def clone_file(src, dst):
+    """
+    Copies src to a new file at dst, as a reflink when the filesystem can. Returns 'reflink' or 'copy'.
+    """
+    if _reflink(src, dst):
+        return 'reflink'
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(DIGEST_CHUNK_BYTES)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def make_writable(path):
+    os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) | stat.S_IWUSR)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except PermissionError:
+        make_writable(path)
+        os.remove(path)
+
+
+class DiskCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+        self._size = None  # Computed lazily on first put
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns the cached bytes for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_read += len(data)
+        return data
+
+    def _verified(self, key, path):
+        try:
+            with open(self._path(key + FILE_META_SUFFIX), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            return os.path.getsize(path) == meta["size"] and file_digest(path) == meta["sha256"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def path_for(self, key):
+        """
+        Path of the file entry for `key` (counted as a use), or None on a miss. The entry is
+        checked against the size and digest recorded by put_file and dropped if it doesn't match.
+        Callers must copy it, never link to it or modify it.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        if not self._verified(key, path):
+            for stale in (path, self._path(key + FILE_META_SUFFIX)):
+                try:
+                    _remove(stale)
+                except OSError:
+                    pass
+            with self._lock:
+                self.misses += 1
+                self._size = None  # Rescanned on the next put
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put_file(self, key, src_path):
+        """
+        Stores a copy of the file at src_path (a reflink where supported), with its size
+        and digest for path_for to check. The entry is made read-only.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        os.close(fd)
+        try:
+            clone_file(src_path, tmp_path)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            # Metadata first: an entry without matching metadata is only ever treated as a miss
+            self.put(key + FILE_META_SUFFIX,
+                     json.dumps({"size": os.path.getsize(tmp_path), "sha256": file_digest(tmp_path)}).encode('utf-8'))
+            if os.path.exists(path):
+                # Read-only files can't be replaced on Windows
+                make_writable(path)
+            self._commit(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                _remove(tmp_path)
+            raise
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self._commit(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _commit(self, tmp_path, path):
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        new_size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += new_size - old_size
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _entries(self):
+        for sub in os.listdir(self.directory):
+            sub_path = os.path.join(self.directory, sub)
+            if not os.path.isdir(sub_path):
+                continue
+            for name in os.listdir(sub_path):
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(sub_path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in EVICT_TO_FRACTION of its budget.
+        """
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                _remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._size = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "bytes_read": self.bytes_read,
+            }
@@ -4,68 +4,236 @@ import argparse
 import platform
 import subprocess
 import os
+import json
+import time
+import atexit
+import shutil
+import tempfile
+import threading
 from pathlib import Path
+from sidecar_server import add_serve_parser
+from result_cache import add_result_cache_args, result_cache_from_args, run_cached
+import telemetry
+
+# Seconds to wait for a fresh office instance to finish creating its profile
+OFFICE_START_TIMEOUT = 60
+# Per conversion call, which may carry a whole batch of documents
+OFFICE_CONVERT_TIMEOUT = 1800
+
+def find_soffice():
+    if platform.system() == 'Darwin':
+        candidate = '/Applications/LibreOffice.app/Contents/MacOS/soffice'
+        if os.path.exists(candidate):
+            return candidate
+    found = shutil.which('soffice') or shutil.which('libreoffice')
+    if not found:
+        raise FileNotFoundError("LibreOffice (soffice) not found")
+    return found
+
+class OfficeWorker:
+    """
+    One resident headless LibreOffice instance with a private user profile.
+    `soffice --convert-to` calls made with the same profile are handed over to it
+    through office's own IPC pipe, so each call skips the cold start and many
+    documents can be passed in one call.
+    """
+    def __init__(self, soffice):
+        self.soffice = soffice
+        self.profile_dir = tempfile.mkdtemp(prefix='convertgg-office-')
+        self._profile_arg = f"-env:UserInstallation={Path(self.profile_dir).as_uri()}"
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        self._proc = subprocess.Popen([
+            self.soffice, self._profile_arg,
+            '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+            f'--accept=pipe,name=convertgg-{os.getpid()};urp;'
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Office takes the profile lock once it owns the profile and its IPC pipe is up
+        user_dir = os.path.join(self.profile_dir, 'user')
+        deadline = time.monotonic() + OFFICE_START_TIMEOUT
+        while not (os.path.exists(os.path.join(user_dir, '.lock'))
+                   or os.path.exists(os.path.join(user_dir, 'registrymodifications.xcu'))):
+            if self._proc.poll() is not None:
+                raise RuntimeError(f"LibreOffice exited during startup (code {self._proc.returncode})")
+            if time.monotonic() > deadline:
+                self._stop()
+                raise RuntimeError("LibreOffice did not start in time")
+            time.sleep(0.1)
+
+    def convert(self, input_paths, out_dir, fmt='pdf'):
+        """
+        Converts all input_paths into out_dir (named <stem>.<fmt>) in a single call.
+        """
+        with self._lock:
+            self._start()
+            try:
+                subprocess.run([self.soffice, self._profile_arg, '--headless', '--convert-to', fmt, '--outdir', out_dir,
+                                *input_paths],
+                               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=OFFICE_CONVERT_TIMEOUT)
+            except Exception:
+                # Start a clean instance next time rather than feeding a wedged one
+                self._stop()
+                raise
+
+    def _stop(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        self._proc = None
+
+    def close(self):
+        self._stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+# Kept alive across requests in server mode
+_office_worker = None
+
+def get_office_worker():
+    global _office_worker
+    if _office_worker is None:
+        _office_worker = OfficeWorker(find_soffice())
+        atexit.register(_office_worker.close)
+    return _office_worker
+
+def _stem_groups(entries):
+    """
+    Splits entries into groups whose input names are unique, since office names outputs after the input stem.
+    """
+    groups = []
+    for entry in entries:
+        stem = Path(entry['input_path']).stem.lower()
+        for group in groups:
+            if stem not in group:
+                group[stem] = entry
+                break
+        else:
+            groups.append({stem: entry})
+    return [list(group.values()) for group in groups]
+
+def _convert_with_word(entries):
+    from docx2pdf import convert
+    for entry in entries:
+        try:
+            convert(entry['input_path'], entry['output_path'])
+            yield entry, None
+        except Exception as e:
+            yield entry, str(e)
+
+def convert_documents(entries):
+    """
+    Converts {"input_path", "output_path"} entries to PDF with as few office calls as possible.
+    Yields (entry, error or None) per document. Word (docx2pdf) is used only when LibreOffice is missing.
+    """
+    try:
+        worker = get_office_worker()
+    except FileNotFoundError:
+        if platform.system() not in ['Windows', 'Darwin']:
+            raise
+        yield from _convert_with_word(entries)
+        return
+
+    for group in _stem_groups(entries):
+        out_dir = tempfile.mkdtemp(prefix='convertgg-docs-')
+        try:
+            try:
+                with telemetry.stage('office', documents=len(group)):
+                    worker.convert([str(Path(entry['input_path']).resolve()) for entry in group], out_dir)
+                call_error = None
+            except Exception as e:
+                # Documents converted before the failure are still picked up below
+                call_error = str(e)
+            for entry in group:
+                created = os.path.join(out_dir, Path(entry['input_path']).stem + '.pdf')
+                if os.path.exists(created):
+                    output_path = str(Path(entry['output_path']).resolve())
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    shutil.move(created, output_path)
+                    yield entry, None
+                else:
+                    yield entry, call_error or "LibreOffice produced no output"
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+def _convert_one(input_path, output_path):
+    # Same path as batches: the resident LibreOffice worker, or Word (docx2pdf) only where LibreOffice is missing
+    for _, error in convert_documents([{"input_path": input_path, "output_path": output_path}]):
+        if error:
+            raise RuntimeError(error)
 
 def convert_to_pdf(args):
     input_path = str(Path(args.input_path).resolve())
     output_path = str(Path(args.output_path).resolve())
-    
-    system = platform.system()
-    
-    # Strategy 1: docx2pdf (Best for Windows/Mac with Word installed)
-    if system in ['Windows', 'Darwin']:
-        try:
-            from docx2pdf import convert
-            # docx2pdf handles conversion to same folder usually, or specific path
-            # It's a bit rigid, so we might need to move file after if names don't match
-            # But usually convert(input, output) works
-            convert(input_path, output_path)
-            print("SUCCESS")
-            return
-        except Exception as e:
-            # Fallthrough to LibreOffice
-            pass
 
-    # Strategy 2: LibreOffice (Best for Linux, or Win/Mac without Word)
-    # Command: soffice --headless --convert-to pdf --outdir <dir> <input>
-    # Note: LibreOffice saves to the outdir with the same basename. 
-    # We might need to rename if output_path has different name.
     try:
-        if system == 'Darwin':
-            soffice_cmd = '/Applications/LibreOffice.app/Contents/MacOS/soffice'
-        elif system == 'Windows':
-            soffice_cmd = 'soffice' # Assumes in PATH
-        else:
-            soffice_cmd = 'soffice' # Linux
-            
-        out_dir = os.path.dirname(output_path)
-        
-        # Check if command exists (skip on Windows/Mac if path not absolute/known)
-        subprocess.run([soffice_cmd, '--version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-            
-        subprocess.run([
-            soffice_cmd, 
-            '--headless', 
-            '--convert-to', 'pdf', 
-            '--outdir', out_dir, 
-            input_path
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Rename if necessary (LibreOffice saves as input_name.pdf)
-        input_name = Path(input_path).stem
-        created_pdf = Path(out_dir) / f"{input_name}.pdf"
-        
-        if str(created_pdf) != output_path and created_pdf.exists():
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            os.rename(created_pdf, output_path)
-            
+        stats = run_cached(result_cache_from_args(args), 'convert_to_pdf', [input_path], {}, output_path,
+                           lambda: _convert_one(input_path, output_path))
+        if stats:
+            print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: Conversion failed. Ensure Microsoft Word or LibreOffice is installed. Details: {str(e)}")
         sys.exit(1)
 
-if __name__ == "__main__":
+def convert_to_pdf_batch(args):
+    """
+    Converts a manifest of {"input_path", "output_path"} documents to PDF ('-' reads it from stdin).
+    Prints one JSON result line per document, tagged with its manifest index, then a summary.
+    """
+    try:
+        if args.manifest == '-':
+            entries = json.load(sys.stdin)
+        else:
+            with open(args.manifest, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+
+        start = time.perf_counter()
+        failed = 0
+        indexes = {id(entry): index for index, entry in enumerate(entries)}
+        cache = result_cache_from_args(args)
+
+        def report(entry, error, cached=False):
+            result = {"index": indexes[id(entry)], "input_path": entry['input_path'], "output_path": entry['output_path'],
+                      "ok": error is None, "cached": cached}
+            if error:
+                result["error"] = error
+            print(json.dumps(result), flush=True)
+
+        # Cache hits are answered first; only the misses go to office
+        keys = {}
+        hits = set()
+        for entry in entries:
+            if cache is None or entry.get('no_result_cache'):
+                continue
+            try:
+                keys[id(entry)] = cache.key('convert_to_pdf', [entry['input_path']], {})
+            except OSError:
+                continue # Unreadable input; the conversion below reports it
+            if cache.fetch(keys[id(entry)], entry['output_path']):
+                hits.add(id(entry))
+                report(entry, None, cached=True)
+        misses = [entry for entry in entries if id(entry) not in hits]
+        for entry, error in convert_documents(misses):
+            failed += 1 if error else 0
+            if error is None and id(entry) in keys:
+                cache.store(keys[id(entry)], entry['output_path'])
+            report(entry, error)
+
+        stats = {'files': len(entries), 'failed': failed, 'cached': len(hits),
+                 'seconds': round(time.perf_counter() - start, 3)}
+        print(f"STATS: {json.dumps(stats)}")
+        print("SUCCESS")
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def build_parser():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest='command')
 
@@ -73,10 +241,26 @@ if __name__ == "__main__":
     p_conv = subparsers.add_parser('convert_to_pdf')
     p_conv.add_argument('--input_path', required=True)
     p_conv.add_argument('--output_path', required=True)
+    add_result_cache_args(p_conv)
     p_conv.set_defaults(func=convert_to_pdf)
 
-    args = parser.parse_args()
+    # Many documents through one office instance
+    p_conv_batch = subparsers.add_parser('convert_to_pdf_batch')
+    p_conv_batch.add_argument('--manifest', required=True) # JSON list of {input_path, output_path}, or '-' for stdin
+    add_result_cache_args(p_conv_batch)
+    p_conv_batch.set_defaults(func=convert_to_pdf_batch)
+
+    # Server mode: one office conversion at a time
+    add_serve_parser(subparsers, parser, default_workers=1)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
     if hasattr(args, 'func'):
-        args.func(args)
+        telemetry.run_command(parser.prog, args)
     else:
         parser.print_help()
+
+if __name__ == "__main__":
+    main()
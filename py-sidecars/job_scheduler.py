@@ -0,0 +1,430 @@
+"""
+Job scheduler in front of the sidecar tools.
+
+The Electron side sends every operation here rather than straight to a tool,
+so concurrent requests share the machine instead of oversubscribing it. Each
+job is classified as CPU-heavy, memory-heavy or I/O-bound and each class runs
+at most its limit of jobs at once; waiting jobs start in priority order
+(higher first), then in submission order.
+
+Jobs run in resident tool servers (`sidecar <tool> serve`), one job per server
+process at a time. Idle servers are kept and reused, so loaded OCR models and
+office instances stay warm between jobs. Cancelling a queued job drops it;
+cancelling a running one kills its server's process tree.
+
+Protocol, newline-delimited JSON like sidecar_server:
+
+    -> {"id": 1, "tool": "pdf_tools", "argv": ["compress", "--input_path", "a.pdf", ...], "priority": 5}
+    <- {"id": 1, "progress": "{\"page\": 1, ...}"}    (forwarded from the tool, see sidecar_server)
+    <- {"id": 1, "ok": true, "output": "SUCCESS"}
+    -> {"id": 2, "cancel": 1}
+    <- {"id": 1, "ok": false, "output": "ERROR: Cancelled"}
+    <- {"id": 2, "ok": true, "output": "cancelled"}
+    -> {"id": 3, "metrics": true}
+    <- {"id": 3, "ok": true, "output": "{\"classes\": {...}, \"jobs\": [...]}"}
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import signal
+import argparse
+import threading
+import subprocess
+
+RESOURCE_CLASSES = ('cpu', 'memory', 'io')
+
+# Resource class per tool subcommand; '*' covers the tool's other subcommands
+JOB_CLASSES = {
+    'ocr_engine': {'*': 'cpu'},
+    'media_tools': {'images_to_pdf': 'memory', '*': 'cpu'},
+    'doc_tools': {'*': 'cpu'},
+    'pdf_tools': {'compress': 'cpu', 'split': 'cpu', 'thumbnail': 'cpu', 'merge': 'memory', 'pipeline': 'memory', '*': 'io'},
+    'archive_tools': {'*': 'io'},
+}
+
+# Tools that are already parallel inside (OCR page workers) or drive one external
+# program (LibreOffice) run one job at a time whatever their class allows
+TOOL_LIMITS = {'ocr_engine': 1, 'doc_tools': 1}
+
+# Idle servers kept per tool; extra ones are shut down when their job ends
+MAX_IDLE_SERVERS = 2
+
+# Seconds an idle server gets to exit after stdin is closed, before it is killed
+SERVER_STOP_TIMEOUT = 10
+
+
+def default_limits():
+    cores = os.cpu_count() or 1
+    return {'cpu': max(1, cores // 2), 'memory': 2, 'io': 4}
+
+
+def classify(tool, argv):
+    table = JOB_CLASSES[tool]
+    command = argv[0] if argv and not argv[0].startswith('-') else '*'
+    return table.get(command, table['*'])
+
+
+def _tool_command(tool):
+    if getattr(sys, 'frozen', False):
+        # The onedir binary is the dispatcher itself
+        return [sys.executable, tool]
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sidecar.py'), tool]
+
+
+class _ToolServer:
+    """
+    One resident `sidecar <tool> serve` process, in its own process group so it can be killed with its pools.
+    """
+
+    def __init__(self, tool):
+        self.tool = tool
+        if os.name == 'nt':
+            group = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {'start_new_session': True}
+        self.proc = subprocess.Popen(_tool_command(tool) + ['serve'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     text=True, encoding='utf-8', bufsize=1, **group)
+        self._next_id = 1
+
+    def run(self, argv, on_progress=None):
+        """
+        Runs one request and returns (ok, output), passing its interim progress lines
+        to on_progress. Raises EOFError if the server died first.
+        """
+        request_id = self._next_id
+        self._next_id += 1
+        try:
+            self.proc.stdin.write(json.dumps({"id": request_id, "argv": argv}) + "\n")
+            self.proc.stdin.flush()
+        except OSError:
+            raise EOFError
+        for line in self.proc.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                # Libraries can print on import, before the server takes over stdout
+                sys.stderr.write(line)
+                continue
+            if isinstance(message, dict) and message.get("id") == request_id:
+                if "progress" in message:
+                    if on_progress is not None:
+                        on_progress(message["progress"])
+                    continue
+                return message["ok"], message["output"]
+        raise EOFError
+
+    def kill(self):
+        if self.proc.poll() is None:
+            if os.name == 'nt':
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(self.proc.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                try:
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        self.proc.wait()
+
+    def stop(self):
+        # Closing stdin lets the server exit cleanly
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=SERVER_STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.kill()
+
+
+class Job:
+    def __init__(self, job_id, tool, argv, priority, resource):
+        self.id = job_id
+        self.tool = tool
+        self.argv = argv
+        self.priority = priority
+        self.resource = resource
+        self.state = 'queued'  # queued -> running -> finishing -> (removed); or cancelled while queued
+        self.cancelled = False
+        self.submitted = time.monotonic()
+        self.started = None
+        self.server = None
+
+
+class JobScheduler:
+    """
+    Runs submitted jobs within per-class (and per-tool) concurrency limits.
+    `respond(job_id, ok, output)` is called once per job, from a scheduler thread;
+    `progress(job_id, line)`, if given, for each interim line the job's tool sends before that.
+    """
+
+    def __init__(self, respond, limits=None, progress=None):
+        self.limits = dict(default_limits(), **(limits or {}))
+        self._respond = respond
+        self._progress = progress
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._queues = {resource: [] for resource in RESOURCE_CLASSES}
+        self._running = {resource: 0 for resource in RESOURCE_CLASSES}
+        self._tool_running = {tool: 0 for tool in JOB_CLASSES}
+        self._jobs = {}
+        self._idle_servers = {tool: [] for tool in JOB_CLASSES}
+        self._seq = 0
+        self._stats = {resource: {"completed": 0, "failed": 0, "cancelled": 0, "started": 0,
+                                  "wait_total_s": 0.0, "wait_max_s": 0.0}
+                       for resource in RESOURCE_CLASSES}
+
+    def submit(self, job_id, tool, argv, priority=0, resource=None):
+        tool = tool.removesuffix('.py')
+        if tool not in JOB_CLASSES:
+            raise ValueError(f"Unknown tool: {tool}")
+        resource = resource or classify(tool, argv)
+        if resource not in RESOURCE_CLASSES:
+            raise ValueError(f"Unknown resource class: {resource}")
+        with self._lock:
+            if job_id in self._jobs:
+                raise ValueError(f"Duplicate job id: {job_id}")
+            job = self._jobs[job_id] = Job(job_id, tool, argv, priority, resource)
+            self._seq += 1
+            heapq.heappush(self._queues[resource], (-priority, self._seq, job))
+            self._dispatch_locked()
+
+    def _next_job_locked(self, resource):
+        # Highest priority job whose tool is under its own limit; jobs skipped for that keep their place
+        queue = self._queues[resource]
+        skipped = []
+        job = None
+        while queue:
+            entry = heapq.heappop(queue)
+            if entry[2].state != 'queued':
+                continue  # Cancelled while waiting
+            if self._tool_running[entry[2].tool] < TOOL_LIMITS.get(entry[2].tool, float('inf')):
+                job = entry[2]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(queue, entry)
+        return job
+
+    def _dispatch_locked(self):
+        for resource in RESOURCE_CLASSES:
+            while self._running[resource] < self.limits[resource]:
+                job = self._next_job_locked(resource)
+                if job is None:
+                    break
+                job.state = 'running'
+                job.started = time.monotonic()
+                self._running[resource] += 1
+                self._tool_running[job.tool] += 1
+                stats = self._stats[resource]
+                waited = job.started - job.submitted
+                stats["started"] += 1
+                stats["wait_total_s"] += waited
+                stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+                threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        with self._lock:
+            idle = self._idle_servers[job.tool]
+            server = idle.pop() if idle else None
+        try:
+            server = server or _ToolServer(job.tool)
+        except OSError as e:
+            self._finish(job, False, f"ERROR: Could not start {job.tool}: {str(e)}")
+            return
+
+        with self._lock:
+            job.server = server
+            cancelled = job.cancelled
+        if cancelled:
+            self._release(server)
+            self._finish(job, False, "ERROR: Cancelled")
+            return
+
+        try:
+            on_progress = (lambda line: self._progress(job.id, line)) if self._progress else None
+            ok, output = server.run(job.argv, on_progress)
+            healthy = True
+        except EOFError:
+            ok, output, healthy = False, f"ERROR: {job.tool} exited unexpectedly", False
+
+        with self._lock:
+            # From here on cancel() leaves the job alone; a cancel that got in first is killing the server
+            job.state = 'finishing'
+            job.server = None
+            cancelled = job.cancelled
+        if cancelled:
+            server.kill()
+            ok, output = False, "ERROR: Cancelled"
+        elif healthy:
+            self._release(server)
+        else:
+            server.kill()
+        self._finish(job, ok, output)
+
+    def _release(self, server):
+        with self._lock:
+            idle = self._idle_servers[server.tool]
+            keep = len(idle) < MAX_IDLE_SERVERS and server.proc.poll() is None
+            if keep:
+                idle.append(server)
+        if not keep:
+            server.stop()
+
+    def _finish(self, job, ok, output):
+        with self._lock:
+            self._jobs.pop(job.id, None)
+            self._running[job.resource] -= 1
+            self._tool_running[job.tool] -= 1
+            stats = self._stats[job.resource]
+            if job.cancelled:
+                stats["cancelled"] += 1
+            elif ok:
+                stats["completed"] += 1
+            else:
+                stats["failed"] += 1
+            self._dispatch_locked()
+            self._changed.notify_all()
+        self._respond(job.id, ok, output)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued or running job. Returns False if there is no such job, or it
+        has already finished running and is only being reported.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.cancelled or job.state == 'finishing':
+                return False
+            job.cancelled = True
+            queued = job.state == 'queued'
+            if queued:
+                job.state = 'cancelled'
+                del self._jobs[job_id]
+                self._stats[job.resource]["cancelled"] += 1
+                self._changed.notify_all()
+            server = job.server
+        if queued:
+            self._respond(job_id, False, "ERROR: Cancelled")
+        elif server is not None:
+            # Unblocks _run, which reports the cancellation; if no server yet, _run checks the flag
+            server.kill()
+        return True
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._lock:
+            classes = {}
+            for resource in RESOURCE_CLASSES:
+                stats = self._stats[resource]
+                waiting = [now - job.submitted for job in self._jobs.values()
+                           if job.resource == resource and job.state == 'queued']
+                classes[resource] = {
+                    "limit": self.limits[resource],
+                    "running": self._running[resource],
+                    "queued": len(waiting),
+                    "oldest_wait_s": round(max(waiting, default=0.0), 3),
+                    "avg_wait_s": round(stats["wait_total_s"] / stats["started"], 3) if stats["started"] else None,
+                    "max_wait_s": round(stats["wait_max_s"], 3),
+                    "completed": stats["completed"],
+                    "failed": stats["failed"],
+                    "cancelled": stats["cancelled"],
+                }
+            jobs = [{
+                "id": job.id,
+                "tool": job.tool,
+                "command": job.argv[0] if job.argv else None,
+                "resource": job.resource,
+                "priority": job.priority,
+                "state": job.state,
+                "waited_s": round((job.started or now) - job.submitted, 3),
+                "running_s": round(now - job.started, 3) if job.started else None,
+            } for job in self._jobs.values()]
+            idle = {tool: len(servers) for tool, servers in self._idle_servers.items() if servers}
+        return {"classes": classes, "jobs": jobs, "idle_servers": idle}
+
+    def shutdown(self):
+        """
+        Waits for queued and running jobs, then stops the idle servers.
+        """
+        with self._lock:
+            while self._jobs:
+                self._changed.wait()
+            servers = [server for idle in self._idle_servers.values() for server in idle]
+            for idle in self._idle_servers.values():
+                idle.clear()
+        for server in servers:
+            server.stop()
+
+
+def serve(limits=None):
+    """
+    Reads jobs, cancellations and metrics requests from stdin until EOF, then
+    lets every accepted job finish before exiting.
+    """
+    write_lock = threading.Lock()
+
+    def write(payload):
+        line = json.dumps(payload)
+        with write_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def respond(request_id, ok, output):
+        write({"id": request_id, "ok": ok, "output": output})
+
+    def progress(job_id, line):
+        write({"id": job_id, "progress": line})
+
+    scheduler = JobScheduler(respond, limits, progress)
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+                request_id = request["id"]
+            except (ValueError, KeyError, TypeError) as e:
+                respond(None, False, f"ERROR: Malformed request - {str(e)}")
+                continue
+            try:
+                if "cancel" in request:
+                    found = scheduler.cancel(request["cancel"])
+                    respond(request_id, found, "cancelled" if found else f"ERROR: No such job: {request['cancel']}")
+                elif request.get("metrics"):
+                    respond(request_id, True, json.dumps(scheduler.metrics()))
+                else:
+                    scheduler.submit(request_id, str(request["tool"]), [str(a) for a in request.get("argv", [])],
+                                     int(request.get("priority", 0)), request.get("resource"))
+            except (ValueError, KeyError, TypeError) as e:
+                respond(request_id, False, f"ERROR: {str(e)}")
+    finally:
+        scheduler.shutdown()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+
+    # Server mode: the only mode; the Electron side keeps one scheduler for the app's lifetime
+    limits = default_limits()
+    p_serve = subparsers.add_parser('serve')
+    p_serve.add_argument('--cpu_slots', type=int, default=limits['cpu']) # Concurrent CPU-heavy jobs (OCR, image encoding)
+    p_serve.add_argument('--memory_slots', type=int, default=limits['memory']) # Concurrent memory-heavy jobs (merge, images to PDF)
+    p_serve.add_argument('--io_slots', type=int, default=limits['io']) # Concurrent I/O-bound jobs (archives)
+    p_serve.set_defaults(func=lambda args: serve({'cpu': args.cpu_slots, 'memory': args.memory_slots, 'io': args.io_slots}))
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if hasattr(args, 'func'):
+        args.func(args)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -2,126 +2,548 @@
 import sys
 import argparse
 import os
-from PIL import Image
+import io
+import json
+import math
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageSequence
+from sidecar_server import add_serve_parser
+from result_cache import add_result_cache_args, get_result_cache, result_cache_from_args, run_cached
+import telemetry
+
+# Target-size search bounds for lossy formats
+MIN_QUALITY = 5
+MAX_QUALITY = 95
+# The probe is a downscaled copy of at most this many pixels, cheap enough to encode at every probe quality
+PROBE_MAX_PIXELS = 256 * 1024
+PROBE_QUALITIES = (5, 15, 30, 50, 70, 85, 95)
+# Full-resolution encodes allowed while refining the predicted quality
+MAX_REFINE_ENCODES = 4
+# When even MIN_QUALITY overshoots, downscale at most this many times (if allowed)
+MAX_DOWNSCALE_STEPS = 4
+
+# images_to_pdf: formats handed to PyMuPDF undecoded, and lossy formats that get re-encoded as JPEG
+PASSTHROUGH_FORMATS = {'JPEG', 'JPEG2000', 'PNG'}
+LOSSY_FORMATS = {'WEBP', 'MPO'}
+# Matches the resolution the Pillow-based writer used, so default page sizes don't change
+DEFAULT_PDF_DPI = 100.0
+# MuPDF isn't thread-safe and serve mode runs requests on several threads, so PDF building takes turns
+_fitz_lock = threading.Lock()
+
+# Decode layer: estimated peak decode memory allowed per image
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get('CONVERTGG_MEMORY_BUDGET_MB', 1024))
+# Alpha is flattened in strips of about this many source bytes
+STRIP_BYTES = 4 * 1024 * 1024
+# open_image enforces its own memory budget from the header size before decoding,
+# which replaces Pillow's decompression-bomb pixel limit (too low for large scans and panoramas)
+Image.MAX_IMAGE_PIXELS = None
+
+# Decoded bytes per pixel by Pillow mode (Pillow stores '1' as one byte per pixel)
+_MODE_BYTES = {'1': 1, 'L': 1, 'P': 1, 'LA': 2, 'La': 2, 'PA': 2, 'RGB': 3, 'YCbCr': 3, 'LAB': 3, 'HSV': 3}
+
+def _bytes_per_pixel(mode):
+    if mode.startswith('I;16'):
+        return 2
+    return _MODE_BYTES.get(mode, 4)
+
+def _flatten_alpha(img):
+    """
+    Composites an image with alpha onto white in one vectorized pass per strip,
+    writing straight into the output buffer (no full-size background/paste/convert copies).
+    Returns an RGB (or L, for grayscale) image.
+    """
+    import numpy as np
+    if img.mode not in ('RGBA', 'LA'):
+        img = img.convert('RGBA')
+    out_mode = 'L' if img.mode == 'LA' else 'RGB'
+    width, height = img.size
+    channels = len(out_mode)
+    out = np.empty((height, width, channels), dtype=np.uint8)
+    rows = max(1, STRIP_BYTES // (width * len(img.mode)))
+    for top in range(0, height, rows):
+        bottom = min(height, top + rows)
+        strip = np.asarray(img.crop((0, top, width, bottom)))
+        alpha = strip[..., channels:].astype(np.uint16)
+        # color * a + white * (1 - a), rounded, in 8.8 fixed point
+        blended = strip[..., :channels] * alpha
+        blended += 255 * (255 - alpha) + 127
+        blended //= 255
+        out[top:bottom] = blended
+    return Image.fromarray(out[..., 0] if channels == 1 else out, out_mode)
+
+def open_image(path, max_dimension=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, flatten=False):
+    """
+    Decode layer shared by convert_image, compress_image and images_to_pdf.
+
+    - When max_dimension makes the output smaller, JPEGs are decoded with draft
+      mode (DCT scaling, 1/2 to 1/8 size straight out of the decoder). That is
+      the only bounded decode: other formats are decoded at full size, then
+      box-reduced and resized, so their peak is the full raster.
+    - flatten=True composites alpha onto white in a single vectorized pass.
+    - The decode is refused up front (MemoryError) if its estimated peak (the
+      decoded raster plus the output) would exceed memory_budget_mb.
+
+    Returns a loaded image; the caller owns it.
+    """
+    img = Image.open(path)
+    width, height = img.size
+    scale = min(1.0, max_dimension / max(width, height)) if max_dimension else 1.0
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    if scale < 1.0 and img.format == 'JPEG':
+        img.draft(img.mode if img.mode in ('RGB', 'L') else None, target)
+
+    decoded_bytes = img.width * img.height * _bytes_per_pixel(img.mode)
+    output_bytes = target[0] * target[1] * 4 if (scale < 1.0 or flatten) else 0
+    budget = memory_budget_mb * 1024 * 1024
+    if decoded_bytes + output_bytes > budget:
+        img.close()
+        needed = math.ceil((decoded_bytes + output_bytes) / (1024 * 1024))
+        raise MemoryError(f"Decoding {os.path.basename(path)} needs about {needed} MB, over the "
+                          f"{memory_budget_mb} MB budget; use a smaller max dimension or a larger budget")
+
+    img.load()
+    if img.size != target:
+        factor = int(min(img.width / target[0], img.height / target[1]))
+        if factor >= 2:
+            if img.mode not in ('L', 'RGB', 'RGBA', 'LA', 'CMYK', 'I', 'F'):
+                img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+            img = img.reduce(factor)
+        if img.size != target:
+            img = img.resize(target, Image.LANCZOS)
+
+    if flatten and (img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)):
+        img = _flatten_alpha(img)
+    return img
+
+def encode_image(img, fmt, quality):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+def probe_curve(img, fmt):
+    """
+    Encodes a downscaled copy at each probe quality.
+    Returns ({quality: probe_size}, full_pixels / probe_pixels).
+    """
+    pixels = img.width * img.height
+    factor = min(1.0, math.sqrt(PROBE_MAX_PIXELS / pixels)) if pixels else 1.0
+    probe = img
+    if factor < 1.0:
+        probe = img.resize((max(1, round(img.width * factor)), max(1, round(img.height * factor))), Image.BILINEAR)
+    curve = {q: len(encode_image(probe, fmt, q)) for q in PROBE_QUALITIES}
+    return curve, pixels / (probe.width * probe.height)
+
+def curve_size(curve, quality):
+    """
+    Interpolates the probe size at `quality` (log-linear between probe points).
+    """
+    points = sorted(curve.items())
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (q0, s0), (q1, s1) in zip(points, points[1:]):
+        if quality <= q1:
+            t = (quality - q0) / (q1 - q0)
+            return math.exp(math.log(s0) + t * (math.log(s1) - math.log(s0)))
+    return points[-1][1]
+
+def ratio_at(ratios, quality):
+    """
+    Full-to-probe size ratio at `quality`, interpolated between the qualities
+    measured at full resolution so far (held constant beyond them).
+    """
+    points = sorted(ratios.items())
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (q0, r0), (q1, r1) in zip(points, points[1:]):
+        if quality <= q1:
+            return r0 + (quality - q0) / (q1 - q0) * (r1 - r0)
+    return points[-1][1]
+
+def _predict_quality(curve, ratios, target_size, lo, hi):
+    """
+    Highest quality in (lo, hi) whose predicted full-size encode fits target_size.
+    """
+    best = lo + 1
+    for q in range(lo + 1, hi):
+        if curve_size(curve, q) * ratio_at(ratios, q) <= target_size:
+            best = q
+        else:
+            break
+    return best
+
+def encode_to_target_size(img, fmt, target_size, allow_downscale=False):
+    """
+    Finds the highest JPEG/WEBP quality whose output fits target_size bytes.
+
+    A size/quality curve measured on a small probe predicts the quality, and a few
+    full-resolution encodes refine it (each one adds a probe-to-full calibration point).
+    If even MIN_QUALITY is too big and allow_downscale is set, the image is shrunk
+    and the search repeated.
+
+    Returns (encoded bytes, stats). The bytes are the best encode seen, ready to write.
+    """
+    stats = {"encodes": 0, "probe_encodes": 0, "quality": None, "scale": 1.0}
+    curve, pixel_ratio = probe_curve(img, fmt)
+    stats["probe_encodes"] += len(curve)
+    # Until the first full encode, assume size scales with pixel count
+    ratios = {MAX_QUALITY: pixel_ratio}
+    measured = set()
+
+    best = None  # (quality, data) of the best encode that fits
+    smallest = None  # Lowest-quality encode seen, used when nothing fits
+    lo, hi = MIN_QUALITY - 1, MAX_QUALITY + 1  # lo fits (or sentinel), hi overshoots (or sentinel)
+    while stats["encodes"] < MAX_REFINE_ENCODES and hi - lo > 1:
+        quality = _predict_quality(curve, ratios, target_size, lo, hi)
+        if quality in measured:
+            break
+        data = encode_image(img, fmt, quality)
+        stats["encodes"] += 1
+        if not measured:
+            ratios.clear()
+        measured.add(quality)
+        ratios[quality] = len(data) / curve_size(curve, quality)
+        if smallest is None or quality < smallest[0]:
+            smallest = (quality, data)
+        if len(data) <= target_size:
+            best = (quality, data)
+            lo = quality
+        else:
+            hi = quality
+
+    if best is None and hi > MIN_QUALITY:
+        # Refinement ran out before confirming anything fits; fall back to the floor
+        data = encode_image(img, fmt, MIN_QUALITY)
+        stats["encodes"] += 1
+        smallest = (MIN_QUALITY, data)
+        if len(data) <= target_size:
+            best = smallest
+
+    if best is None and allow_downscale:
+        current = img
+        for _ in range(MAX_DOWNSCALE_STEPS):
+            # Encoded size scales roughly with pixel count
+            factor = math.sqrt(target_size / len(smallest[1])) * 0.95
+            current = current.resize((max(1, round(current.width * factor)), max(1, round(current.height * factor))), Image.LANCZOS)
+            stats["scale"] = round(current.width / img.width, 4)
+            data, sub_stats = encode_to_target_size(current, fmt, target_size, allow_downscale=False)
+            stats["encodes"] += sub_stats["encodes"]
+            stats["probe_encodes"] += sub_stats["probe_encodes"]
+            smallest = (sub_stats["quality"], data)
+            if len(data) <= target_size:
+                best = smallest
+                break
+
+    quality, data = best or smallest
+    stats["quality"] = quality
+    stats["size"] = len(data)
+    stats["fits"] = len(data) <= target_size
+    return data, stats
+
+def _open_for_output(input_path, output_path, max_dimension, memory_budget_mb):
+    """
+    Decodes input_path ready for saving as output_path's format.
+    JPEG has no alpha, so alpha is flattened onto white and other modes become RGB.
+    """
+    is_jpeg = output_path.lower().endswith('.jpg') or output_path.lower().endswith('.jpeg')
+    img = open_image(input_path, max_dimension, memory_budget_mb, flatten=is_jpeg)
+    if is_jpeg and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img
+
+def _output_params(output_path, **params):
+    # The memory budget only decides whether a decode is allowed, so it isn't part of a result's identity
+    return {"format": os.path.splitext(output_path)[1].lower(), **params}
+
+def convert_image_file(input_path, output_path, max_dimension=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, cache=None):
+    """
+    Converts an image to the format implied by output_path's extension.
+    Returns None, or result cache stats when served from `cache`.
+    """
+    def produce():
+        with telemetry.stage('decode') as counts:
+            img = _open_for_output(input_path, output_path, max_dimension, memory_budget_mb)
+            counts["pixels"] = img.width * img.height
+        with img, telemetry.stage('encode') as counts:
+            img.save(output_path)
+            counts["bytes"] = os.path.getsize(output_path)
+
+    return run_cached(cache, 'convert_image', [input_path], _output_params(output_path, max_dimension=max_dimension),
+                      output_path, produce)
+
+def compress_image_file(input_path, output_path, target_size, allow_downscale=False, max_dimension=None,
+                        memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, cache=None):
+    """
+    Compresses an image to approximately target_size bytes.
+    Returns encoder stats for JPEG/WEBP outputs (result cache stats on a hit), None otherwise.
+    """
+    params = _output_params(output_path, target_size=target_size, allow_downscale=allow_downscale, max_dimension=max_dimension)
+    return run_cached(cache, 'compress_image', [input_path], params, output_path,
+                      lambda: _compress_image_file(input_path, output_path, target_size, allow_downscale,
+                                                   max_dimension, memory_budget_mb))
+
+def _compress_image_file(input_path, output_path, target_size, allow_downscale, max_dimension, memory_budget_mb):
+    with telemetry.stage('decode') as counts:
+        img = _open_for_output(input_path, output_path, max_dimension, memory_budget_mb)
+        counts["pixels"] = img.width * img.height
+
+    # Size-targeted encode for JPEG/WEBP; the winning buffer is written as-is
+    if output_path.lower().endswith(('.jpg', '.jpeg', '.webp')):
+        fmt = 'JPEG' if output_path.lower().endswith(('jpg', 'jpeg')) else 'WEBP'
+        with telemetry.stage('encode') as counts:
+            data, stats = encode_to_target_size(img, fmt, target_size, allow_downscale=allow_downscale)
+            counts.update(encodes=stats["encodes"], probe_encodes=stats["probe_encodes"], bytes=len(data))
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return stats
+
+    # PNG/BMP etc just save (compression not adjustable via quality)
+    # PNG can use optimize=True
+    with telemetry.stage('encode', encodes=1) as counts:
+        img.save(output_path, optimize=True)
+        counts["bytes"] = os.path.getsize(output_path)
+    return None
 
 def convert_image(args):
     """
     Converts an image to a different format.
     """
-    input_path = args.input_path
-    output_path = args.output_path
-    
     try:
-        # Open image
-        with Image.open(input_path) as img:
-            # Convert RGBA to RGB if saving as JPEG (which doesn't support alpha)
-            if output_path.lower().endswith('.jpg') or output_path.lower().endswith('.jpeg'):
-                if img.mode in ('RGBA', 'LA'):
-                    background = Image.new(img.mode[:-1], img.size, (255, 255, 255))
-                    background.paste(img, img.split()[-1])
-                    img = background
-                img = img.convert('RGB')
-            
-            # Save
-            img.save(output_path)
-            
+        stats = convert_image_file(args.input_path, args.output_path, args.max_dimension, args.memory_budget_mb,
+                                   result_cache_from_args(args))
+        if stats:
+            print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
-    args = parser.parse_args()
-    if hasattr(args, 'func'):
-        args.func(args)
-    else:
-        parser.print_help()
-
 def compress_image(args):
     """
     Compresses image to target size (approx).
     """
-    input_path = args.input_path
-    output_path = args.output_path
     target_size = int(args.target_size) # in bytes (handled as kb in frontend, passed as bytes)
-    
+
+    try:
+        stats = compress_image_file(args.input_path, args.output_path, target_size, args.allow_downscale,
+                                    args.max_dimension, args.memory_budget_mb, result_cache_from_args(args))
+        if stats:
+            print(f"STATS: {json.dumps(stats)}")
+        print("SUCCESS")
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def _run_batch_entry(operation, entry, cache_options=None):
+    """
+    Pool worker for a single manifest entry. Never raises, so one bad file can't abort the batch.
+    cache_options is (directory, max_mb) for the result cache, or None to bypass it;
+    an entry can also opt out with "no_result_cache": true.
+    """
+    start = time.perf_counter()
     try:
-        img = Image.open(input_path)
-        
-        # RGBA to RGB for JPEG
-        if output_path.lower().endswith('.jpg') or output_path.lower().endswith('.jpeg'):
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new(img.mode[:-1], img.size, (255, 255, 255))
-                background.paste(img, img.split()[-1])
-                img = background
-            img = img.convert('RGB')
-            
-        # Optimization loop for JPEG/WEBP
-        if output_path.lower().endswith(('.jpg', '.jpeg', '.webp')):
-            min_quality = 5
-            max_quality = 95
-            
-            # Binary search for quality
-            best_quality = max_quality
-            
-            for _ in range(7): # 7 steps covers 0-100 range reasonably well
-                mid_quality = (min_quality + max_quality) // 2
-                
-                # Save to temp buffer to check size
-                import io
-                buf = io.BytesIO()
-                img.save(buf, format='JPEG' if output_path.lower().endswith(('jpg', 'jpeg')) else 'WEBP', quality=mid_quality)
-                size = buf.tell()
-                
-                if size <= target_size:
-                    best_quality = mid_quality
-                    min_quality = mid_quality + 1 # Try for better quality
-                else:
-                    max_quality = mid_quality - 1 # Need lower quality
-            
-            img.save(output_path, quality=best_quality)
+        max_dimension = entry.get('max_dimension')
+        memory_budget_mb = entry.get('memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB)
+        cache = get_result_cache(*cache_options) if cache_options and not entry.get('no_result_cache') else None
+        if operation == 'convert_image':
+            stats = convert_image_file(entry['input_path'], entry['output_path'], max_dimension, memory_budget_mb, cache)
         else:
-            # PNG/BMP etc just save (compression not adjustable via quality)
-            # PNG can use optimize=True
-            img.save(output_path, optimize=True)
-            
+            stats = compress_image_file(entry['input_path'], entry['output_path'], int(entry['target_size']),
+                                        bool(entry.get('allow_downscale', False)), max_dimension, memory_budget_mb, cache)
+        result = {"ok": True, "stats": stats}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def run_batch(operation, manifest_path, workers=None, cache_options=None):
+    """
+    Runs every entry of a JSON manifest across a process pool.
+    The manifest is a list of {"input_path", "output_path", ...options} objects
+    ('-' reads it from stdin). One JSON result line is printed per file as it
+    finishes, tagged with its manifest index, followed by a summary line.
+    Through serve mode and the job scheduler they arrive as progress messages (see sidecar_server).
+    If a worker process dies (e.g. out of memory), the entries it took down with
+    the pool are reported as failed and the rest of the summary still prints.
+    """
+    if manifest_path == '-':
+        entries = json.load(sys.stdin)
+    else:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+
+    start = time.perf_counter()
+    failed = cached = 0
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries) or 1))
+    # Spawn, not fork: serve mode calls this from one of several request threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(_run_batch_entry, operation, entry, cache_options): index for index, entry in enumerate(entries)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # Every unfinished entry fails this way; which one killed the worker is unknown
+                result = {"ok": False, "error": "Worker process died before finishing this file (out of memory?)",
+                          "seconds": 0.0}
+            failed += 0 if result["ok"] else 1
+            cached += 1 if (result.get("stats") or {}).get("cache") == "hit" else 0
+            print(json.dumps({"index": index, "input_path": entries[index].get('input_path'),
+                              "output_path": entries[index].get('output_path'), **result}), flush=True)
+
+    summary = {"files": len(entries), "failed": failed, "cached": cached, "workers": workers,
+               "seconds": round(time.perf_counter() - start, 3)}
+    print(f"STATS: {json.dumps(summary)}")
+
+def _batch_cache_options(args):
+    # Pool workers open the cache themselves; the options are what gets pickled
+    return None if args.no_result_cache else (args.result_cache_dir, args.result_cache_max_mb)
+
+def convert_image_batch(args):
+    """
+    Converts many images in parallel from a manifest.
+    """
+    try:
+        run_batch('convert_image', args.manifest, args.workers, _batch_cache_options(args))
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
+def compress_image_batch(args):
+    """
+    Compresses many images in parallel from a manifest (entries need a target_size).
+    """
+    try:
+        run_batch('compress_image', args.manifest, args.workers, _batch_cache_options(args))
+        print("SUCCESS")
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def _fit_page_rect(width_px, height_px, dpi, page_size):
+    """
+    Page size in points for an image: its own size at `dpi` for 'fit', otherwise
+    the named paper size, turned to landscape for landscape images.
+    """
+    import fitz  # PyMuPDF, only needed for images_to_pdf
+    if page_size == 'fit':
+        return fitz.Rect(0, 0, width_px * 72.0 / dpi, height_px * 72.0 / dpi)
+    paper_w, paper_h = fitz.paper_size(page_size)
+    if (width_px > height_px) != (paper_w > paper_h):
+        paper_w, paper_h = paper_h, paper_w
+    return fitz.Rect(0, 0, paper_w, paper_h)
+
+def validate_page_layout(page_size, margin):
+    """
+    Rejects an unknown paper name or a negative margin before any image is decoded.
+    """
+    import fitz  # PyMuPDF
+    if page_size != 'fit' and fitz.paper_size(page_size) == (-1, -1):
+        raise ValueError(f"Unknown page size '{page_size}' (use 'fit' or a paper name such as a4, letter, legal)")
+    if margin < 0:
+        raise ValueError(f"Margin must not be negative, got {margin}")
+
+def _decoded_stream(frame, lossy_source):
+    """
+    Re-encodes a decoded frame into a stream PDF can embed: JPEG for lossy
+    sources (re-encoding those losslessly would only bloat them), PNG otherwise.
+    """
+    buf = io.BytesIO()
+    if lossy_source:
+        if frame.mode not in ('RGB', 'L'):
+            frame = frame.convert('RGB')
+        frame.save(buf, format='JPEG', quality=95)
+    else:
+        if frame.mode not in ('RGB', 'RGBA', 'L', 'LA', '1'):
+            frame = frame.convert('RGBA' if 'A' in frame.getbands() or 'transparency' in frame.info else 'RGB')
+        frame.save(buf, format='PNG')
+    return buf.getvalue()
+
+def add_image_pages(doc, path, dpi=DEFAULT_PDF_DPI, page_size='fit', margin=0.0, max_dimension=None,
+                    memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Appends one page per frame of the image at `path` to `doc`.
+    JPEG and JPEG 2000 files are embedded byte-for-byte and PNGs are handed to
+    MuPDF as-is; other formats are decoded one frame at a time and released straight after.
+    Images larger than max_dimension are decoded at reduced size instead of passed through.
+    Returns True if the file was passed through.
+    """
+    with Image.open(path) as img:
+        width, height = img.size
+        fmt = img.format
+        n_frames = getattr(img, 'n_frames', 1)
+        fits = not max_dimension or max(width, height) <= max_dimension
+        passthrough = fits and fmt in PASSTHROUGH_FORMATS and img.mode in ('RGB', 'L', 'RGBA', 'LA', 'P')
+        lossy = fmt in LOSSY_FORMATS or fmt == 'JPEG'
+        if passthrough:
+            with open(path, 'rb') as f:
+                streams = [(width, height, f.read())]
+        elif n_frames == 1:
+            frame = open_image(path, max_dimension, memory_budget_mb)
+            streams = [(frame.width, frame.height, _decoded_stream(frame, lossy))]
+            del frame
+        else:
+            streams = ((frame.width, frame.height, _decoded_stream(frame, lossy)) for frame in ImageSequence.Iterator(img))
+
+        for frame_width, frame_height, stream in streams:
+            rect = _fit_page_rect(frame_width, frame_height, dpi, page_size)
+            if 2 * margin >= min(rect.width, rect.height):
+                raise ValueError(f"A {margin:g} pt margin leaves no room for {os.path.basename(path)} "
+                                 f"on a {rect.width:g} x {rect.height:g} pt page")
+            page = doc.new_page(width=rect.width, height=rect.height)
+            page.insert_image(rect + (margin, margin, -margin, -margin), stream=stream)
+            del stream
+    return passthrough
+
 def images_to_pdf(args):
     """
-    Combines multiple images into a single PDF.
+    Combines multiple images into a single PDF, one image at a time.
     """
     input_paths = args.input_paths # List of strings
     output_path = args.output_path
-    
+
+    def produce():
+        with _fitz_lock:
+            return build()
+
+    def build():
+        import fitz  # PyMuPDF
+        doc = fitz.open()
+        passed_through = 0
+        with telemetry.stage('add_pages', images=len(input_paths)) as counts:
+            for p in input_paths:
+                if add_image_pages(doc, p, args.dpi, args.page_size, args.margin, args.max_dimension, args.memory_budget_mb):
+                    passed_through += 1
+            counts["pages"] = len(doc)
+
+        if len(doc) == 0:
+             raise ValueError("Failed to load images")
+
+        with telemetry.stage('save', pages=len(doc)) as counts:
+            doc.save(output_path, garbage=1, deflate=True)
+            doc.close()
+            counts["bytes"] = os.path.getsize(output_path)
+        return {'images': len(input_paths), 'passthrough': passed_through}
+
     try:
         if not input_paths:
             raise ValueError("No input images provided")
+        validate_page_layout(args.page_size, args.margin)
 
-        images = []
-        for p in input_paths:
-            img = Image.open(p)
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-            images.append(img)
-            
-        if not images:
-             raise ValueError("Failed to load images")
-
-        # Save primary image with others appended
-        first_image = images[0]
-        other_images = images[1:]
-        
-        first_image.save(output_path, "PDF", resolution=100.0, save_all=True, append_images=other_images)
-            
+        params = {"page_size": args.page_size, "dpi": args.dpi, "margin": args.margin, "max_dimension": args.max_dimension}
+        stats = run_cached(result_cache_from_args(args), 'images_to_pdf', input_paths, params, output_path, produce)
+        print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
-if __name__ == "__main__":
+def build_parser():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest='command')
 
@@ -129,6 +551,9 @@ if __name__ == "__main__":
     p_img = subparsers.add_parser('convert_image')
     p_img.add_argument('--input_path', required=True)
     p_img.add_argument('--output_path', required=True)
+    p_img.add_argument('--max_dimension', type=int) # Longest output side in pixels; enables reduced decoding
+    p_img.add_argument('--memory_budget_mb', type=int, default=DEFAULT_MEMORY_BUDGET_MB)
+    add_result_cache_args(p_img)
     p_img.set_defaults(func=convert_image)
 
     # Compress Image
@@ -136,17 +561,50 @@ if __name__ == "__main__":
     p_comp.add_argument('--input_path', required=True)
     p_comp.add_argument('--output_path', required=True)
     p_comp.add_argument('--target_size', required=True) # Bytes
+    p_comp.add_argument('--allow_downscale', action='store_true') # Shrink resolution if min quality is still too big
+    p_comp.add_argument('--max_dimension', type=int)
+    p_comp.add_argument('--memory_budget_mb', type=int, default=DEFAULT_MEMORY_BUDGET_MB)
+    add_result_cache_args(p_comp)
     p_comp.set_defaults(func=compress_image)
     
+    # Batch variants: --manifest is a JSON list of {input_path, output_path, ...} ('-' for stdin)
+    p_img_batch = subparsers.add_parser('convert_image_batch')
+    p_img_batch.add_argument('--manifest', required=True)
+    p_img_batch.add_argument('--workers', type=int) # Defaults to the number of cores
+    add_result_cache_args(p_img_batch)
+    p_img_batch.set_defaults(func=convert_image_batch)
+
+    p_comp_batch = subparsers.add_parser('compress_image_batch')
+    p_comp_batch.add_argument('--manifest', required=True)
+    p_comp_batch.add_argument('--workers', type=int)
+    add_result_cache_args(p_comp_batch)
+    p_comp_batch.set_defaults(func=compress_image_batch)
+
     # Images to PDF
     p_pdf = subparsers.add_parser('images_to_pdf')
     p_pdf.add_argument('input_paths', nargs='+', help='Input image paths')
     p_pdf.add_argument('--output_path', required=True)
+    p_pdf.add_argument('--page_size', default='fit') # 'fit' (page matches the image) or a paper name: a4, letter, legal...
+    p_pdf.add_argument('--dpi', type=float, default=DEFAULT_PDF_DPI) # Image resolution for 'fit' pages
+    p_pdf.add_argument('--margin', type=float, default=0.0) # Points around the image
+    p_pdf.add_argument('--max_dimension', type=int)
+    p_pdf.add_argument('--memory_budget_mb', type=int, default=DEFAULT_MEMORY_BUDGET_MB)
+    add_result_cache_args(p_pdf)
     p_pdf.set_defaults(func=images_to_pdf)
 
-    args = parser.parse_args()
+    # Server mode: Pillow releases the GIL while encoding, so run requests in parallel
+    add_serve_parser(subparsers, parser, default_workers=os.cpu_count() or 1)
+    return parser
 
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
     if hasattr(args, 'func'):
-        args.func(args)
+        telemetry.run_command(parser.prog, args)
     else:
         parser.print_help()
+
+if __name__ == "__main__":
+    # Needed for the batch process pools in PyInstaller builds
+    multiprocessing.freeze_support()
+    main()
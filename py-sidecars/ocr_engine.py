@@ -1,52 +1,510 @@
 import argparse
 import sys
 import os
+import io
+import json
+import time
+import math
+import queue
+import threading
+import pickle
+import multiprocessing
+from collections import deque
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
-from paddleocr import PPStructure, draw_structure_result, save_structure_res
-from paddleocr.ppstructure.recovery.recovery_to_doc import sorted_layout_boxes, convert_info_docx
-from PIL import Image
-import cv2
-import numpy as np
-
-def convert_pdf_to_images(pdf_path):
-    doc = fitz.open(pdf_path)
-    images = []
-    for page in doc:
-        pix = page.get_pixmap()
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        img = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-        images.append(img)
-    return images
-
-def main():
-    parser = argparse.ArgumentParser(description="OCR Engine using PaddleOCR")
-    parser.add_argument("--input_pdf_path", required=True, help="Path to input PDF")
-    parser.add_argument("--output_docx_path", required=True, help="Path to output DOCX")
-    args = parser.parse_args()
+# paddleocr, docx, cv2 and numpy are imported where first needed; paddleocr alone
+# takes seconds, and cache hits and text-layer pages never need it
+from sidecar_server import serve
+from disk_cache import DiskCache, default_cache_dir, make_key
+import telemetry
+
+# Default seconds of inactivity before a resident server drops its models
+DEFAULT_IDLE_TIMEOUT = 300
+
+# Default number of rendered pages allowed to wait for inference
+DEFAULT_QUEUE_SIZE = 2
+
+# Text-layer pre-pass: a page skips OCR when it has at least this many extractable characters...
+TEXT_LAYER_MIN_CHARS = 32
+# ...and either images cover less than this fraction of it...
+TEXT_LAYER_MAX_IMAGE_COVERAGE = 0.5
+# ...or its text blocks cover at least this fraction (scans that already carry an OCR layer)
+TEXT_LAYER_MIN_TEXT_COVERAGE = 0.15
+# Fraction of U+FFFD characters above which extracted text is considered garbage (broken font encodings)
+TEXT_LAYER_MAX_GARBAGE = 0.05
+# Blocks set this much larger than the median font size become headings
+TITLE_FONT_RATIO = 1.4
+
+# Per-page result cache; bump OCR_CACHE_VERSION whenever cached results would change shape or content
+OCR_CACHE_VERSION = 1
+DEFAULT_CACHE_MAX_MB = 512
+# Must match the PPStructure options in get_table_engine (cpu_threads doesn't affect results)
+ENGINE_SIGNATURE = "table=1;ocr=1"
+
+# Chunks handed to each worker per pool slot; more chunks than workers evens out slow pages
+CHUNKS_PER_WORKER = 4
+
+# PPStructure is expensive to build (layout, table and recognition models), so it
+# is created once per process and reused until explicitly unloaded.
+_table_engine = None
+_engine_lock = threading.Lock()
+
+# Page-sharding pool for --workers, kept alive alongside the engine in resident mode
+_worker_pool = None
+_worker_pool_size = 0
+
+def get_table_engine(cpu_threads=None):
+    """
+    Returns (engine, load_seconds). load_seconds is 0.0 when the cached engine is reused.
+    cpu_threads caps the engine's intra-op threads (PaddleOCR defaults to 10).
+    """
+    global _table_engine
+    with _engine_lock:
+        if _table_engine is not None:
+            return _table_engine, 0.0
+        start = time.perf_counter()
+        from paddleocr import PPStructure
+        options = {"cpu_threads": cpu_threads} if cpu_threads else {}
+        # table=True enables table recognition, ocr=True enables text recognition
+        _table_engine = PPStructure(show_log=True, table=True, ocr=True, **options)
+        return _table_engine, time.perf_counter() - start
+
+def unload_table_engine():
+    """
+    Drops the cached engine (and any worker pool holding its own engines)
+    so model memory can be reclaimed.
+    """
+    global _table_engine, _worker_pool, _worker_pool_size
+    with _engine_lock:
+        if _worker_pool is not None:
+            _worker_pool.shutdown(wait=True)
+            _worker_pool = None
+            _worker_pool_size = 0
+        elif _table_engine is None:
+            return
+        _table_engine = None
+    import gc
+    gc.collect()
+    sys.stderr.write("OCR models unloaded\n")
+
+def render_page(page):
+    """
+    Rasterizes a page to a BGR array.
+    The pixmap samples are converted straight into the BGR array, without an intermediate PIL copy.
+    """
+    import cv2
+    import numpy as np
+    pix = page.get_pixmap()
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+def _covered_fraction(rects, page_rect):
+    page_area = page_rect.get_area()
+    if not page_area:
+        return 0.0
+    covered = sum((fitz.Rect(r) & page_rect).get_area() for r in rects)
+    return min(1.0, covered / page_area)
+
+def text_layer_regions(page):
+    """
+    Builds PPStructure-shaped regions from a page's existing text layer.
+    Returns None when the page has no usable text layer and has to go through OCR.
+    """
+    blocks = [b for b in page.get_text("dict", sort=True)["blocks"] if b.get("type") == 0]
+    lines_per_block = []
+    sizes = []
+    for block in blocks:
+        lines = []
+        for line in block["lines"]:
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if text:
+                lines.append(text)
+                sizes.extend(span["size"] for span in line["spans"] if span["text"].strip())
+        lines_per_block.append(lines)
+
+    text = "".join("".join(lines) for lines in lines_per_block)
+    if len(text) < TEXT_LAYER_MIN_CHARS or text.count("\ufffd") > len(text) * TEXT_LAYER_MAX_GARBAGE:
+        return None
+    image_coverage = _covered_fraction([info["bbox"] for info in page.get_image_info()], page.rect)
+    text_coverage = _covered_fraction([b["bbox"] for b in blocks], page.rect)
+    if image_coverage >= TEXT_LAYER_MAX_IMAGE_COVERAGE and text_coverage < TEXT_LAYER_MIN_TEXT_COVERAGE:
+        return None
+
+    median_size = sorted(sizes)[len(sizes) // 2] if sizes else 0
+    regions = []
+    for block, lines in zip(blocks, lines_per_block):
+        if not lines:
+            continue
+        block_size = max(span["size"] for line in block["lines"] for span in line["spans"])
+        if median_size and block_size >= median_size * TITLE_FONT_RATIO and len(lines) <= 2:
+            regions.append({"type": "title", "bbox": list(block["bbox"]), "layout": "single",
+                            "res": [{"text": " ".join(lines)}]})
+        else:
+            regions.append({"type": "text", "bbox": list(block["bbox"]), "layout": "single",
+                            "res": [{"text": line} for line in lines]})
+    return regions
+
+def iter_pages(pdf_path, use_text_layer=True):
+    """
+    Yields (page_index, BGR image, None) for pages that need OCR and
+    (page_index, None, regions) for pages whose text layer can be used directly.
+    Pages are only rasterized when they need OCR.
+    """
+    with fitz.open(pdf_path) as doc:
+        for index, page in enumerate(doc):
+            regions = text_layer_regions(page) if use_text_layer else None
+            if regions is not None:
+                yield index, None, regions
+            else:
+                yield index, render_page(page), None
+
+def prefetch(iterable, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Runs `iterable` on a producer thread, keeping at most `queue_size` items buffered,
+    so page N+1 is rendered while page N is being inferred.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=max(1, queue_size))
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up once the consumer has gone, instead of blocking on a full buffer forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Consumer bailed out early: let the producer drain and exit
+        stop.set()
+
+class DocxWriter:
+    """
+    Builds the recovered DOCX page by page, so neither page images nor layout
+    results have to be kept around once a page has been added.
+    Region handling follows paddleocr's convert_info_docx.
+    """
+
+    def __init__(self):
+        from docx import Document, shared
+        from docx.oxml.ns import qn
+        self.doc = Document()
+        self.doc.styles["Normal"].font.name = "Times New Roman"
+        self.doc.styles["Normal"]._element.rPr.rFonts.set(qn("w:eastAsia"), "宋体")
+        self.doc.styles["Normal"].font.size = shared.Pt(6.5)
+        self.pages = 0
+        self._columns = 1
+
+    def _set_columns(self, columns):
+        if columns == self._columns:
+            return
+        from docx.enum.section import WD_SECTION
+        from docx.oxml.ns import qn
+        section = self.doc.add_section(WD_SECTION.CONTINUOUS)
+        section._sectPr.xpath("./w:cols")[0].set(qn("w:num"), str(columns))
+        self._columns = columns
+
+    def add_page(self, regions):
+        """
+        Appends one page worth of sorted_layout_boxes output.
+        """
+        import cv2
+        from docx import shared
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        if self.pages:
+            self.doc.add_page_break()
+        self.pages += 1
+
+        for region in regions:
+            if len(region["res"]) == 0:
+                continue
+            self._set_columns(2 if region.get("layout") == "double" else 1)
+            region_type = region["type"].lower()
+
+            if region_type == "figure":
+                ok, encoded = cv2.imencode(".jpg", region["img"])
+                if not ok:
+                    continue
+                paragraph_pic = self.doc.add_paragraph()
+                paragraph_pic.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                run = paragraph_pic.add_run("")
+                width = shared.Inches(5) if self._columns == 1 else shared.Inches(2)
+                run.add_picture(io.BytesIO(encoded.tobytes()), width=width)
+            elif region_type == "title":
+                self.doc.add_heading(region["res"][0]["text"])
+            elif region_type == "table":
+                from paddleocr.ppstructure.recovery.table_process import HtmlToDocx
+                parser = HtmlToDocx()
+                parser.table_style = "TableGrid"
+                parser.handle_table(region["res"]["html"], self.doc)
+            else:
+                paragraph = self.doc.add_paragraph()
+                paragraph_format = paragraph.paragraph_format
+                for i, line in enumerate(region["res"]):
+                    if i == 0:
+                        paragraph_format.first_line_indent = shared.Inches(0.25)
+                    text_run = paragraph.add_run(line["text"] + " ")
+                    text_run.font.size = shared.Pt(10)
+
+    def save(self, output_path):
+        self.doc.save(output_path)
 
+class PageRecognizer:
+    """
+    Runs PPStructure on page images. The engine is only loaded for the first
+    page that misses the cache, so re-running an unchanged document costs render time only.
+    """
+
+    def __init__(self, cache=None, cpu_threads=None):
+        self.cache = cache
+        self.cpu_threads = cpu_threads
+        self.table_engine = None
+        self.load_seconds = 0.0
+        self.inference_seconds = 0.0
+        self._signature = None
+
+    def _cache_key(self, img):
+        if self._signature is None:
+            # Read from the package metadata: importing paddleocr takes seconds and cache hits never need it
+            try:
+                version = metadata.version('paddleocr')
+            except metadata.PackageNotFoundError:
+                version = '?'
+            self._signature = f"v{OCR_CACHE_VERSION};paddleocr={version};{ENGINE_SIGNATURE}"
+        import numpy as np
+        return make_key(self._signature, str(img.shape), memoryview(np.ascontiguousarray(img)).cast("B"))
+
+    def __call__(self, img):
+        """
+        Returns sorted_layout_boxes output for one BGR page image.
+        """
+        key = self._cache_key(img) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return pickle.loads(cached)
+
+        if self.table_engine is None:
+            self.table_engine, self.load_seconds = get_table_engine(self.cpu_threads)
+        from paddleocr.ppstructure.recovery.recovery_to_doc import sorted_layout_boxes
+        page_start = time.perf_counter()
+        res = sorted_layout_boxes(self.table_engine(img), img.shape[1])
+        self.inference_seconds += time.perf_counter() - page_start
+        # save_structure_res(res, './output', 'page') # Optional: debug output
+
+        # Only figure crops are needed by DocxWriter; don't keep, cache or ship the rest
+        for region in res:
+            if region["type"].lower() != "figure":
+                region.pop("img", None)
+        if key:
+            self.cache.put(key, pickle.dumps(res, protocol=pickle.HIGHEST_PROTOCOL))
+        return res
+
+def _open_cache(cache_dir, cache_max_bytes):
+    return DiskCache(cache_dir, cache_max_bytes) if cache_dir else None
+
+def _ocr_page_range(pdf_path, first, last, cpu_threads, use_text_layer, cache_dir, cache_max_bytes):
+    """
+    Pool worker: OCRs pages [first, last) with this process's own engine.
+    Returns (first, per-page results, load_seconds, inference_seconds, text_layer_pages, cache stats).
+    """
+    cache = _open_cache(cache_dir, cache_max_bytes)
+    recognizer = PageRecognizer(cache, cpu_threads)
+    text_layer_pages = 0
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for index in range(first, last):
+            regions = text_layer_regions(doc[index]) if use_text_layer else None
+            if regions is not None:
+                text_layer_pages += 1
+            else:
+                img = render_page(doc[index])
+                regions = recognizer(img)
+                del img
+            pages.append(regions)
+    cache_stats = cache.stats() if cache else None
+    return first, pages, recognizer.load_seconds, recognizer.inference_seconds, text_layer_pages, cache_stats
+
+def _init_worker(cpu_threads):
+    # Runs in the fresh worker before paddle/OpenMP are imported, so their thread pools see it
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(cpu_threads)
+
+def _get_worker_pool(workers):
+    """
+    Returns (pool, cpu_threads_per_worker), reusing the pool across jobs of the same size.
+    """
+    global _worker_pool, _worker_pool_size
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    with _engine_lock:
+        if _worker_pool is not None and _worker_pool_size != workers:
+            _worker_pool.shutdown(wait=True)
+            _worker_pool = None
+        if _worker_pool is None:
+            # Spawn, not fork: this process may hold a loaded engine and OpenMP threads, and
+            # the pool is created from server worker threads, neither of which survive a fork
+            _worker_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=_init_worker, initargs=(cpu_threads,))
+            _worker_pool_size = workers
+        return _worker_pool, cpu_threads
+
+def _merge_cache_stats(total, stats):
+    if stats is None:
+        return total
+    if total is None:
+        total = {"hits": 0, "misses": 0, "bytes_read": 0}
+    for field in ("hits", "misses", "bytes_read"):
+        total[field] += stats[field]
+    lookups = total["hits"] + total["misses"]
+    total["hit_rate"] = round(total["hits"] / lookups, 3) if lookups else None
+    return total
+
+def _ocr_parallel(input_pdf_path, writer, workers, use_text_layer, cache_dir, cache_max_bytes):
+    """
+    Shards the document into contiguous page ranges across a process pool and
+    feeds results to `writer` in page order. At most two chunks per worker are
+    in flight, so finished-but-unwritten results stay bounded.
+    """
+    with fitz.open(input_pdf_path) as doc:
+        page_count = len(doc)
+    pool, cpu_threads = _get_worker_pool(workers)
+
+    chunk_size = max(1, math.ceil(page_count / (workers * CHUNKS_PER_WORKER)))
+    ranges = iter([(first, min(first + chunk_size, page_count)) for first in range(0, page_count, chunk_size)])
+
+    def submit_next():
+        page_range = next(ranges, None)
+        if page_range is not None:
+            pending.append(pool.submit(_ocr_page_range, input_pdf_path, *page_range, cpu_threads,
+                                       use_text_layer, cache_dir, cache_max_bytes))
+
+    pending = deque()
+    for _ in range(workers * 2):
+        submit_next()
+
+    load_seconds = 0.0
+    inference_seconds = 0.0
+    text_layer_pages = 0
+    cache_stats = None
+    while pending:
+        first, pages, chunk_load, chunk_inference, chunk_text_pages, chunk_cache = pending.popleft().result()
+        submit_next()
+        load_seconds += chunk_load
+        inference_seconds += chunk_inference
+        text_layer_pages += chunk_text_pages
+        cache_stats = _merge_cache_stats(cache_stats, chunk_cache)
+        for res in pages:
+            writer.add_page(res)
+        del pages
+
+    return {
+        "workers": workers,
+        "text_layer_pages": text_layer_pages,
+        "model_load_s": round(load_seconds, 3),
+        "model_cached": load_seconds == 0.0,
+        "inference_s": round(inference_seconds, 3),
+        "cache": cache_stats,
+    }
+
+def _ocr_serial(input_pdf_path, writer, queue_size, use_text_layer, cache_dir, cache_max_bytes):
+    """
+    Single-engine path: renders ahead on a producer thread while this thread infers.
+    The engine is only loaded once a page actually needs OCR.
+    """
+    cache = _open_cache(cache_dir, cache_max_bytes)
+    recognizer = PageRecognizer(cache)
+    wait_seconds = 0.0
+    text_layer_pages = 0
+    waited_from = time.perf_counter()
+    for index, img, regions in prefetch(iter_pages(input_pdf_path, use_text_layer), queue_size):
+        wait_seconds += time.perf_counter() - waited_from
+
+        if regions is None:
+            regions = recognizer(img)
+        else:
+            text_layer_pages += 1
+
+        writer.add_page(regions)
+        # Drop this page's buffers before pulling the next one
+        del img, regions
+        waited_from = time.perf_counter()
+
+    return {
+        "workers": 1,
+        "text_layer_pages": text_layer_pages,
+        "model_load_s": round(recognizer.load_seconds, 3),
+        "model_cached": recognizer.load_seconds == 0.0,
+        "render_wait_s": round(wait_seconds, 3),
+        "inference_s": round(recognizer.inference_seconds, 3),
+        "cache": cache.stats() if cache else None,
+    }
+
+def ocr_pdf_to_docx(input_pdf_path, output_docx_path, queue_size=DEFAULT_QUEUE_SIZE, workers=1, use_text_layer=True,
+                    cache_dir=None, cache_max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+    """
+    Runs layout analysis + OCR over every page and writes the recovered DOCX.
+    Pages stream through a bounded queue, so peak memory does not grow with page count.
+    With workers > 1, page ranges are spread over a process pool instead.
+    Pages that already carry a usable text layer skip inference unless use_text_layer is False.
+    With a cache_dir, per-page results are cached by page pixels + engine configuration.
+    Returns a dict of timings so callers can compare model load against inference.
+    """
+    start = time.perf_counter()
+    writer = DocxWriter()
+    # Rendering and inference overlap, so they are reported as totals within one stage
+    with telemetry.stage('recognize', workers=workers) as counts:
+        if workers > 1:
+            stats = _ocr_parallel(input_pdf_path, writer, workers, use_text_layer, cache_dir, cache_max_bytes)
+        else:
+            stats = _ocr_serial(input_pdf_path, writer, queue_size, use_text_layer, cache_dir, cache_max_bytes)
+        counts.update(pages=writer.pages, text_layer_pages=stats["text_layer_pages"],
+                      model_load_ms=round(stats["model_load_s"] * 1000, 1),
+                      inference_ms=round(stats["inference_s"] * 1000, 1),
+                      render_wait_ms=round(stats["render_wait_s"] * 1000, 1) if "render_wait_s" in stats else None)
+    with telemetry.stage('save', pages=writer.pages) as counts:
+        writer.save(output_docx_path)
+        counts["bytes"] = os.path.getsize(output_docx_path)
+
+    stats["pages"] = writer.pages
+    stats["total_s"] = round(time.perf_counter() - start, 3)
+    return stats
+
+def convert(args):
     if not os.path.exists(args.input_pdf_path):
         print(f"Error: Input file {args.input_pdf_path} not found")
         print("ERROR")
         sys.exit(1)
 
     try:
-        # Initialize PaddleOCR PPStructure
-        # table=True enables table recognition, ocr=True enables text recognition
-        table_engine = PPStructure(show_log=True, table=True, ocr=True)
-
-        images = convert_pdf_to_images(args.input_pdf_path)
-        
-        all_res = []
-        for index, img in enumerate(images):
-            result = table_engine(img)
-            # save_structure_res(result, './output', f'page_{index}') # Optional: debug output
-
-            h, w, _ = img.shape
-            res = sorted_layout_boxes(result, w)
-            all_res.append(res)
-        
-        convert_info_docx(images, all_res, args.output_docx_path)
-        
+        stats = ocr_pdf_to_docx(args.input_pdf_path, args.output_docx_path, args.queue_size, args.workers,
+                                use_text_layer=not args.force_ocr,
+                                cache_dir=None if args.no_cache else (args.cache_dir or default_cache_dir('ocr')),
+                                cache_max_bytes=args.cache_max_mb * 1024 * 1024)
+        print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
 
     except Exception as e:
@@ -55,5 +513,45 @@ def main():
         print("ERROR")
         sys.exit(1)
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="OCR Engine using PaddleOCR")
+    parser.add_argument("--input_pdf_path", required=True, help="Path to input PDF")
+    parser.add_argument("--output_docx_path", required=True, help="Path to output DOCX")
+    parser.add_argument("--queue_size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Rendered pages buffered ahead of inference")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes to shard pages across, each with its own engine")
+    parser.add_argument("--force_ocr", action="store_true",
+                        help="OCR every page, even those with a usable text layer")
+    parser.add_argument("--cache_dir", help="Per-page result cache directory (default: user cache dir)")
+    parser.add_argument("--cache_max_mb", type=int, default=DEFAULT_CACHE_MAX_MB,
+                        help="Page cache size cap; least recently used pages are evicted")
+    parser.add_argument("--no_cache", action="store_true", help="Disable the per-page result cache")
+    parser.set_defaults(func=convert)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+
+    # Resident mode: `ocr_engine serve` keeps the models loaded between jobs.
+    # Jobs are queued and run one at a time, each taking the one-shot arguments above.
+    if argv and argv[0] == 'serve':
+        serve_parser = argparse.ArgumentParser(description="Resident OCR service")
+        serve_parser.add_argument("--idle_timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                                  help="Seconds without jobs before models are unloaded (0 disables)")
+        serve_parser.add_argument("--preload", action="store_true", help="Load models before the first job")
+        serve_args = serve_parser.parse_args(argv[1:])
+        if serve_args.preload:
+            _, load_seconds = get_table_engine()
+            sys.stderr.write(f"OCR models loaded in {load_seconds:.2f}s\n")
+        serve(parser, workers=1, idle_timeout=serve_args.idle_timeout, on_idle=unload_table_engine)
+        return
+
+    args = parser.parse_args(argv)
+    telemetry.run_command(parser.prog, args)
+
 if __name__ == "__main__":
+    # Needed for the --workers pool in PyInstaller builds
+    multiprocessing.freeze_support()
     main()
@@ -4,15 +4,215 @@ import argparse
 import fitz  # PyMuPDF
 import json
 import os
+import re
+import math
+import time
+import base64
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sidecar_server import add_serve_parser
+from disk_cache import DiskCache, default_cache_dir, file_identity, make_key
+from result_cache import add_result_cache_args, result_cache_from_args, run_cached
+import telemetry
+
+# Splits with fewer output files than this run in-process; a pool isn't worth its startup
+PARALLEL_SPLIT_MIN_CHUNKS = 8
+# Merge writes an incremental save and reopens the output after this many pages
+DEFAULT_MERGE_FLUSH_PAGES = 500
+# Streams smaller than this aren't worth hashing for deduplication
+DEDUP_MIN_STREAM_BYTES = 1024
+# Depth limit when hashing an object together with the objects it references
+DEDUP_MAX_DEPTH = 8
+
+# compress: images are downsampled to this resolution unless they are already close to it
+DEFAULT_IMAGE_DPI = 150
+DOWNSAMPLE_THRESHOLD = 1.5  # Only downsample above DEFAULT_IMAGE_DPI * this, like Ghostscript
+DEFAULT_IMAGE_QUALITY = 75
+# Recompressed images must be at least this much smaller than the original stream
+DEFAULT_MIN_SAVING = 0.1
+# Images with smaller streams aren't worth recompressing
+MIN_IMAGE_BYTES = 8 * 1024
+
+# inspect/thumbnail cache; bump PDF_CACHE_VERSION whenever cached entries would change shape
+PDF_CACHE_VERSION = 1
+DEFAULT_PDF_CACHE_MAX_MB = 256
+DEFAULT_THUMBNAIL_SIZE = 256  # Longest edge, in pixels
+
+INDIRECT_REF = re.compile(r'(\d+) 0 R')
+
+def _string_end(text, start):
+    # Index just past the literal or hex string starting at text[start]
+    if text[start] == '<':
+        end = text.find('>', start)
+        return len(text) if end < 0 else end + 1
+    depth = 0
+    i = start
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(text)
+
+def _remap_refs(text, remap):
+    """
+    Rewrites `N 0 R` references in PDF object syntax through `remap`, leaving
+    the contents of string literals alone.
+    """
+    def sub(segment):
+        return INDIRECT_REF.sub(lambda m: f"{remap.get(int(m.group(1)), int(m.group(1)))} 0 R", segment)
+
+    parts = []
+    last = i = 0
+    while i < len(text):
+        if text[i] == '(' or (text[i] == '<' and not text.startswith('<<', i)):
+            end = _string_end(text, i)
+            parts.append(sub(text[last:i]))
+            parts.append(text[i:end])
+            last = i = end
+        elif text.startswith('<<', i):
+            i += 2
+        else:
+            i += 1
+    parts.append(sub(text[last:]))
+    return ''.join(parts)
+
+def _content_key(doc, xref, keys, depth=0, visiting=None):
+    """
+    Hash of an object's definition with every reference replaced by the referenced
+    object's own hash, so identical resources match even when their xref numbers differ
+    (e.g. an image whose /ColorSpace points at a per-document ICC profile).
+    """
+    if xref in keys:
+        return keys[xref]
+    visiting = visiting or set()
+    if depth > DEDUP_MAX_DEPTH or xref in visiting:
+        # Cycles (e.g. /Parent links) and deep chains fall back to the xref number
+        return f"xref:{xref}"
+    visiting.add(xref)
+    definition = INDIRECT_REF.sub(lambda m: _content_key(doc, int(m.group(1)), keys, depth + 1, visiting),
+                                  doc.xref_object(xref, compressed=True))
+    visiting.discard(xref)
+    h = hashlib.sha256(definition.encode('utf-8', 'surrogateescape'))
+    if doc.xref_is_stream(xref):
+        h.update(doc.xref_stream_raw(xref) or b'')
+    keys[xref] = h.hexdigest()
+    return keys[xref]
+
+def dedup_streams(doc, first_xref, seen):
+    """
+    Collapses streams added since `first_xref` onto identical streams already in the
+    output (`seen` maps content key -> canonical xref and persists across flushes).
+    References are rewritten and the duplicates emptied. Returns (streams removed, raw bytes saved).
+    """
+    remap = {}
+    saved = 0
+    keys = {}
+    for xref in range(first_xref, doc.xref_length()):
+        if not doc.xref_is_stream(xref):
+            continue
+        raw_length = len(doc.xref_stream_raw(xref) or b'')
+        if raw_length < DEDUP_MIN_STREAM_BYTES:
+            continue
+        key = _content_key(doc, xref, keys)
+        canonical = seen.setdefault(key, xref)
+        if canonical != xref:
+            remap[xref] = canonical
+            saved += raw_length
+
+    if remap:
+        # New objects can only reference other new objects, so only they need rewriting.
+        # Dictionaries are rewritten key by key: string values are never touched, and
+        # references inside nested arrays/dicts are found outside their string literals.
+        for xref in range(first_xref, doc.xref_length()):
+            if xref in remap:
+                continue
+            keys = doc.xref_get_keys(xref)
+            if not keys:
+                # Bare arrays and other non-dictionary objects
+                definition = doc.xref_object(xref, compressed=True)
+                updated = _remap_refs(definition, remap)
+                if updated != definition:
+                    doc.update_object(xref, updated)
+                continue
+            for key in keys:
+                kind, value = doc.xref_get_key(xref, key)
+                if kind not in ('xref', 'array', 'dict'):
+                    continue
+                updated = _remap_refs(value, remap)
+                if updated != value:
+                    doc.xref_set_key(xref, key, updated)
+        for xref in remap:
+            doc.update_stream(xref, b'')
+            doc.update_object(xref, 'null')
+    return len(remap), saved
+
+def merge_documents(inputs, output_path, flush_pages=DEFAULT_MERGE_FLUSH_PAGES, dedup=True):
+    """
+    Merges `inputs` into `output_path` with bounded memory: after every `flush_pages`
+    pages the output is saved incrementally, closed and reopened, so MuPDF only keeps
+    the objects of the current batch loaded. Returns a stats dict.
+    """
+    start = time.perf_counter()
+    seen = {}
+    stats = {"inputs": len(inputs), "pages": 0, "flushes": 0, "dedup_streams": 0, "dedup_bytes_saved": 0}
+    doc = fitz.open()
+    written = False
+    pending_pages = 0
+
+    def flush():
+        nonlocal written, pending_pages
+        if written:
+            doc.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        else:
+            doc.save(output_path)
+            written = True
+        doc.close()
+        stats["flushes"] += 1
+        pending_pages = 0
+
+    try:
+        with telemetry.stage('insert', inputs=len(inputs)) as counts:
+            for i, pdf_file in enumerate(inputs):
+                first_xref = doc.xref_length()
+                with fitz.open(pdf_file) as sub_doc:
+                    doc.insert_pdf(sub_doc)
+                    stats["pages"] += len(sub_doc)
+                    pending_pages += len(sub_doc)
+                if dedup:
+                    removed, saved = dedup_streams(doc, first_xref, seen)
+                    stats["dedup_streams"] += removed
+                    stats["dedup_bytes_saved"] += saved
+                if pending_pages >= flush_pages and i < len(inputs) - 1:
+                    flush()
+                    doc = fitz.open(output_path)
+            counts.update(pages=stats["pages"], flushes=stats["flushes"], dedup_streams=stats["dedup_streams"])
+        with telemetry.stage('save', pages=pending_pages) as counts:
+            flush()
+            counts["bytes"] = os.path.getsize(output_path)
+    finally:
+        if not doc.is_closed:
+            doc.close()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["pages_per_s"] = round(stats["pages"] / elapsed, 1) if elapsed else None
+    stats["output_bytes"] = os.path.getsize(output_path)
+    return stats
 
 def merge_pdfs(args):
     try:
-        inputs = args.inputs
-        doc = fitz.open()
-        for pdf_file in inputs:
-            with fitz.open(pdf_file) as sub_doc:
-                doc.insert_pdf(sub_doc)
-        doc.save(args.output_path)
+        params = {"flush_pages": args.flush_pages, "dedup": not args.no_dedup}
+        stats = run_cached(result_cache_from_args(args), 'merge', args.inputs, params, args.output_path,
+                           lambda: merge_documents(args.inputs, args.output_path, args.flush_pages, dedup=not args.no_dedup))
+        print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
@@ -37,69 +237,520 @@ def rotate_pdf(args):
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
+def parse_page_ranges(spec, page_count):
+    """
+    Parses a 1-based range spec like "1-3,5,8-" into 0-based inclusive (first, last) tuples.
+    """
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r'(\d*)\s*-\s*(\d*)', part)
+        if match:
+            first = int(match.group(1)) if match.group(1) else 1
+            last = int(match.group(2)) if match.group(2) else page_count
+        else:
+            first = last = int(part)
+        first, last = max(1, first), min(page_count, last)
+        if first > last:
+            raise ValueError(f"Invalid page range '{part}' for a {page_count}-page document")
+        ranges.append((first - 1, last - 1))
+    return ranges
+
+def _safe_filename(title):
+    return re.sub(r'[^\w\- ]+', '', title).strip().replace(' ', '_')[:60] or 'section'
+
+def split_chunks(doc, base_name, every=None, ranges=None, bookmarks=False, bookmark_level=1):
+    """
+    Decides how a document is split. Returns a list of (first, last, file name) with 0-based inclusive pages.
+    Default is one file per page, named as before ({base}_page_{n}.pdf).
+    """
+    page_count = len(doc)
+    if ranges:
+        return [(first, last, f"{base_name}_pages_{first + 1}-{last + 1}.pdf") for first, last in parse_page_ranges(ranges, page_count)]
+
+    if bookmarks:
+        starts = sorted({(page - 1, title) for level, title, page, *_ in doc.get_toc() if level == bookmark_level and page > 0},
+                        key=lambda entry: entry[0])
+        if not starts:
+            raise ValueError(f"No level-{bookmark_level} bookmarks to split on")
+        if starts[0][0] > 0:
+            starts.insert(0, (0, 'front_matter'))
+        chunks = []
+        for i, (first, title) in enumerate(starts):
+            last = starts[i + 1][0] - 1 if i + 1 < len(starts) else page_count - 1
+            if last >= first:
+                chunks.append((first, last, f"{base_name}_{len(chunks) + 1:02d}_{_safe_filename(title)}.pdf"))
+        return chunks
+
+    if every and every > 1:
+        return [(first, min(first + every, page_count) - 1, f"{base_name}_pages_{first + 1}-{min(first + every, page_count)}.pdf")
+                for first in range(0, page_count, every)]
+
+    return [(i, i, f"{base_name}_page_{i+1}.pdf") for i in range(page_count)]
+
+# Source document of a split/compress pool worker, opened once per process
+_pool_source = None
+
+def _open_pool_source(input_path, stream=None):
+    global _pool_source
+    _pool_source = fitz.open('pdf', stream) if stream is not None else fitz.open(input_path)
+
+def _write_chunk(first, last, out_path, source=None):
+    """
+    Copies pages [first, last] into a new file. garbage=3 drops unreferenced objects
+    and merges duplicates, so each output keeps only the fonts/images its pages use.
+    """
+    new_doc = fitz.open()
+    new_doc.insert_pdf(source or _pool_source, from_page=first, to_page=last)
+    new_doc.save(out_path, garbage=3, deflate=True)
+    new_doc.close()
+    return out_path
+
 def split_pdf(args):
     try:
-        doc = fitz.open(args.input_path)
         if not os.path.exists(args.output_dir):
             os.makedirs(args.output_dir)
-        
+
         base_name = os.path.splitext(os.path.basename(args.input_path))[0]
-        created_files = []
+        with telemetry.stage('plan') as counts, fitz.open(args.input_path) as doc:
+            chunks = split_chunks(doc, base_name, args.every, args.ranges, args.bookmarks, args.bookmark_level)
+            counts.update(pages=len(doc), files=len(chunks))
 
-        for i in range(len(doc)):
-            new_doc = fitz.open()
-            new_doc.insert_pdf(doc, from_page=i, to_page=i)
-            out_name = f"{base_name}_page_{i+1}.pdf"
-            out_path = os.path.join(args.output_dir, out_name)
-            new_doc.save(out_path)
-            created_files.append(out_path)
-            new_doc.close()
-        
-        # Print JSON list of files for the caller to parse
-        print(json.dumps(created_files))
+        def report(index, out_path):
+            # One JSON line per created file, printed as soon as it is written
+            first, last, _ = chunks[index]
+            print(json.dumps({"index": index, "path": out_path, "pages": [first + 1, last + 1]}), flush=True)
+
+        workers = min(args.workers or os.cpu_count() or 1, len(chunks))
+        if workers < 2 or len(chunks) < PARALLEL_SPLIT_MIN_CHUNKS:
+            workers = 1
+        with telemetry.stage('write', files=len(chunks), workers=workers):
+            if workers == 1:
+                with fitz.open(args.input_path) as doc:
+                    for index, (first, last, name) in enumerate(chunks):
+                        report(index, _write_chunk(first, last, os.path.join(args.output_dir, name), doc))
+            else:
+                # Spawn, not fork: in serve mode this runs on a worker thread while others may hold MuPDF/stdout locks
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_open_pool_source, initargs=(args.input_path,)) as pool:
+                    futures = {pool.submit(_write_chunk, first, last, os.path.join(args.output_dir, name)): index
+                               for index, (first, last, name) in enumerate(chunks)}
+                    for future in as_completed(futures):
+                        report(futures[future], future.result())
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
 def extract_pages(args):
     try:
-        doc = fitz.open(args.input_path)
-        new_doc = fitz.open()
-        
         # pages arg is a comma-separated string of INDICES (0-based) because helper handles parsing?
         # Or ranges? The frontend helper parses to an array of indices.
         # We'll receive a JSON string of indices or comma separated numbers.
         # Let's assume generic "1,2,5" string
         indices = [int(x) for x in args.pages.split(',')]
-        
-        for idx in indices:
-            if 0 <= idx < len(doc):
-                new_doc.insert_pdf(doc, from_page=idx, to_page=idx)
-        
-        new_doc.save(args.output_path)
+
+        def produce():
+            doc = fitz.open(args.input_path)
+            new_doc = fitz.open()
+            for idx in indices:
+                if 0 <= idx < len(doc):
+                    new_doc.insert_pdf(doc, from_page=idx, to_page=idx)
+            new_doc.save(args.output_path)
+
+        stats = run_cached(result_cache_from_args(args), 'extract', [args.input_path], {"pages": indices},
+                           args.output_path, produce)
+        if stats:
+            print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
+# Shared across requests in server mode so hit counters accumulate
+_pdf_caches = {}
+
+def get_pdf_cache(cache_dir=None, max_mb=DEFAULT_PDF_CACHE_MAX_MB):
+    directory = cache_dir or default_cache_dir('pdf')
+    cache = _pdf_caches.get(directory)
+    if cache is None:
+        cache = _pdf_caches[directory] = DiskCache(directory, max_mb * 1024 * 1024)
+    return cache
+
+def _page_has_text(page):
+    # Content streams without a BT operator can't draw text; skip the extraction for those
+    if b'BT' not in page.read_contents() and not page.get_xobjects():
+        return False
+    return bool(page.get_text('text').strip())
+
+def inspect_document(path, cache=None):
+    """
+    Page count, page sizes, rotation, encryption status and per-page text presence.
+    Cached on (path, size, mtime) when `cache` is given.
+    """
+    key = make_key('inspect', str(PDF_CACHE_VERSION), *file_identity(path))
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return json.loads(data)
+
+    with fitz.open(path) as doc:
+        info = {
+            "page_count": len(doc),
+            "encrypted": doc.is_encrypted,
+            "needs_pass": bool(doc.needs_pass),
+            "metadata": doc.metadata if not doc.needs_pass else None,
+            "pages": [],
+        }
+        if not doc.needs_pass:
+            for page in doc:
+                info["pages"].append({
+                    "width": round(page.rect.width, 2),
+                    "height": round(page.rect.height, 2),
+                    "rotation": page.rotation,
+                    "has_text": _page_has_text(page),
+                })
+
+    if cache is not None:
+        cache.put(key, json.dumps(info).encode('utf-8'))
+    return info
+
+def count_pages(path, cache=None):
+    """
+    Page count alone, cached on its own or read from a cached inspect_document
+    result. On a miss the document is only opened, without inspect's per-page
+    text check.
+    """
+    identity = file_identity(path)
+    key = make_key('page_count', str(PDF_CACHE_VERSION), *identity)
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return int(data)
+        info = cache.get(make_key('inspect', str(PDF_CACHE_VERSION), *identity))
+        if info is not None:
+            return json.loads(info)["page_count"]
+
+    with fitz.open(path) as doc:
+        count = len(doc)
+    if cache is not None:
+        cache.put(key, str(count).encode('ascii'))
+    return count
+
+def render_thumbnails(path, pages, size=DEFAULT_THUMBNAIL_SIZE, fmt='png', cache=None):
+    """
+    Yields (page number, image bytes) for 1-based `pages`, rendered so the longest
+    edge is `size` pixels. Rendered thumbnails are cached per page and size.
+    """
+    identity = file_identity(path)
+    doc = None
+    try:
+        for number in pages:
+            key = make_key('thumbnail', str(PDF_CACHE_VERSION), *identity, str(number), str(size), fmt)
+            data = cache.get(key) if cache is not None else None
+            if data is None:
+                if doc is None:
+                    doc = fitz.open(path)
+                    if doc.needs_pass:
+                        raise ValueError("Document is password protected")
+                page = doc[number - 1]
+                zoom = size / max(page.rect.width, page.rect.height)
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                data = pix.tobytes(fmt)
+                if cache is not None:
+                    cache.put(key, data)
+            yield number, data
+    finally:
+        if doc is not None:
+            doc.close()
+
+def _cache_from_args(args):
+    return None if args.no_cache else get_pdf_cache(args.cache_dir, args.cache_max_mb)
+
 def get_page_count(args):
     try:
-        doc = fitz.open(args.input_path)
-        print(len(doc)) # Just print the number
+        print(count_pages(args.input_path, _cache_from_args(args))) # Just print the number
     except Exception as e:
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
-def compress_pdf(args):
+def inspect_pdf(args):
     try:
-        doc = fitz.open(args.input_path)
-        # Try to optimize
+        print(json.dumps(inspect_document(args.input_path, _cache_from_args(args))))
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def thumbnail_pdf(args):
+    try:
+        cache = _cache_from_args(args)
+        count = count_pages(args.input_path, cache)
+        pages = _page_list(args.pages, count) if args.pages else range(count)
+        mime = 'image/jpeg' if args.format == 'jpeg' else 'image/png'
+        # One JSON line per page, as data URLs the renderer can show directly
+        with telemetry.stage('render', pages=len(pages)) as counts:
+            counts["bytes"] = 0
+            for number, data in render_thumbnails(args.input_path, [i + 1 for i in pages], args.size, args.format, cache):
+                counts["bytes"] += len(data)
+                print(json.dumps({"page": number, "data": f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"}), flush=True)
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+def _stream_length(doc, xref):
+    kind, value = doc.xref_get_key(xref, 'Length')
+    if kind == 'int':
+        return int(value)
+    return len(doc.xref_stream_raw(xref) or b'')
+
+def image_candidates(doc):
+    """
+    Images worth recompressing, as {xref: effective DPI or None}. The DPI is the
+    highest resolution the image is displayed at on any page. Images with alpha,
+    masks, Decode arrays or non-8-bit samples are left alone.
+    """
+    candidates = {}
+    for page in doc:
+        for xref, smask, width, height, bpc, *_ in page.get_images(full=True):
+            if smask or bpc != 8 or _stream_length(doc, xref) < MIN_IMAGE_BYTES:
+                continue
+            if any(doc.xref_get_key(xref, key)[0] != 'null' for key in ('Mask', 'ImageMask', 'Decode')):
+                continue
+            dpi = candidates.get(xref)
+            for rect in page.get_image_rects(xref):
+                if rect.width > 0 and rect.height > 0:
+                    shown = max(width / (rect.width / 72), height / (rect.height / 72))
+                    dpi = max(dpi or 0, shown)
+            candidates[xref] = dpi
+    return candidates
+
+def _image_scale(dpi, target_dpi, threshold=DOWNSAMPLE_THRESHOLD):
+    if dpi and dpi > target_dpi * threshold:
+        return target_dpi / dpi
+    return 1.0
+
+def _load_image(doc, xref, scale):
+    from PIL import Image
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    img = Image.frombytes('L' if pix.n == 1 else 'RGB', (pix.width, pix.height), pix.samples)
+    if scale < 1.0:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                         Image.LANCZOS, reducing_gap=3.0)
+    return img
+
+def _recompress_image(xref, scale, quality, min_saving, source=None):
+    """
+    Pool task: decodes one image, downsamples it and encodes it as JPEG.
+    Returns (xref, data, width, height, mode), with data None if the saving is too small.
+    """
+    from media_tools import encode_image
+    doc = source or _pool_source
+    img = _load_image(doc, xref, scale)
+    data = encode_image(img, 'JPEG', quality)
+    if len(data) > _stream_length(doc, xref) * (1 - min_saving):
+        data = None
+    return xref, data, img.width, img.height, img.mode
+
+def _probe_image(xref, scale, source=None):
+    """
+    Pool task: size/quality probe curve of one image at its target resolution.
+    """
+    from media_tools import probe_curve
+    img = _load_image(source or _pool_source, xref, scale)
+    curve, pixel_ratio = probe_curve(img, 'JPEG')
+    return xref, curve, pixel_ratio
+
+def _pool_map(pool, doc, func, jobs):
+    if pool is None:
+        return [func(*job, source=doc) for job in jobs]
+    return [future.result() for future in [pool.submit(func, *job) for job in jobs]]
+
+def recompress_images(doc, pool, candidates, dpi, quality, min_saving, threshold=DOWNSAMPLE_THRESHOLD):
+    """
+    Replaces the candidate images of `doc` in place with their JPEG re-encodes.
+    `pool` workers must have the same document (same xrefs) open as their source.
+    Returns (images replaced, image bytes in the document afterwards).
+    """
+    jobs = [(xref, _image_scale(shown, dpi, threshold), quality, min_saving) for xref, shown in candidates.items()]
+    replaced = 0
+    image_bytes = 0
+    for xref, data, width, height, mode in _pool_map(pool, doc, _recompress_image, jobs):
+        if data is None:
+            image_bytes += _stream_length(doc, xref)
+            continue
+        doc.update_stream(xref, data, compress=False)
+        doc.xref_set_key(xref, 'Filter', '/DCTDecode')
+        doc.xref_set_key(xref, 'DecodeParms', 'null')
+        doc.xref_set_key(xref, 'Width', str(width))
+        doc.xref_set_key(xref, 'Height', str(height))
+        doc.xref_set_key(xref, 'BitsPerComponent', '8')
+        doc.xref_set_key(xref, 'ColorSpace', '/DeviceGray' if mode == 'L' else '/DeviceRGB')
+        replaced += 1
+        image_bytes += len(data)
+    return replaced, image_bytes
+
+def _compress_pass(input_path, pool, candidates, dpi, quality, min_saving, threshold=DOWNSAMPLE_THRESHOLD):
+    """
+    One full compression pass from the original file.
+    Returns (pdf bytes, images replaced, image bytes in the output).
+    """
+    with fitz.open(input_path) as doc:
+        replaced, image_bytes = recompress_images(doc, pool, candidates, dpi, quality, min_saving, threshold)
         try:
             doc.subset_fonts()
         except Exception:
             pass # Continue if subsetting fails
-            
-        doc.save(args.output_path, garbage=4, deflate=True, clean=True)
+        return doc.tobytes(garbage=4, deflate=True, clean=True), replaced, image_bytes
+
+def _search_target_size(run, input_path, pool, candidates, target_size, dpi, quality, min_saving):
+    """
+    Picks image quality (then DPI) so the whole file fits target_size.
+
+    Per-image probe curves predict the recompressed image bytes at each quality. The
+    rest of the file isn't known until a pass has been written (garbage collection and
+    deflate shrink it), so the first pass is a calibration at the quality that would fit
+    if it were empty; every pass then recalibrates the non-image bytes and the image
+    ratio, and the quality is bracketed like media_tools.encode_to_target_size; once a
+    pass fits and one doesn't, the next is interpolated between their sizes. When the
+    encode budget runs out the highest measured quality that fits wins. If
+    MIN_QUALITY is still too big, images are downsampled below the requested DPI.
+
+    Returns (pdf bytes, images replaced, quality, dpi).
+    """
+    # Pillow and the encoder helpers are only loaded by commands that recompress images
+    from media_tools import MIN_QUALITY, MAX_QUALITY, MAX_REFINE_ENCODES, MAX_DOWNSCALE_STEPS, curve_size, ratio_at
+    with fitz.open(input_path) as doc:
+        raw = {xref: _stream_length(doc, xref) for xref in candidates}
+        jobs = [(xref, _image_scale(shown, dpi)) for xref, shown in candidates.items()]
+        curves = {xref: (curve, ratio) for xref, curve, ratio in _pool_map(pool, doc, _probe_image, jobs)}
+
+    def predicted_images(q):
+        total = 0
+        for xref, (curve, pixel_ratio) in curves.items():
+            size = curve_size(curve, q) * pixel_ratio
+            total += size if size <= raw[xref] * (1 - min_saving) else raw[xref]
+        return total
+
+    # Calibration pass: no non-image bytes and probe-accurate images, an optimistic first guess
+    fixed = 0
+    ratios = {MAX_QUALITY: 1.0}
+    measured = {}  # quality -> output bytes
+    best = None  # (quality, dpi, data, replaced) of the highest-quality pass that fits
+    smallest = None  # (image bytes, fixed bytes, quality, dpi, data, replaced) of the lowest-quality pass
+    lo, hi = MIN_QUALITY - 1, MAX_QUALITY + 1
+    while len(measured) < MAX_REFINE_ENCODES and hi - lo > 1:
+        if lo in measured and hi in measured:
+            # Bracketed by two passes: interpolate their sizes (log-linear), rounding towards the one that fits
+            t = math.log(target_size / measured[lo]) / math.log(measured[hi] / measured[lo])
+            q = min(hi - 1, max(lo + 1, lo + int(t * (hi - lo))))
+        else:
+            q = lo + 1
+            for candidate in range(lo + 1, hi):
+                if fixed + predicted_images(candidate) * ratio_at(ratios, candidate) <= target_size:
+                    q = candidate
+                else:
+                    break
+        if q in measured:
+            break
+        data, replaced, image_bytes = run(dpi, q)
+        fixed = len(data) - image_bytes
+        if not measured:
+            ratios.clear()
+        measured[q] = len(data)
+        ratios[q] = image_bytes / max(1, predicted_images(q))
+        if smallest is None or q < smallest[2]:
+            smallest = (image_bytes, fixed, q, dpi, data, replaced)
+        if len(data) <= target_size:
+            best = (q, dpi, data, replaced)
+            lo = q
+        else:
+            hi = q
+
+    if best is None and hi > MIN_QUALITY:
+        data, replaced, image_bytes = run(dpi, MIN_QUALITY)
+        smallest = (image_bytes, len(data) - image_bytes, MIN_QUALITY, dpi, data, replaced)
+        if len(data) <= target_size:
+            best = (MIN_QUALITY, dpi, data, replaced)
+
+    if best is None:
+        # Downsample every image below the requested DPI; encoded size scales roughly with pixel count
+        reference = max([shown for shown in candidates.values() if shown] or [dpi])
+        step_dpi = min(dpi, reference)
+        for _ in range(MAX_DOWNSCALE_STEPS):
+            image_bytes, fixed = smallest[0], smallest[1]
+            budget = target_size - fixed
+            if budget <= 0 or not image_bytes:
+                break
+            step_dpi *= math.sqrt(budget / image_bytes) * 0.95
+            data, replaced, image_bytes = run(step_dpi, quality, threshold=1.0)
+            smallest = (image_bytes, len(data) - image_bytes, quality, step_dpi, data, replaced)
+            if len(data) <= target_size:
+                best = (quality, step_dpi, data, replaced)
+                break
+
+    if best is None:
+        best = smallest[2:]
+    q, used_dpi, data, replaced = best
+    return data, replaced, q, round(used_dpi, 1)
+
+def compress_document(input_path, output_path, dpi=DEFAULT_IMAGE_DPI, quality=DEFAULT_IMAGE_QUALITY,
+                      min_saving=DEFAULT_MIN_SAVING, target_size=None, workers=None):
+    """
+    Downsamples and recompresses embedded images to JPEG (decoding and encoding run
+    in a process pool whose workers open the input once), subsets fonts and
+    garbage-collects. With target_size the quality/DPI are searched. Returns stats.
+    """
+    start = time.perf_counter()
+    with telemetry.stage('scan') as counts, fitz.open(input_path) as doc:
+        candidates = image_candidates(doc)
+        counts.update(pages=len(doc), images=len(candidates))
+    stats = {"images": len(candidates), "input_bytes": os.path.getsize(input_path), "passes": 0}
+
+    workers = min(workers or os.cpu_count() or 1, len(candidates))
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_open_pool_source, initargs=(input_path,))
+    try:
+        def run(pass_dpi, pass_quality, threshold=DOWNSAMPLE_THRESHOLD):
+            stats["passes"] += 1
+            return _compress_pass(input_path, pool, candidates, pass_dpi, pass_quality, min_saving, threshold)
+
+        with telemetry.stage('recompress', workers=max(workers, 1)) as counts:
+            if target_size and candidates:
+                data, replaced, quality, dpi = _search_target_size(run, input_path, pool, candidates, target_size,
+                                                                   dpi, quality, min_saving)
+            else:
+                data, replaced, _ = run(dpi, quality)
+            counts.update(passes=stats["passes"], images_recompressed=replaced, bytes=len(data))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    stats.update({
+        "images_recompressed": replaced,
+        "quality": quality,
+        "dpi": dpi,
+        "output_bytes": len(data),
+        "fits": len(data) <= target_size if target_size else None,
+        "seconds": round(time.perf_counter() - start, 3),
+    })
+    return stats
+
+def compress_pdf(args):
+    try:
+        params = {"dpi": args.dpi, "quality": args.quality, "min_saving": args.min_saving, "target_size": args.target_size}
+        stats = run_cached(result_cache_from_args(args), 'compress', [args.input_path], params, args.output_path,
+                           lambda: compress_document(args.input_path, args.output_path, args.dpi, args.quality,
+                                                     args.min_saving, args.target_size, args.workers))
+        print(f"STATS: {json.dumps(stats)}")
         print("SUCCESS")
     except Exception as e:
         print(f"ERROR: {str(e)}")
@@ -117,8 +768,173 @@ def decrypt_pdf(args):
         print(f"ERROR: {str(e)}")
         sys.exit(1)
 
+def _page_list(pages, page_count):
+    """
+    0-based page list from a 1-based range spec ("3,1-2") or a list of 1-based numbers; keeps order and repeats.
+    """
+    if isinstance(pages, list):
+        pages = ','.join(str(p) for p in pages)
+    return [i for first, last in parse_page_ranges(str(pages), page_count) for i in range(first, last + 1)]
 
-if __name__ == "__main__":
+def _op_select(doc, step, state):
+    doc.select(_page_list(step['pages'], len(doc)))
+
+def _op_rotate(doc, step, state):
+    # Relative, like rotate_pdf
+    pages = _page_list(step['pages'], len(doc)) if 'pages' in step else range(len(doc))
+    for index in sorted(set(pages)):
+        page = doc[index]
+        page.set_rotation((page.rotation + int(step['degrees'])) % 360)
+
+def _op_merge(doc, step, state):
+    # Inserts before 1-based page `at`, or appends
+    position = int(step['at']) - 1 if 'at' in step else -1
+    for pdf_file in step['inputs']:
+        with fitz.open(pdf_file) as sub_doc:
+            doc.insert_pdf(sub_doc, start_at=position)
+            if position >= 0:
+                position += len(sub_doc)
+
+def _op_decrypt(doc, step, state):
+    state['decrypt'] = True
+
+def _op_compress(doc, step, state):
+    state['compress'] = True
+    candidates = image_candidates(doc)
+    workers = min(step.get('workers') or os.cpu_count() or 1, len(candidates))
+    pool = None
+    if workers > 1:
+        # Workers see the current in-memory document, so xrefs line up
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_open_pool_source, initargs=(None, doc.tobytes()))
+    try:
+        replaced, _ = recompress_images(doc, pool, candidates, step.get('dpi', DEFAULT_IMAGE_DPI),
+                                        step.get('quality', DEFAULT_IMAGE_QUALITY), step.get('min_saving', DEFAULT_MIN_SAVING))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    state['images_recompressed'] = state.get('images_recompressed', 0) + replaced
+    try:
+        doc.subset_fonts()
+    except Exception:
+        pass # Continue if subsetting fails
+
+PIPELINE_OPS = {
+    'select': _op_select,
+    'rotate': _op_rotate,
+    'merge': _op_merge,
+    'decrypt': _op_decrypt,
+    'compress': _op_compress,
+}
+
+# Keys each op can't run without
+PIPELINE_REQUIRED_KEYS = {
+    'select': ('pages',),
+    'rotate': ('degrees',),
+    'merge': ('inputs',),
+}
+
+def validate_steps(steps):
+    """
+    Checks a pipeline up front, so a bad step fails before any work is done.
+    Raises ValueError naming the (1-based) step.
+    """
+    if not isinstance(steps, list):
+        raise ValueError("Pipeline steps must be a JSON list")
+    for number, step in enumerate(steps, 1):
+        if not isinstance(step, dict):
+            raise ValueError(f"Step {number}: expected an object with an \"op\" key, got {json.dumps(step)}")
+        op = step.get('op')
+        if op not in PIPELINE_OPS:
+            raise ValueError(f"Step {number}: unknown op {json.dumps(op)} (expected one of {', '.join(PIPELINE_OPS)})")
+        missing = [key for key in PIPELINE_REQUIRED_KEYS.get(op, ()) if key not in step]
+        if missing:
+            raise ValueError(f"Step {number} ({op}): missing {', '.join(repr(key) for key in missing)}")
+        if op == 'rotate':
+            try:
+                degrees = int(step['degrees'])
+            except (TypeError, ValueError):
+                degrees = None
+            if degrees is None or degrees % 90:
+                raise ValueError(f"Step {number} (rotate): degrees must be a multiple of 90, got {json.dumps(step['degrees'])}")
+        if op == 'merge' and (not isinstance(step['inputs'], list) or not step['inputs']):
+            raise ValueError(f"Step {number} (merge): inputs must be a non-empty list of PDF paths")
+
+def run_pipeline(input_path, output_path, steps):
+    """
+    Applies `steps` (dicts with an "op" key, see PIPELINE_OPS) in order to one
+    in-memory document and saves once. Without input_path the document starts empty,
+    so a pipeline can begin with a merge. Returns stats.
+    """
+    start = time.perf_counter()
+    validate_steps(steps)
+
+    doc = fitz.open(input_path) if input_path else fitz.open()
+    try:
+        if doc.needs_pass:
+            password = next((step.get('password') for step in steps if step['op'] == 'decrypt'), None)
+            if password is None or not doc.authenticate(password):
+                raise ValueError("Document is password protected; add a decrypt step with the password")
+        state = {}
+        for step in steps:
+            PIPELINE_OPS[step['op']](doc, step, state)
+
+        encryption = fitz.PDF_ENCRYPT_NONE if state.get('decrypt') else fitz.PDF_ENCRYPT_KEEP
+        if state.get('compress'):
+            doc.save(output_path, garbage=4, deflate=True, clean=True, encryption=encryption)
+        else:
+            doc.save(output_path, garbage=1, encryption=encryption)
+        pages = len(doc)
+    finally:
+        doc.close()
+    return {
+        "steps": len(steps),
+        "pages": pages,
+        "images_recompressed": state.get('images_recompressed', 0),
+        "output_bytes": os.path.getsize(output_path),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+def _pipeline_cache_inputs(input_path, steps):
+    """
+    (input paths, normalized params) identifying a pipeline's result, or None if it must not be cached:
+    decrypted output is never written to the cache.
+    """
+    if any(step.get('op') == 'decrypt' for step in steps):
+        return None
+    paths = [input_path] if input_path else []
+    normalized = []
+    for step in steps:
+        step = {key: value for key, value in step.items() if key != 'workers'}
+        if step.get('op') == 'merge':
+            # Merged files are identified by content, through the input hashes
+            paths.extend(step.get('inputs', []))
+            step['inputs'] = len(step.get('inputs', []))
+        normalized.append(step)
+    return paths, {"has_input": bool(input_path), "steps": normalized}
+
+def pipeline_pdf(args):
+    try:
+        if args.steps_file:
+            with open(args.steps_file, 'r', encoding='utf-8') as f:
+                steps = json.load(f)
+        else:
+            steps = json.loads(args.steps)
+        validate_steps(steps)
+        cache_inputs = _pipeline_cache_inputs(args.input_path, steps)
+        if cache_inputs is None:
+            stats = run_pipeline(args.input_path, args.output_path, steps)
+        else:
+            stats = run_cached(result_cache_from_args(args), 'pipeline', *cache_inputs, args.output_path,
+                               lambda: run_pipeline(args.input_path, args.output_path, steps))
+        print(f"STATS: {json.dumps(stats)}")
+        print("SUCCESS")
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        sys.exit(1)
+
+
+def build_parser():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(dest='command')
 
@@ -126,6 +942,9 @@ if __name__ == "__main__":
     p_merge = subparsers.add_parser('merge')
     p_merge.add_argument('--inputs', nargs='+', required=True)
     p_merge.add_argument('--output_path', required=True)
+    p_merge.add_argument('--flush_pages', type=int, default=DEFAULT_MERGE_FLUSH_PAGES) # Incremental save interval
+    p_merge.add_argument('--no_dedup', action='store_true') # Keep identical streams from different inputs
+    add_result_cache_args(p_merge)
     p_merge.set_defaults(func=merge_pdfs)
 
     # Rotate
@@ -138,6 +957,11 @@ if __name__ == "__main__":
     p_split = subparsers.add_parser('split')
     p_split.add_argument('--input_path', required=True)
     p_split.add_argument('--output_dir', required=True)
+    p_split.add_argument('--every', type=int) # Chunks of N pages
+    p_split.add_argument('--ranges') # 1-based ranges, e.g. "1-3,4,10-"
+    p_split.add_argument('--bookmarks', action='store_true') # One file per bookmark at --bookmark_level
+    p_split.add_argument('--bookmark_level', type=int, default=1)
+    p_split.add_argument('--workers', type=int) # Defaults to the number of cores
     p_split.set_defaults(func=split_pdf)
 
     # Extract
@@ -145,17 +969,46 @@ if __name__ == "__main__":
     p_extract.add_argument('--input_path', required=True)
     p_extract.add_argument('--pages', required=True) # comma separated indices
     p_extract.add_argument('--output_path', required=True)
+    add_result_cache_args(p_extract)
     p_extract.set_defaults(func=extract_pages)
 
     # Count
     p_count = subparsers.add_parser('count')
     p_count.add_argument('--input_path', required=True)
+    p_count.add_argument('--cache_dir') # Defaults to the per-user cache directory
+    p_count.add_argument('--cache_max_mb', type=int, default=DEFAULT_PDF_CACHE_MAX_MB)
+    p_count.add_argument('--no_cache', action='store_true')
     p_count.set_defaults(func=get_page_count)
 
+    # Inspect: page count, sizes, rotation, encryption, text presence (cached)
+    p_inspect = subparsers.add_parser('inspect')
+    p_inspect.add_argument('--input_path', required=True)
+    p_inspect.add_argument('--cache_dir')
+    p_inspect.add_argument('--cache_max_mb', type=int, default=DEFAULT_PDF_CACHE_MAX_MB)
+    p_inspect.add_argument('--no_cache', action='store_true')
+    p_inspect.set_defaults(func=inspect_pdf)
+
+    # Thumbnails (cached)
+    p_thumbnail = subparsers.add_parser('thumbnail')
+    p_thumbnail.add_argument('--input_path', required=True)
+    p_thumbnail.add_argument('--pages') # 1-based ranges, e.g. "1-12"; default all pages
+    p_thumbnail.add_argument('--size', type=int, default=DEFAULT_THUMBNAIL_SIZE) # Longest edge in pixels
+    p_thumbnail.add_argument('--format', choices=['png', 'jpeg'], default='png')
+    p_thumbnail.add_argument('--cache_dir')
+    p_thumbnail.add_argument('--cache_max_mb', type=int, default=DEFAULT_PDF_CACHE_MAX_MB)
+    p_thumbnail.add_argument('--no_cache', action='store_true')
+    p_thumbnail.set_defaults(func=thumbnail_pdf)
+
     # Compress
     p_compress = subparsers.add_parser('compress')
     p_compress.add_argument('--input_path', required=True)
     p_compress.add_argument('--output_path', required=True)
+    p_compress.add_argument('--dpi', type=float, default=DEFAULT_IMAGE_DPI) # Target image resolution
+    p_compress.add_argument('--quality', type=int, default=DEFAULT_IMAGE_QUALITY) # JPEG quality for recompressed images
+    p_compress.add_argument('--min_saving', type=float, default=DEFAULT_MIN_SAVING) # Keep images that shrink less than this fraction
+    p_compress.add_argument('--target_size', type=int) # Target output size in bytes; searches quality, then DPI
+    p_compress.add_argument('--workers', type=int) # Defaults to the number of cores
+    add_result_cache_args(p_compress)
     p_compress.set_defaults(func=compress_pdf)
     
     # Decrypt
@@ -164,8 +1017,29 @@ if __name__ == "__main__":
     p_decrypt.add_argument('--output_path', required=True)
     p_decrypt.set_defaults(func=decrypt_pdf)
 
-    args = parser.parse_args()
+    # Pipeline: several operations on one in-memory document, one save
+    p_pipeline = subparsers.add_parser('pipeline')
+    p_pipeline.add_argument('--input_path') # Optional; start empty and merge instead
+    p_pipeline.add_argument('--output_path', required=True)
+    steps_source = p_pipeline.add_mutually_exclusive_group(required=True)
+    steps_source.add_argument('--steps') # JSON list, e.g. [{"op": "select", "pages": "3,1-2"}, {"op": "rotate", "degrees": 90}]
+    steps_source.add_argument('--steps_file') # Same, read from a file
+    add_result_cache_args(p_pipeline)
+    p_pipeline.set_defaults(func=pipeline_pdf)
+
+    # Server mode: MuPDF is not thread-safe, so requests run one at a time
+    add_serve_parser(subparsers, parser, default_workers=1)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
     if hasattr(args, 'func'):
-        args.func(args)
+        telemetry.run_command(parser.prog, args)
     else:
         parser.print_help()
+
+if __name__ == "__main__":
+    # Needed for the split process pool in PyInstaller builds
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,108 @@
+"""
+py7zr callback and I/O adapters used by archive_tools.
+
+They subclass py7zr types, so they live apart from archive_tools: py7zr is then
+only imported by commands that actually read or write a 7z archive.
+"""
+import queue
+import py7zr.callbacks
+import py7zr.io
+
+# Chunks buffered between py7zr's decoder threads and the archive writer during convert
+PIPE_MAX_CHUNKS = 16
+
+
+class QueueExtractCallback(py7zr.callbacks.ExtractCallback):
+    # py7zr calls this from its own decoder threads
+    def __init__(self, events):
+        self.events = events
+
+    def report_start_preparation(self):
+        pass
+
+    def report_start(self, processing_file_path, processing_bytes):
+        pass
+
+    def report_update(self, decompressed_bytes):
+        pass
+
+    def report_end(self, processing_file_path, wrote_bytes):
+        self.events.put((processing_file_path, int(wrote_bytes)))
+
+    def report_warning(self, message):
+        pass
+
+    def report_postprocess(self):
+        pass
+
+
+class Pipe(py7zr.io.Py7zIO):
+    """
+    Bounded hand-off of one member's bytes from a py7zr decoder thread to the reader.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._chunks = queue.Queue(maxsize=PIPE_MAX_CHUNKS)
+        self._pending = b''
+        self._eof = False
+        self._size = 0
+        self.aborted = False
+
+    # Writer side (decoder thread)
+    def write(self, s):
+        if not self.aborted:
+            self._chunks.put(bytes(s))
+        self._size += len(s)
+        return len(s)
+
+    def close(self):
+        if not self.aborted:
+            self._chunks.put(None)
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return self._size
+
+    # Reader side
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._pending) < size):
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._pending += chunk
+        if size is None or size < 0:
+            data, self._pending = self._pending, b''
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def abort(self):
+        # Unblocks the decoder thread if the reader stops early
+        self.aborted = True
+        while not self._chunks.empty():
+            self._chunks.get_nowait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class PipeFactory(py7zr.io.WriterFactory):
+    def __init__(self):
+        self.pipes = queue.Queue()
+        self.created = []
+
+    def create(self, filename):
+        pipe = Pipe(filename)
+        self.created.append(pipe)
+        self.pipes.put(pipe)
+        return pipe
@@ -0,0 +1,151 @@
+"""
+Content-addressed cache of conversion outputs, shared by all sidecar tools.
+
+A result is keyed on the SHA-256 of every input's bytes, the operation name and
+its normalized parameters, so repeating an operation on the same content skips
+the work whatever the file is called. Outputs live in a DiskCache (LRU within a
+byte budget) and are served by reflink where the filesystem supports it, else
+by copy; never by hardlink, so editing a served output can't change the entry.
+Served outputs are ordinary writable files.
+"""
+import os
+import json
+import hashlib
+import threading
+from disk_cache import DiskCache, clone_file, default_cache_dir, file_identity, make_key, make_writable
+
+# Bump whenever a tool's output for the same inputs and parameters changes
+RESULT_CACHE_VERSION = 1
+DEFAULT_RESULT_CACHE_MAX_MB = 2048
+# Inputs are hashed in chunks of this size, never read whole
+HASH_CHUNK_BYTES = 1024 * 1024
+# Outputs larger than this fraction of the budget aren't stored: copying and hashing
+# one would only evict most of the cache to make room for a single entry
+MAX_ENTRY_FRACTION = 0.25
+
+# Digest per (path, size, mtime), so serve mode hashes an unchanged input once
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def hash_file(path):
+    identity = file_identity(path)
+    with _digests_lock:
+        digest = _digests.get(identity)
+    if digest is not None:
+        return digest
+    h = hashlib.sha256()
+    buf = bytearray(HASH_CHUNK_BYTES)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    digest = h.hexdigest()
+    with _digests_lock:
+        _digests[identity] = digest
+    return digest
+
+
+class ResultCache:
+    def __init__(self, directory, max_bytes):
+        self.entries = DiskCache(directory, max_bytes)
+        self.bytes_saved = 0
+        self.served_by = {"reflink": 0, "copy": 0}
+        self._lock = threading.Lock()
+
+    def key(self, operation, input_paths, params):
+        return make_key('result', str(RESULT_CACHE_VERSION), operation,
+                        json.dumps(params, sort_keys=True, separators=(',', ':')),
+                        *[hash_file(path) for path in input_paths])
+
+    def fetch(self, key, output_path):
+        """
+        Places the cached output for `key` at output_path. Returns the method used, or None on a miss.
+        """
+        entry = self.entries.path_for(key)
+        if entry is None:
+            return None
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        # Clone next to the output, then swap it in, so an existing output is replaced atomically
+        tmp_path = os.path.join(output_dir, f".convertgg-{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            method = clone_file(entry, tmp_path)
+            # clonefile keeps the entry's read-only mode
+            make_writable(tmp_path)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.bytes_saved += os.path.getsize(output_path)
+            self.served_by[method] += 1
+        return method
+
+    def store(self, key, output_path):
+        """
+        Copies output_path into the cache. Returns False, storing nothing, if it is too large.
+        """
+        if os.path.getsize(output_path) > self.entries.max_bytes * MAX_ENTRY_FRACTION:
+            return False
+        self.entries.put_file(key, output_path)
+        return True
+
+    def stats(self):
+        stats = self.entries.stats()
+        stats.pop("bytes_read")
+        with self._lock:
+            stats["bytes_saved"] = self.bytes_saved
+            stats["served"] = dict(self.served_by)
+        return stats
+
+
+# Shared across requests in server mode so counters accumulate
+_result_caches = {}
+_result_caches_lock = threading.Lock()
+
+
+def get_result_cache(cache_dir=None, max_mb=DEFAULT_RESULT_CACHE_MAX_MB):
+    directory = cache_dir or default_cache_dir('results')
+    with _result_caches_lock:
+        cache = _result_caches.get(directory)
+        if cache is None:
+            cache = _result_caches[directory] = ResultCache(directory, max_mb * 1024 * 1024)
+    return cache
+
+
+def run_cached(cache, operation, input_paths, params, output_path, produce):
+    """
+    Serves output_path from `cache`, or runs produce() (which writes output_path
+    and may return a stats dict) and stores the result. With cache None it just runs produce().
+    Returns produce()'s stats, or on a hit {"cache": "hit", ...counters}.
+    """
+    if cache is None:
+        return produce()
+    key = cache.key(operation, input_paths, params)
+    method = cache.fetch(key, output_path)
+    if method is not None:
+        return {"cache": "hit", "served_by": method, **cache.stats()}
+    stats = produce()
+    if os.path.isfile(output_path):
+        cache.store(key, output_path)
+    return stats
+
+
+def add_result_cache_args(parser):
+    """
+    Registers the shared result cache options on a subcommand's parser.
+    """
+    parser.add_argument('--no_result_cache', action='store_true') # Always recompute, and don't store the output
+    parser.add_argument('--result_cache_dir') # Defaults to the per-user cache directory
+    parser.add_argument('--result_cache_max_mb', type=int, default=DEFAULT_RESULT_CACHE_MAX_MB)
+
+
+def result_cache_from_args(args):
+    if args.no_result_cache:
+        return None
+    return get_result_cache(args.result_cache_dir, args.result_cache_max_mb)
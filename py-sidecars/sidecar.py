@@ -0,0 +1,34 @@
+"""
+Single entry point for every sidecar tool, so the app ships one binary:
+
+    sidecar pdf_tools merge --inputs a.pdf b.pdf --output_path out.pdf
+    sidecar archive_tools serve
+
+The first argument names the tool and the rest is that tool's own command line.
+Only the named tool's module is imported, and the tools themselves import heavy
+dependencies (PyMuPDF, numpy, py7zr, paddleocr...) inside the subcommands that use them.
+"""
+import sys
+import importlib
+
+TOOLS = ('archive_tools', 'doc_tools', 'job_scheduler', 'media_tools', 'ocr_engine', 'pdf_tools')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    tool = argv[0].removesuffix('.py') if argv else None
+    if tool not in TOOLS:
+        print(f"ERROR: Usage: sidecar {{{','.join(TOOLS)}}} [arguments...]")
+        sys.exit(2)
+    module = importlib.import_module(tool)
+    # argparse usage lines should name the tool, not the dispatcher
+    sys.argv = [tool, *argv[1:]]
+    module.main(argv[1:])
+
+
+if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # Process pools in any tool re-enter through this binary in PyInstaller builds
+        import multiprocessing
+        multiprocessing.freeze_support()
+    main()
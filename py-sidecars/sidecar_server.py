@@ -0,0 +1,221 @@
+"""
+Long-lived server mode shared by the sidecar scripts.
+
+Instead of spawning one interpreter per operation, the Electron side can start a
+sidecar once with the `serve` subcommand and feed it newline-delimited JSON
+requests on stdin. Each request carries the same argv the one-shot CLI takes:
+
+    -> {"id": 1, "argv": ["compress", "--input_path", "a.pdf", "--output_path", "b.pdf"]}
+    <- {"id": 1, "ok": true, "output": "SUCCESS"}
+
+Lines a request prints with flush=True (per-file results, extract progress,
+thumbnails) are sent as soon as they are flushed, as interim messages, and are
+not repeated in the final output; a request's full output is its progress
+lines followed by `output`:
+
+    <- {"id": 1, "progress": "{\"page\": 1, \"data\": \"data:image/png;base64,...\"}"}
+
+Requests are parsed with the script's own argparse parser, so every subcommand
+behaves exactly as it does in one-shot mode. Several requests may be in flight
+at once; responses are tagged with the request id and can arrive out of order.
+The server exits once stdin is closed and all in-flight requests have finished.
+
+Servers that hold expensive state (e.g. loaded OCR models) can pass an
+`idle_timeout` and `on_idle` callback to release it when nothing has been
+requested for a while; the state is expected to be rebuilt lazily on demand.
+"""
+import sys
+import io
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import telemetry
+
+
+class _ThreadLocalStdout(io.TextIOBase):
+    """
+    Stand-in for sys.stdout that routes print() output from a request's worker
+    thread into that request's buffer. Stray writes from anywhere else go to
+    stderr so they can never corrupt the protocol stream.
+    """
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def begin_capture(self, on_line=None):
+        self._local.buffer = io.StringIO()
+        self._local.on_line = on_line
+
+    def end_capture(self):
+        buf = self._local.buffer
+        self._local.buffer = None
+        self._local.on_line = None
+        return buf.getvalue()
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None:
+            return self._fallback.write(s)
+        return buf.write(s)
+
+    def flush(self):
+        buf = getattr(self._local, 'buffer', None)
+        on_line = getattr(self._local, 'on_line', None)
+        if buf is None or on_line is None:
+            self._fallback.flush()
+            return
+        # Hand complete lines to the request's callback; a partial line waits for the next flush
+        text = buf.getvalue()
+        end = text.rfind('\n')
+        if end < 0:
+            return
+        buf.seek(0)
+        buf.truncate()
+        buf.write(text[end + 1:])
+        for line in text[:end].split('\n'):
+            if line.strip():
+                on_line(line)
+
+
+def _run_request(parser, argv, stdout_proxy, on_line=None):
+    """
+    Runs one CLI invocation in-process and returns (ok, output).
+    The sidecar functions report failure by printing and calling sys.exit(1),
+    so SystemExit is the normal error path here. Flushed lines go to on_line
+    as they are printed and are left out of the returned output.
+    """
+    stdout_proxy.begin_capture(on_line)
+    ok = True
+    try:
+        args = parser.parse_args(argv)
+        if getattr(args, 'command', None) == 'serve':
+            print("ERROR: Cannot start a server from inside a server")
+            ok = False
+        elif hasattr(args, 'func'):
+            telemetry.run_command(parser.prog, args)
+        else:
+            print("ERROR: No command given")
+            ok = False
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        ok = False
+    finally:
+        output = stdout_proxy.end_capture()
+    return ok, output.strip()
+
+
+class _IdleWatcher:
+    """
+    Calls `on_idle` once after `timeout` seconds without in-flight requests.
+    It fires again only after new requests have come and gone.
+    """
+
+    def __init__(self, timeout, on_idle):
+        self._timeout = timeout
+        self._on_idle = on_idle
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._last_active = time.monotonic()
+        self._idle_fired = False
+        self._stopped = threading.Event()
+        thread = threading.Thread(target=self._watch, daemon=True)
+        thread.start()
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+            self._idle_fired = False
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._last_active = time.monotonic()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self):
+        interval = min(1.0, self._timeout / 2)
+        while not self._stopped.wait(interval):
+            with self._lock:
+                idle_for = time.monotonic() - self._last_active
+                if self._in_flight or self._idle_fired or idle_for < self._timeout:
+                    continue
+                self._idle_fired = True
+                try:
+                    self._on_idle()
+                except Exception as e:
+                    sys.stderr.write(f"on_idle failed: {str(e)}\n")
+
+
+def serve(parser, workers=1, idle_timeout=None, on_idle=None):
+    """
+    Reads requests from stdin until EOF, running up to `workers` of them
+    concurrently, and writes one JSON response line per request to stdout.
+    If `idle_timeout` (seconds) and `on_idle` are given, `on_idle` is called
+    whenever the server has been idle for that long.
+    """
+    protocol_in = sys.stdin
+    protocol_out = sys.stdout
+    write_lock = threading.Lock()
+    stdout_proxy = _ThreadLocalStdout(sys.stderr)
+    sys.stdout = stdout_proxy
+    # Requests must not read the protocol stream (e.g. a `--manifest -` argument)
+    sys.stdin = io.StringIO()
+    watcher = _IdleWatcher(idle_timeout, on_idle) if (idle_timeout and on_idle) else None
+
+    def respond(payload):
+        line = json.dumps(payload)
+        with write_lock:
+            protocol_out.write(line + "\n")
+            protocol_out.flush()
+
+    def handle(request_id, argv):
+        try:
+            ok, output = _run_request(parser, argv, stdout_proxy,
+                                      lambda line: respond({"id": request_id, "progress": line}))
+        except BaseException as e:
+            ok, output = False, f"ERROR: {str(e)}"
+        finally:
+            if watcher:
+                watcher.request_finished()
+        respond({"id": request_id, "ok": ok, "output": output})
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for line in protocol_in:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                    request_id = request["id"]
+                    argv = [str(a) for a in request["argv"]]
+                except (ValueError, KeyError, TypeError) as e:
+                    respond({"id": None, "ok": False, "output": f"ERROR: Malformed request - {str(e)}"})
+                    continue
+                if watcher:
+                    watcher.request_started()
+                pool.submit(handle, request_id, argv)
+    finally:
+        if watcher:
+            watcher.stop()
+        sys.stdout = protocol_out
+        sys.stdin = protocol_in
+
+
+def add_serve_parser(subparsers, parser, default_workers=1):
+    """
+    Registers the `serve` subcommand on a sidecar's argparse parser.
+    """
+    p_serve = subparsers.add_parser('serve')
+    p_serve.add_argument('--workers', type=int, default=default_workers)
+    p_serve.set_defaults(func=lambda args: serve(parser, args.workers))
+    return p_serve
@@ -0,0 +1,149 @@
+"""
+Opt-in timing and memory telemetry for the sidecar tools.
+
+With CONVERTGG_TELEMETRY=1 in the environment, every command prints
+`TELEMETRY: {json}` lines on stdout alongside its usual output: a "stage"
+event as each instrumented stage ends, and an "operation" event when the
+command finishes, successfully or not. Events carry wall and CPU time, the
+peak RSS so far and whatever the stage counted (pages, bytes, encodes...):
+
+    TELEMETRY: {"event": "stage", "tool": "media_tools", "command": "compress_image", "stage": "encode",
+                "ok": true, "wall_ms": 84.2, "cpu_ms": 83.9, "peak_rss_mb": 61.4, "encodes": 3, "bytes": 19874}
+
+The lines follow the STATS: convention and the Electron runner strips them
+before output reaches callers, so SUCCESS checks and last-line parsing are
+unaffected.
+
+With CONVERTGG_PROFILE_DIR=<dir>, each command also runs under cProfile and
+the stats are written to <dir>/<tool>-<command>-<pid>-<n>.prof, announced by
+a "profile" event. Open them with `python -m pstats` or snakeviz.
+
+CPU time is the whole process's, so in serve mode it includes concurrent
+requests, and it never includes pool worker processes. Peak RSS is the
+process's high-water mark, which in serve mode only grows. Stage events are
+only emitted from the thread running the command; stages reached from pool
+workers are silent.
+"""
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+
+ENABLED = os.environ.get('CONVERTGG_TELEMETRY', '') not in ('', '0')
+PROFILE_DIR = os.environ.get('CONVERTGG_PROFILE_DIR') or None
+
+# Command currently running on this thread, as (tool, command)
+_local = threading.local()
+_profile_counter = itertools.count(1)
+
+
+def peak_rss_bytes():
+    """
+    The process's peak resident set size in bytes, or None where it can't be read.
+    """
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                        ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    if sys.platform.startswith('linux'):
+        # ru_maxrss survives exec, so a sidecar started from Electron would report the parent's peak
+        try:
+            with open('/proc/self/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measurements(wall_start, cpu_start):
+    peak = peak_rss_bytes()
+    return {
+        "wall_ms": round((time.perf_counter() - wall_start) * 1000, 1),
+        "cpu_ms": round((time.process_time() - cpu_start) * 1000, 1),
+        "peak_rss_mb": round(peak / (1024 * 1024), 1) if peak is not None else None,
+    }
+
+
+def _emit(event, **fields):
+    tool, command = getattr(_local, 'operation', None) or (None, None)
+    print(f"TELEMETRY: {json.dumps({'event': event, 'tool': tool, 'command': command, **fields})}", flush=True)
+
+
+@contextmanager
+def stage(name, **counts):
+    """
+    Times the block as one stage of the running command. The yielded dict holds
+    the stage's counts; add the ones only known once the block has run.
+    """
+    counts = dict(counts)
+    if not ENABLED or getattr(_local, 'operation', None) is None:
+        yield counts
+        return
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    ok = False
+    try:
+        yield counts
+        ok = True
+    finally:
+        _emit("stage", stage=name, ok=ok, **_measurements(wall_start, cpu_start), **counts)
+
+
+def run_command(tool, args):
+    """
+    Runs a parsed command (`args.func(args)`), inside an operation event and the
+    profiler when they are enabled. Server commands run as they are.
+    """
+    tool = tool.removesuffix('.py')
+    command = getattr(args, 'command', None) or args.func.__name__
+    if not (ENABLED or PROFILE_DIR) or command == 'serve':
+        return args.func(args)
+
+    profiler = None
+    if PROFILE_DIR:
+        import cProfile
+        profiler = cProfile.Profile()
+    _local.operation = (tool, command)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    ok = False
+    try:
+        if profiler is not None:
+            profiler.runcall(args.func, args)
+        else:
+            args.func(args)
+        ok = True
+    except SystemExit as e:
+        # The tools report failure by printing ERROR and exiting
+        ok = e.code in (None, 0)
+        raise
+    finally:
+        if profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{tool}-{command}-{os.getpid()}-{next(_profile_counter)}.prof")
+            profiler.dump_stats(path)
+            _emit("profile", path=path)
+        if ENABLED:
+            _emit("operation", ok=ok, **_measurements(wall_start, cpu_start))
+        _local.operation = None
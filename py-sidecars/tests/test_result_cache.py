@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from result_cache import MAX_ENTRY_FRACTION, ResultCache, run_cached
+
+
+def _producer(path, size):
+    def produce():
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        return {"bytes": size}
+    return produce
+
+
+def test_oversized_output_is_not_stored(tmp_path):
+    budget = 1024 * 1024
+    cache = ResultCache(str(tmp_path / 'cache'), budget)
+    src = tmp_path / 'in.bin'
+    src.write_bytes(b'input')
+
+    small = str(tmp_path / 'small.out')
+    run_cached(cache, 'small', [str(src)], {}, small, _producer(small, 1024))
+    assert run_cached(cache, 'small', [str(src)], {}, small, _producer(small, 1024))["cache"] == "hit"
+
+    big = str(tmp_path / 'big.out')
+    big_size = int(budget * MAX_ENTRY_FRACTION) + 1
+    assert run_cached(cache, 'big', [str(src)], {}, big, _producer(big, big_size)) == {"bytes": big_size}
+    assert os.path.getsize(big) == big_size
+
+    # Not stored, so the next run produces it again...
+    assert cache.fetch(cache.key('big', [str(src)], {}), big) is None
+    # ...and the entry stored before it survives
+    assert run_cached(cache, 'small', [str(src)], {}, small, _producer(small, 1024))["cache"] == "hit"
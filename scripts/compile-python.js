@@ -1,4 +1,3 @@
-
 const fs = require('fs');
 const path = require('path');
 const { execSync } = require('child_process');
@@ -6,17 +5,21 @@ const { execSync } = require('child_process');
 const SIDE_CARS_DIR = path.join(__dirname, '../py-sidecars');
 const DIST_DIR = path.join(__dirname, '../dist-python');
 
-const SCRIPTS = [
-    'archive_tools.py',
-    'doc_tools.py',
-    'media_tools.py',
-    'ocr_engine.py',
-    'pdf_tools.py'
+// All tools are served by one dispatcher (py-sidecars/sidecar.py). It imports
+// them by name at runtime, so PyInstaller has to be told about each one.
+const ENTRY = 'sidecar.py';
+const TOOLS = [
+    'archive_tools',
+    'doc_tools',
+    'job_scheduler',
+    'media_tools',
+    'ocr_engine',
+    'pdf_tools'
 ];
 
-if (!fs.existsSync(DIST_DIR)) {
-    fs.mkdirSync(DIST_DIR);
-}
+// Clear out previous builds (including the old per-tool onefile binaries) so they don't get packaged
+fs.rmSync(DIST_DIR, { recursive: true, force: true });
+fs.mkdirSync(DIST_DIR);
 
 // Ensure PyInstaller is installed (user should run pip install -r requirements.txt)
 // We assume it's in the venv
@@ -27,27 +30,22 @@ const PYINSTALLER_CMD = 'pyinstaller';
 
 console.log('Compiling Python sidecars...');
 
-SCRIPTS.forEach(script => {
-    const scriptPath = path.join(SIDE_CARS_DIR, script);
-    console.log(`Building ${script}...`);
-
-    try {
-        // --onefile: Create a single executable
-        // --distpath: Output directory
-        // --workpath: Temp directory (ignored/deleted usually)
-        // --specpath: Spec file directory (keep out of root)
-        // --clean: Clean cache
-        // --name: Output name (strip .py)
-        const name = path.basename(script, '.py');
-
-        execSync(`${PYINSTALLER_CMD} --onefile --clean --distpath "${DIST_DIR}" --workpath "${path.join(__dirname, '../build-py')}" --specpath "${path.join(__dirname, '../build-py')}" --name "${name}" "${scriptPath}"`, {
-            stdio: 'inherit',
-            cwd: SIDE_CARS_DIR // Run in sidecars dir so imports work
-        });
-    } catch (e) {
-        console.error(`Failed to compile ${script}:`, e);
-        process.exit(1);
-    }
-});
+try {
+    // --onedir: Executable plus its libraries in a folder; unlike --onefile nothing is unpacked to a temp dir on each launch
+    // --distpath: Output directory (the binary ends up in dist-python/sidecar/)
+    // --workpath: Temp directory (ignored/deleted usually)
+    // --specpath: Spec file directory (keep out of root)
+    // --clean: Clean cache
+    // --hidden-import: Tools are loaded with importlib, which PyInstaller can't follow
+    const hiddenImports = TOOLS.map(tool => `--hidden-import "${tool}"`).join(' ');
+
+    execSync(`${PYINSTALLER_CMD} --onedir --noconfirm --clean --distpath "${DIST_DIR}" --workpath "${path.join(__dirname, '../build-py')}" --specpath "${path.join(__dirname, '../build-py')}" --paths "${SIDE_CARS_DIR}" ${hiddenImports} --name sidecar "${path.join(SIDE_CARS_DIR, ENTRY)}"`, {
+        stdio: 'inherit',
+        cwd: SIDE_CARS_DIR // Run in sidecars dir so imports work
+    });
+} catch (e) {
+    console.error(`Failed to compile ${ENTRY}:`, e);
+    process.exit(1);
+}
 
 console.log('Python compilation complete.');
@@ -11,17 +11,34 @@ interface Window {
         getPageCount: (inputPath: string) => Promise<number>;
         ocrPdf: (inputPath: string, outputPath: string) => Promise<void>;
         compressPdf: (inputPath: string, outputPath: string) => Promise<void>;
+        inspectPdf: (inputPath: string) => Promise<{ page_count: number, encrypted: boolean, needs_pass: boolean, metadata: Record<string, string> | null, pages: { width: number, height: number, rotation: number, has_text: boolean }[] }>;
+        getPdfThumbnails: (inputPath: string, pages: string, size?: number) => Promise<Record<number, string>>;
         // Archive
-        extractArchive: (inputPath: string, outputDir: string) => Promise<void>;
+        extractArchive: (inputPath: string, outputDir: string, members?: string[]) => Promise<void>;
+        listArchive: (inputPath: string) => Promise<{
+            format: string;
+            count: number;
+            total_size: number;
+            members: { name: string; size: number; compressed_size: number | null; mtime: number | null; is_dir: boolean }[];
+        }>;
         createArchive: (inputPaths: string[], outputPath: string) => Promise<void>;
         convertArchive: (inputPath: string, outputPath: string) => Promise<void>;
         // Media
         convertImage: (inputPath: string, outputPath: string) => Promise<void>;
         compressImage: (inputPath: string, outputPath: string, targetSize: number) => Promise<void>;
         imagesToPdf: (inputPaths: string[], outputPath: string) => Promise<void>;
+        convertImageBatch: (entries: { input_path: string, output_path: string }[]) => Promise<{ index: number, input_path: string, output_path: string, ok: boolean, error?: string }[]>;
+        compressImageBatch: (entries: { input_path: string, output_path: string, target_size: number, allow_downscale?: boolean }[]) => Promise<{ index: number, input_path: string, output_path: string, ok: boolean, error?: string }[]>;
         // Documents
         convertToPdf: (inputPath: string, outputPath: string) => Promise<void>;
+        convertToPdfBatch: (entries: { input_path: string, output_path: string }[]) => Promise<{ index: number, input_path: string, output_path: string, ok: boolean, error?: string }[]>;
         // Dialogs
+        getJobMetrics: () => Promise<{
+            classes: Record<'cpu' | 'memory' | 'io', { limit: number, running: number, queued: number, oldest_wait_s: number, avg_wait_s: number | null, max_wait_s: number, completed: number, failed: number, cancelled: number }>;
+            jobs: { id: number, tool: string, command: string | null, resource: string, priority: number, state: string, waited_s: number, running_s: number | null }[];
+            idle_servers: Record<string, number>;
+        } | null>;
+        cancelJob: (jobId: number) => Promise<boolean>;
         selectDirectory: () => Promise<string | null>;
         saveFile: (defaultName: string, filters?: { name: string, extensions: string[] }[]) => Promise<string | null>;
         openFile: (filters?: { name: string, extensions: string[] }[], allowMulti?: boolean) => Promise<string[]>;